@@ -1,10 +1,24 @@
 # --- app.py ---
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, send_from_directory
 import pandas as pd
 import json
 import os
 import logging
 import math
+import functools
+import gc
+import numpy as np
+
+from basket import BASKET_NUTRIENTS, DEFAULT_MAX_PACKS, optimize_basket
+from column_store import (build_column_store, build_category_index, bin_products, add_derived_columns,
+                          build_subtree_index, build_leaderboards, top_k, pareto_front, compact_products,
+                          text_store_columns, source_digest, TEXT_STORE_SUFFIX, TextStore)
+from history_store import HISTORY_DIR, HistoryStore, from_day, to_day
+from pipeline import (BUNDLES as DATASET_BUNDLES, CATEGORY_MAPPING_CSV as DATASET_MAPPING_CSV,
+                      PRODUCTS_JSON as DATASET_PRODUCTS_JSON, current_dataset_dir)
+from serialization import json_response, records_response
+from similarity import NutritionIndex
+from tracing import init_app as init_tracing, log_event, phase
 
 # --- Basic Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,15 +26,47 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # --- Configuration ---
 UNIQUE_PRODUCTS_JSON = 'output/unique_products_with_categories_saved.json'
 CATEGORY_MAPPING_CSV = 'output/category_stockcode_mapping_saved.csv'
+BUNDLE_DIR = 'output/bundles'  # Written by build_bundles.py
+BUNDLE_MANIFEST = 'manifest.json'
+TEXT_STORE_CACHE_DIR = 'output/text_store'  # Where a published dataset's missing TextStore is built (never in the dataset)
+PRECOMPRESSED_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]  # In order of preference
+
+# Versioned dataset published by pipeline.py, if there is one (otherwise the files above)
+DATASET_DIR = current_dataset_dir()
+if DATASET_DIR:
+    UNIQUE_PRODUCTS_JSON = os.path.join(DATASET_DIR, DATASET_PRODUCTS_JSON)
+    CATEGORY_MAPPING_CSV = os.path.join(DATASET_DIR, DATASET_MAPPING_CSV)
+    BUNDLE_DIR = os.path.join(DATASET_DIR, DATASET_BUNDLES)
 
 # --- Initialize Flask App ---
 app = Flask(__name__)
+init_tracing(app)  # No-op unless WOOLIES_TRACE is set
 
 # --- Data Loading and Preprocessing ---
-unique_products_df = pd.DataFrame()
+unique_products_df = pd.DataFrame()  # compact: SERVING_TEXT_COLUMNS only (numbers are in product_columns)
 category_map_df = pd.DataFrame()
 category_hierarchy = {}
 all_dietary_tags = set()
+product_columns = {}     # column store: numeric column -> np.ndarray aligned with unique_products_df rows
+category_rows = {}       # ScrapedCategoryID -> np.ndarray of unique_products_df row positions
+subtree_rows = {}        # ScrapedCategoryID -> rows in the category or any descendant
+leaderboards = {}        # (category or None for all, metric, descending) -> (top rows, candidate count)
+stockcode_rows = pd.Index([])  # Stockcode -> unique_products_df row position
+nutrition_index = None   # NutritionIndex for /similar
+product_text = None      # TextStore with every other text column (ingredients, allergens, categories...)
+price_history = None     # HistoryStore, if history_store.py has recorded any snapshots
+history_ids = np.empty(0, dtype=np.int64)  # history stockcode id per unique_products_df row (-1 = none)
+
+DEFAULT_BIN_RESOLUTION = 50
+DEFAULT_PRICE_MOVE_DAYS = 30
+DEFAULT_RANK_METRIC = 'Protein_per_dollar'
+DEFAULT_TOP_K = 20
+MAX_TOP_K = 500
+ALL_CATEGORIES = 'all'  # category id meaning "the whole catalogue" in ranking queries
+DEFAULT_SIMILAR_K = 10
+MAX_SIMILAR_K = 100
+DEFAULT_PRICE_MOVE_LIMIT = 20
+MAX_BASKET_PACKS = 50
 
 def build_category_hierarchy(df_map):
     """Builds a nested dictionary representing the category hierarchy."""
@@ -73,13 +119,111 @@ def build_category_hierarchy(df_map):
     return sorted_hierarchy
 
 
+@functools.lru_cache(maxsize=64)
+def dietary_mask(dietary_filter):
+    """Boolean mask over unique_products_df rows whose dietary statement contains dietary_filter."""
+    dietary_col = 'LifestyleAndDietaryStatement'
+    if dietary_col not in unique_products_df.columns:
+        logging.warning(f"Dietary filter column '{dietary_col}' not found in product data. Filter ignored.")
+        return np.ones(len(unique_products_df), dtype=bool)
+    statements = unique_products_df[dietary_col]
+    if isinstance(statements.dtype, pd.CategoricalDtype):
+        # Match each distinct statement once and map through the codes (-1 = missing -> the appended False)
+        matches = np.asarray(statements.cat.categories.str.lower().str.contains(dietary_filter, regex=False), dtype=bool)
+        return np.append(matches, False)[statements.cat.codes.to_numpy()]
+    return statements.str.lower().str.contains(dietary_filter, na=False, regex=False).to_numpy()
+
+
+def stockcode_labels(rows):
+    """Stockcodes at row positions, as the strings the API returns (they're stored as int64)."""
+    return unique_products_df['Stockcode'].to_numpy()[rows].astype(str)
+
+
+def stockcode_row(stockcode):
+    """Row position of a stockcode from a URL, or -1."""
+    if not len(stockcode_rows):
+        return -1
+    if pd.api.types.is_integer_dtype(stockcode_rows.dtype):
+        if not str(stockcode).isdigit():
+            return -1
+        stockcode = int(stockcode)
+    return int(stockcode_rows.get_indexer([stockcode])[0])
+
+
+@functools.lru_cache(maxsize=1024)
+def ranked_rows(category_id, metric, descending, dietary_filter, k):
+    """(top k rows, candidate count) for a ranking query; category_id None means the whole catalogue.
+
+    Unfiltered queries are served from the precomputed leaderboards; dietary-filtered (or deeper)
+    ones are ranked with argpartition and cached here.
+    """
+    board = leaderboards.get((category_id, metric, descending))
+    if board is not None and not dietary_filter and (k <= len(board[0]) or len(board[0]) == board[1]):
+        return board[0][:k], board[1]
+    rows = scope_rows(category_id, dietary_filter)
+    values = product_columns[metric]
+    return top_k(values, rows, k, descending), int(np.count_nonzero(~np.isnan(values[rows])))
+
+
+def scope_rows(category_id, dietary_filter=None):
+    """Rows in a category subtree (category_id None = whole catalogue), optionally dietary-filtered."""
+    rows = np.arange(len(unique_products_df)) if category_id is None else subtree_rows.get(category_id, category_rows.get(category_id))
+    if dietary_filter:
+        rows = rows[dietary_mask(dietary_filter)[rows]]
+    return rows
+
+
+@functools.lru_cache(maxsize=256)
+def pareto_rows(category_id, fields, maximize, dietary_filter):
+    """(Pareto-optimal rows, candidate count) over `fields` for a category subtree and dietary filter."""
+    rows = scope_rows(category_id, dietary_filter)
+    points = np.column_stack([product_columns[field][rows] for field in fields])
+    complete = ~np.isnan(points).any(axis=1)
+    rows, points = rows[complete], points[complete]
+    return rows[pareto_front(points, maximize)], len(rows)
+
+
+@functools.lru_cache(maxsize=256)
+def basket_solution(category_id, dietary_filters, minimums, maximums, max_packs):
+    """optimize_basket() over a category subtree (None = whole catalogue) whose dietary statements
+    contain every one of dietary_filters; minimums/maximums are sorted (nutrient, amount) tuples."""
+    rows = scope_rows(category_id)
+    for dietary_filter in dietary_filters:
+        rows = rows[dietary_mask(dietary_filter)[rows]]
+    return optimize_basket(product_columns, rows, dict(minimums), dict(maximums), max_packs)
+
+
+def open_text_store(records, df, numeric_columns, source):
+    """The TextStore for UNIQUE_PRODUCTS_JSON: the one next to it (pipeline.py builds it into each dataset)
+    if its header matches `source` (source_digest of the JSON) and the columns, else one built from
+    `records`. A dataset directory is never written to: its store is built under TEXT_STORE_CACHE_DIR instead."""
+    columns = text_store_columns(df, numeric_columns)
+    sidecar = os.path.splitext(UNIQUE_PRODUCTS_JSON)[0] + TEXT_STORE_SUFFIX
+    if DATASET_DIR:
+        candidates = [sidecar, os.path.join(TEXT_STORE_CACHE_DIR, os.path.basename(os.path.normpath(DATASET_DIR)) + TEXT_STORE_SUFFIX)]
+    else:
+        candidates = [sidecar]
+    for path in candidates:
+        if os.path.exists(path):
+            store = TextStore.open(path, len(records), source, columns)
+            if store is not None:
+                return store
+    path = candidates[-1]
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return TextStore.build(records, columns, path, source)
+
+
 def load_and_prepare_data():
-    global unique_products_df, category_map_df, category_hierarchy, all_dietary_tags
+    global unique_products_df, category_map_df, category_hierarchy, all_dietary_tags, product_columns, category_rows, price_history, history_ids
+    global subtree_rows, leaderboards, stockcode_rows, nutrition_index, product_text
     logging.info("Loading data...")
     try:
         # Load unique products from JSON
-        with open(UNIQUE_PRODUCTS_JSON, encoding='utf-8') as f:
-            unique_products = json.load(f)
+        with open(UNIQUE_PRODUCTS_JSON, 'rb') as f:
+            products_data = f.read()
+        unique_products = json.loads(products_data)
+        products_source = source_digest(products_data)
+        del products_data
         unique_products_df = pd.DataFrame(unique_products)
         logging.info(f"Loaded {len(unique_products_df)} unique product rows from {UNIQUE_PRODUCTS_JSON}")
 
@@ -114,8 +258,8 @@ def load_and_prepare_data():
         # Convert nutritional columns to numeric, coercing errors
         nutr_cols = ['Nutr_Protein_per_100g', 'Nutr_Protein_per_Serve', 'Nutr_Serving_Size', 'Nutr_Sugars_per_100g']
         for col in nutr_cols:
-            if col in unique_products_df.columns:
-                 # Attempt to clean strings like '< 1g' before converting
+            if col in unique_products_df.columns and not pd.api.types.is_numeric_dtype(unique_products_df[col]):
+                 # Attempt to clean strings like '< 1g' before converting (typed JSON from convert_csv_to_json.py skips this)
                  unique_products_df[col] = unique_products_df[col].astype(str).str.replace(r'[^\d.]', '', regex=True)
                  unique_products_df[col] = pd.to_numeric(unique_products_df[col], errors='coerce')
 
@@ -154,15 +298,50 @@ def load_and_prepare_data():
              logging.warning(f"Column '{dietary_col}' not found for dietary filtering.")
              all_dietary_tags = set()
 
+        # --- Build Column Store, Text Store & Compact Table ---
+        product_columns = build_column_store(unique_products_df)
+        add_derived_columns(product_columns, unique_products_df)
+        if product_text is not None:
+            product_text.close()
+        product_text = open_text_store(unique_products, unique_products_df, product_columns, products_source)
+        del unique_products
+        unique_products_df = compact_products(unique_products_df, product_columns)
+        gc.collect()
+        if 'Stockcode' in unique_products_df.columns:
+            stockcode_rows = pd.Index(unique_products_df['Stockcode'])
+        nutrition_index = NutritionIndex(product_columns)
+        if not category_map_df.empty and 'Stockcode' in unique_products_df.columns:
+            category_rows = build_category_index(category_map_df, unique_products_df['Stockcode'])
+
+        # --- Load Price History (optional) ---
+        # Reset first, so a reload without (usable) history never keeps the previous dataset's ids
+        history_ids = np.empty(0, dtype=np.int64)
+        try:
+            price_history = HistoryStore.open(HISTORY_DIR)
+            if price_history is not None and 'Stockcode' in unique_products_df.columns:
+                history_ids = price_history.lookup(unique_products_df['Stockcode'].to_numpy())
+                logging.info(f"Loaded {len(price_history.sid)} price history records up to {from_day(price_history.last_day)}.")
+        except Exception as e:
+            logging.error(f"Failed to load price history from {HISTORY_DIR}: {e}", exc_info=True)
+            price_history = None
+            history_ids = np.empty(0, dtype=np.int64)
 
         # --- Build Category Hierarchy ---
         logging.info("Building category hierarchy...")
         if not category_map_df.empty:
             category_hierarchy = build_category_hierarchy(category_map_df)
             logging.info("Category hierarchy built.")
+            subtree_rows = build_subtree_index(category_hierarchy, category_rows)
         else:
             logging.error("Category mapping data is empty. Cannot build hierarchy.")
 
+        # --- Precompute Ranking Leaderboards ---
+        leaderboards = build_leaderboards(product_columns, subtree_rows, np.arange(len(unique_products_df)))
+        dietary_mask.cache_clear()
+        ranked_rows.cache_clear()
+        pareto_rows.cache_clear()
+        basket_solution.cache_clear()
+
         logging.info("Data loading and preparation complete.")
 
     except FileNotFoundError as e:
@@ -186,57 +365,46 @@ def index():
 @app.route('/api/products/<category_id>')
 def get_products_by_category(category_id):
     """API endpoint to get product data for visualization."""
-    logging.info(f"API request for category ID: {category_id}")
     dietary_filter = request.args.get('dietary', None) # Get filter from query param ?dietary=vegan
     if dietary_filter:
         dietary_filter = dietary_filter.lower().strip()
-        logging.info(f"Applying dietary filter: {dietary_filter}")
 
-    products_data = []
+    products_data = {}  # field -> column array, encoded row by row by records_response
     try:
         # Find stockcodes for the given category_id using the mapping
         if category_map_df.empty or 'ScrapedCategoryID' not in category_map_df.columns:
              logging.warning("Category map DataFrame is empty or missing required column.")
-             return jsonify([])
-
-        # Ensure consistent type for matching
-        relevant_stockcodes = category_map_df[category_map_df['ScrapedCategoryID'] == str(category_id)]['Stockcode'].unique()
-        logging.info(f"Found {len(relevant_stockcodes)} stockcodes for category {category_id}.")
-
-        if len(relevant_stockcodes) > 0 and not unique_products_df.empty:
-            # Filter the unique products dataframe
-            category_products_df = unique_products_df[unique_products_df['Stockcode'].isin(relevant_stockcodes)].copy()
-            logging.info(f"Initial product count for category: {len(category_products_df)}")
-
-            # Apply dietary filter if provided
-            if dietary_filter:
-                 dietary_col = 'LifestyleAndDietaryStatement' # Use the same column as defined in load_data
-                 if dietary_col in category_products_df.columns:
-                     # Case-insensitive check if the tag exists in the statement string
-                     category_products_df = category_products_df[
-                         category_products_df[dietary_col].str.lower().str.contains(dietary_filter, na=False)
-                     ]
-                     logging.info(f"Product count after '{dietary_filter}' filter: {len(category_products_df)}")
-                 else:
-                      logging.warning(f"Dietary filter column '{dietary_col}' not found in product data. Filter ignored.")
-
-            # Select and prepare data for the chart
-            chart_data_df = category_products_df[[
-                'Stockcode',
-                'ProductName',
-                'Protein_per_g',
-                'Sugar_per_100g'
-            ]].copy()
-
-            # Drop rows where essential chart data is missing
-            chart_data_df.dropna(subset=['Protein_per_g', 'Sugar_per_100g'], inplace=True)
-            logging.info(f"Product count after dropping NA for chart values: {len(chart_data_df)}")
-
-            # Convert to list of dictionaries for JSON response
-            products_data = chart_data_df.to_dict('records')
+             return json_response([])
+
+        with phase('index_lookup'):
+            rows = category_rows.get(str(category_id), np.empty(0, dtype=np.int64))
+        log_event(logging.DEBUG, 'products.lookup', category=category_id, stockcodes=len(rows))
+
+        if len(rows) > 0 and not unique_products_df.empty:
+            with phase('filter'):
+                initial_count = len(rows)
+                # Apply dietary filter if provided (case-insensitive substring of the statement)
+                if dietary_filter:
+                    rows = rows[dietary_mask(dietary_filter)[rows]]
+            log_event(logging.DEBUG, 'products.filter', category=category_id, dietary=dietary_filter,
+                      initial=initial_count, filtered=len(rows))
+
+            with phase('projection'):
+                # Chart data, dropping rows where essential chart data is missing
+                protein = product_columns.get('Protein_per_g')
+                sugar = product_columns.get('Sugar_per_100g')
+                if protein is not None and sugar is not None:
+                    rows = rows[~(np.isnan(protein[rows]) | np.isnan(sugar[rows]))]
+                    names = unique_products_df['ProductName'].to_numpy()[rows] if 'ProductName' in unique_products_df.columns else [None] * len(rows)
+                    products_data = {
+                        'Stockcode': stockcode_labels(rows),
+                        'ProductName': names,
+                        'Protein_per_g': np.round(protein[rows].astype(np.float64), 4),
+                        'Sugar_per_100g': np.round(sugar[rows].astype(np.float64), 4),
+                    }
 
         else:
-             logging.info(f"No relevant stockcodes found or unique products dataframe is empty.")
+             log_event(logging.DEBUG, 'products.empty', category=category_id)
 
 
     except KeyError as e:
@@ -244,8 +412,349 @@ def get_products_by_category(category_id):
     except Exception as e:
         logging.error(f"Error processing API request for category {category_id}: {e}", exc_info=True)
 
-    logging.info(f"Returning {len(products_data)} products for category {category_id} (filter: {dietary_filter})")
-    return jsonify(products_data)
+    products_count = len(products_data['Stockcode']) if products_data else 0
+    log_event(logging.DEBUG, 'products.response', category=category_id, dietary=dietary_filter, products=products_count)
+    with phase('serialization'):
+        # Large categories stream, so most of the encoding happens after this phase ends
+        return records_response(products_data)
+
+@app.route('/api/products/<category_id>/bins')
+def get_product_bins(category_id):
+    """API endpoint returning a 2D histogram of a category's products for dense scatter views.
+
+    Query params: x and y (numeric fields), resolution (bins per axis) and dietary (optional tag).
+    """
+    x_field = request.args.get('x', 'Protein_per_g')
+    y_field = request.args.get('y', 'Sugar_per_100g')
+    resolution = request.args.get('resolution', DEFAULT_BIN_RESOLUTION, type=int)
+    dietary_filter = request.args.get('dietary', None)
+    for field in (x_field, y_field):
+        if field not in product_columns:
+            return jsonify({'error': f"Unknown or non-numeric field '{field}'."}), 400
+
+    with phase('index_lookup'):
+        rows = category_rows.get(str(category_id), np.empty(0, dtype=np.int64))
+    with phase('filter'):
+        if dietary_filter and len(rows):
+            rows = rows[dietary_mask(dietary_filter.lower().strip())[rows]]
+
+        x = product_columns[x_field][rows]
+        y = product_columns[y_field][rows]
+        valid = ~(np.isnan(x) | np.isnan(y))
+        rows, x, y = rows[valid], x[valid], y[valid]
+
+    result = {'x': x_field, 'y': y_field, 'total': int(len(rows)), 'bins': []}
+    if not len(rows):
+        return jsonify(result)
+
+    with phase('binning'):
+        x_edges, y_edges, bin_ix, bin_iy, counts, mean_x, mean_y, representative = bin_products(x, y, resolution)
+    rep_rows = rows[representative]
+    rep_stockcodes = stockcode_labels(rep_rows)
+    rep_names = unique_products_df['ProductName'].to_numpy()[rep_rows] if 'ProductName' in unique_products_df.columns else rep_stockcodes
+    result['resolution'] = len(x_edges) - 1
+    # Rounded like every other value from the float32 column store (12.3 is 12.300000190734863 in float32)
+    result['x_edges'] = np.round(x_edges, 4).tolist()
+    result['y_edges'] = np.round(y_edges, 4).tolist()
+    result['bins'] = [
+        {
+            'ix': int(bin_ix[i]), 'iy': int(bin_iy[i]), 'count': int(counts[i]),
+            'mean_x': round(float(mean_x[i]), 4), 'mean_y': round(float(mean_y[i]), 4),
+            'representative': {
+                'Stockcode': rep_stockcodes[i], 'ProductName': rep_names[i],
+                x_field: round(float(x[representative[i]]), 4), y_field: round(float(y[representative[i]]), 4),
+            },
+        }
+        for i in range(len(counts))
+    ]
+    with phase('serialization'):
+        return jsonify(result)
+
+@app.route('/api/products/<stockcode>/history')
+def get_product_history(stockcode):
+    """API endpoint returning a product's price/nutrition change points, oldest first.
+
+    Query params: from and to (YYYY-MM-DD, optional).
+    """
+    if price_history is None:
+        return jsonify({'error': 'No price history has been recorded.'}), 404
+    try:
+        start_day = to_day(request.args['from']) if request.args.get('from') else None
+        end_day = to_day(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': "Dates must be YYYY-MM-DD."}), 400
+    with phase('index_lookup'):
+        points = price_history.history(stockcode, start_day, end_day)
+    if points is None:
+        return jsonify({'error': f"No history for stockcode '{stockcode}'."}), 404
+    with phase('serialization'):
+        return jsonify({'stockcode': stockcode, 'points': points})
+
+@app.route('/api/categories/<category_id>/price-moves')
+def get_category_price_moves(category_id):
+    """API endpoint returning the biggest price changes among a category's products.
+
+    Query params: days (look-back window, default 30), limit (default 20) and
+    direction ('down', 'up' or 'both', ranked by percentage change).
+    """
+    days = request.args.get('days', DEFAULT_PRICE_MOVE_DAYS, type=int)
+    limit = request.args.get('limit', DEFAULT_PRICE_MOVE_LIMIT, type=int)
+    direction = request.args.get('direction', 'both')
+    if direction not in ('down', 'up', 'both'):
+        return jsonify({'error': "direction must be 'down', 'up' or 'both'."}), 400
+    if price_history is None:
+        return jsonify({'error': 'No price history has been recorded.'}), 404
+
+    since_day = price_history.last_day - days
+    with phase('index_lookup'):
+        rows = category_rows.get(str(category_id), np.empty(0, dtype=np.int64))
+        sids = history_ids[rows] if len(history_ids) else np.empty(0, dtype=np.int64)
+    with phase('filter'):
+        moved, before, after, change, pct = price_history.price_moves(sids, since_day)
+        key = {'down': pct, 'up': -pct, 'both': -np.abs(pct)}[direction]
+        top = np.argsort(key, kind='stable')[:max(0, limit)]
+        if direction != 'both':
+            top = top[key[top] < 0]  # only moves in the requested direction
+    with phase('projection'):
+        top_rows = rows[moved[top]]
+        stockcodes = stockcode_labels(top_rows)
+        names = unique_products_df['ProductName'].to_numpy()[top_rows] if 'ProductName' in unique_products_df.columns else [None] * len(top_rows)
+        moves = []
+        for j, i in enumerate(top):
+            moves.append({
+                'Stockcode': stockcodes[j], 'ProductName': names[j],
+                'price_before': round(float(before[i]), 2), 'price_after': round(float(after[i]), 2),
+                'change': round(float(change[i]), 2), 'change_pct': round(float(pct[i]), 2),
+            })
+    with phase('serialization'):
+        return jsonify({'category_id': category_id, 'since': from_day(since_day), 'until': from_day(price_history.last_day),
+                        'direction': direction, 'moves': moves})
+
+@app.route('/api/categories/<category_id>/top')
+def get_category_top(category_id):
+    """API endpoint ranking a category subtree's products by a numeric metric.
+
+    Query params: metric (any column-store field, default Protein_per_dollar), k (default 20),
+    order ('desc' for highest first, or 'asc') and dietary (optional tag).
+    Use category_id 'all' to rank the whole catalogue.
+    """
+    metric = request.args.get('metric', DEFAULT_RANK_METRIC)
+    k = max(1, min(request.args.get('k', DEFAULT_TOP_K, type=int), MAX_TOP_K))
+    order = request.args.get('order', 'desc')
+    dietary_filter = (request.args.get('dietary') or '').lower().strip() or None
+    if metric not in product_columns:
+        return jsonify({'error': f"Unknown or non-numeric metric '{metric}'."}), 400
+    if order not in ('desc', 'asc'):
+        return jsonify({'error': "order must be 'desc' or 'asc'."}), 400
+    scope = None if category_id == ALL_CATEGORIES else str(category_id)
+    if scope is not None and scope not in subtree_rows and scope not in category_rows:
+        return jsonify({'error': f"Unknown category '{category_id}'."}), 404
+
+    with phase('filter'):
+        rows, total = ranked_rows(scope, metric, order == 'desc', dietary_filter, k)
+    with phase('projection'):
+        values = product_columns[metric][rows]
+        prices = product_columns['Price'][rows] if 'Price' in product_columns else np.full(len(rows), np.nan)
+        stockcodes = stockcode_labels(rows)
+        names = unique_products_df['ProductName'].to_numpy()[rows] if 'ProductName' in unique_products_df.columns else stockcodes
+        products = [
+            {'rank': i + 1, 'Stockcode': stockcodes[i], 'ProductName': names[i], metric: round(float(values[i]), 4),
+             'Price': None if np.isnan(prices[i]) else round(float(prices[i]), 2)}
+            for i in range(len(rows))
+        ]
+    with phase('serialization'):
+        return jsonify({'category_id': category_id, 'metric': metric, 'order': order, 'dietary': dietary_filter,
+                        'total': total, 'products': products})
+
+@app.route('/api/products/<category_id>/pareto')
+def get_product_pareto(category_id):
+    """API endpoint returning the Pareto-optimal products of a category subtree over 2 or 3 metrics.
+
+    Query params: x, y and optionally size (numeric fields); reverse_x, reverse_y and reverse_size
+    (as in the front end: reversed means lower is better, otherwise higher is) and dietary.
+    Use category_id 'all' for the whole catalogue.
+    """
+    fields = [request.args.get('x', 'Protein_per_g'), request.args.get('y', 'Sugar_per_100g')]
+    if request.args.get('size'):
+        fields.append(request.args['size'])
+    for field in fields:
+        if field not in product_columns:
+            return jsonify({'error': f"Unknown or non-numeric field '{field}'."}), 400
+    if len(set(fields)) != len(fields):
+        return jsonify({'error': "x, y and size must be different fields."}), 400
+    reversed_flags = [request.args.get(f'reverse_{axis}', 'false').lower() in ('1', 'true', 'yes')
+                      for axis in ('x', 'y', 'size')[:len(fields)]]
+    maximize = tuple(not flag for flag in reversed_flags)
+    dietary_filter = (request.args.get('dietary') or '').lower().strip() or None
+    scope = None if category_id == ALL_CATEGORIES else str(category_id)
+    if scope is not None and scope not in subtree_rows and scope not in category_rows:
+        return jsonify({'error': f"Unknown category '{category_id}'."}), 404
+
+    with phase('filter'):
+        rows, total = pareto_rows(scope, tuple(fields), maximize, dietary_filter)
+    with phase('projection'):
+        # Best-first along x
+        x = product_columns[fields[0]][rows]
+        rows = rows[np.argsort(-x if maximize[0] else x, kind='stable')]
+        stockcodes = stockcode_labels(rows)
+        names = unique_products_df['ProductName'].to_numpy()[rows] if 'ProductName' in unique_products_df.columns else stockcodes
+        values = {field: product_columns[field][rows] for field in fields}
+        products = [
+            dict({'Stockcode': stockcodes[i], 'ProductName': names[i]},
+                 **{field: round(float(values[field][i]), 4) for field in fields})
+            for i in range(len(rows))
+        ]
+    with phase('serialization'):
+        return jsonify({'category_id': category_id, 'fields': fields, 'maximize': dict(zip(fields, maximize)),
+                        'dietary': dietary_filter, 'total': total, 'products': products})
+
+@app.route('/api/basket')
+def get_basket():
+    """API endpoint returning the cheapest basket (whole packs) that meets nutrient targets.
+
+    Query params: min_<nutrient> and max_<nutrient> per-basket amounts for any of BASKET_NUTRIENTS
+    (protein, fat, carbohydrate, sugars in g; sodium in mg; energy in kJ), at least one min_;
+    category (default 'all'), dietary (comma-separated tags, all required) and max_packs (packs of
+    any one product, default 7). Solutions are cached per constraint set.
+    """
+    minimums, maximums = {}, {}
+    for bound, targets in (('min', minimums), ('max', maximums)):
+        for nutrient in BASKET_NUTRIENTS:
+            value = request.args.get(f'{bound}_{nutrient}', type=float)
+            if value is not None:
+                if not math.isfinite(value) or value < 0:
+                    return jsonify({'error': f"{bound}_{nutrient} must be a non-negative number."}), 400
+                targets[nutrient] = value
+    if not minimums:
+        return jsonify({'error': f"Give at least one minimum target: min_<nutrient> for one of {list(BASKET_NUTRIENTS)}."}), 400
+    for nutrient in set(minimums) & set(maximums):
+        if minimums[nutrient] > maximums[nutrient]:
+            return jsonify({'error': f"min_{nutrient} is greater than max_{nutrient}."}), 400
+    missing = [n for n in set(minimums) | set(maximums) if not any(c in product_columns for c in BASKET_NUTRIENTS[n])]
+    if missing or 'Price' not in product_columns or 'PackageGrams' not in product_columns:
+        return jsonify({'error': f"Product data lacks the columns needed for {sorted(missing) or 'pricing per pack'}."}), 400
+    max_packs = max(1, min(request.args.get('max_packs', DEFAULT_MAX_PACKS, type=int), MAX_BASKET_PACKS))
+    dietary_filters = tuple(sorted({tag.lower().strip() for tag in (request.args.get('dietary') or '').split(',') if tag.strip()}))
+    category_id = request.args.get('category', ALL_CATEGORIES)
+    scope = None if category_id == ALL_CATEGORIES else str(category_id)
+    if scope is not None and scope not in subtree_rows and scope not in category_rows:
+        return jsonify({'error': f"Unknown category '{category_id}'."}), 404
+
+    with phase('solve'):
+        solution = basket_solution(scope, dietary_filters, tuple(sorted(minimums.items())),
+                                   tuple(sorted(maximums.items())), max_packs)
+    if solution is None:
+        return jsonify({'error': "Basket optimisation needs scipy >= 1.9 (pip install scipy)."}), 503
+
+    with phase('projection'):
+        rows = np.array([row for row, _ in solution['items']], dtype=np.int64)
+        stockcodes = stockcode_labels(rows)
+        names = unique_products_df['ProductName'].to_numpy()[rows] if 'ProductName' in unique_products_df.columns else stockcodes
+        sizes = unique_products_df['PackageSize'].to_numpy()[rows] if 'PackageSize' in unique_products_df.columns else [None] * len(rows)
+        prices = product_columns['Price']
+        items = [
+            {'Stockcode': stockcodes[i], 'ProductName': names[i], 'PackageSize': None if pd.isna(sizes[i]) else sizes[i], 'packs': packs,
+             'Price': round(float(prices[row]), 2), 'subtotal': round(float(prices[row]) * packs, 2)}
+            for i, (row, packs) in enumerate(solution['items'])
+        ]
+        items.sort(key=lambda item: -item['subtotal'])
+    with phase('serialization'):
+        return jsonify({'category_id': category_id, 'dietary': list(dietary_filters), 'min': minimums, 'max': maximums,
+                        'max_packs': max_packs, **{k: v for k, v in solution.items() if k != 'items'}, 'items': items})
+
+@app.route('/api/products/<stockcode>/similar')
+def get_similar_products(stockcode):
+    """API endpoint returning the products with the closest per-100g macro profile.
+
+    Query params: k (default 10), category (restrict to a category subtree), cheaper and
+    higher_protein (1 to only return products cheaper / higher in protein than this one).
+    """
+    k = max(1, min(request.args.get('k', DEFAULT_SIMILAR_K, type=int), MAX_SIMILAR_K))
+    category_id = request.args.get('category')
+    cheaper = request.args.get('cheaper', 'false').lower() in ('1', 'true', 'yes')
+    higher_protein = request.args.get('higher_protein', 'false').lower() in ('1', 'true', 'yes')
+
+    with phase('index_lookup'):
+        row = stockcode_row(stockcode)
+    if row < 0:
+        return jsonify({'error': f"Unknown stockcode '{stockcode}'."}), 404
+    if category_id and str(category_id) not in subtree_rows and str(category_id) not in category_rows:
+        return jsonify({'error': f"Unknown category '{category_id}'."}), 404
+
+    with phase('filter'):
+        allowed = None
+        if category_id:
+            allowed = np.zeros(len(unique_products_df), dtype=bool)
+            allowed[scope_rows(str(category_id))] = True
+        for flag, field in ((cheaper, 'Price'), (higher_protein, 'Nutr_Protein_per_100g')):
+            if flag and field in product_columns:
+                values = product_columns[field]
+                with np.errstate(invalid='ignore'):
+                    better = values < values[row] if field == 'Price' else values > values[row]
+                allowed = better if allowed is None else allowed & better
+        matches = nutrition_index.similar(row, k, allowed) if nutrition_index is not None else None
+    if matches is None:
+        return jsonify({'error': f"Stockcode '{stockcode}' has no complete nutrition profile."}), 404
+
+    with phase('projection'):
+        fields = list(nutrition_index.features.values()) + [f for f in ('Price', 'Protein_per_dollar') if f in product_columns]
+        stockcodes = unique_products_df['Stockcode'].to_numpy()
+        names = unique_products_df['ProductName'].to_numpy() if 'ProductName' in unique_products_df.columns else stockcodes
+
+        def describe(r):
+            product = {'Stockcode': str(stockcodes[r]), 'ProductName': names[r]}
+            for field in fields:
+                value = product_columns[field][r]
+                product[field] = None if np.isnan(value) else round(float(value), 4)
+            return product
+
+        similar = [dict(describe(r), distance=round(d, 4)) for r, d in matches]
+    with phase('serialization'):
+        return jsonify({'product': describe(row), 'features': list(nutrition_index.features), 'similar': similar})
+
+@app.route('/api/products/<stockcode>/details')
+def get_product_details(stockcode):
+    """API endpoint returning one product's full record: the serving columns, its numeric values and
+    the text fields kept on disk (product_text) rather than in the in-memory table."""
+    with phase('index_lookup'):
+        row = stockcode_row(stockcode)
+    if row < 0:
+        return jsonify({'error': f"Unknown stockcode '{stockcode}'."}), 404
+
+    with phase('projection'):
+        # Text fields first: the in-memory columns win if a stored field overlaps them
+        product = product_text.get(row) if product_text is not None else {}
+        for col in unique_products_df.columns:
+            value = unique_products_df[col].iloc[row]
+            if col == 'Stockcode':
+                product[col] = str(value)
+            elif not pd.isna(value):
+                product[col] = value
+        for field, values in product_columns.items():
+            if not np.isnan(values[row]):
+                product[field] = round(float(values[row]), 4)
+    with phase('serialization'):
+        return jsonify(product)
+
+@app.route('/output/bundles/<path:filename>')
+def serve_data_bundle(filename):
+    """Serves the front end's data bundles, preferring a precompressed variant the client accepts."""
+    bundle_dir = os.path.abspath(BUNDLE_DIR)
+    response = None
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(bundle_dir, filename + suffix)):
+            response = send_from_directory(bundle_dir, filename + suffix, mimetype='application/json')
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(bundle_dir, filename)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Bundle names carry a content hash, so they never change; the manifest must always be revalidated
+    if filename == BUNDLE_MANIFEST:
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 # --- Helper Function for Template ---
 @app.template_filter('render_categories')
@@ -264,4 +773,4 @@ def render_categories_filter(hierarchy_dict):
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001) # Turn off debug mode for production
\ No newline at end of file
+    app.run(debug=True, port=5001) # Development server; for production use serve.py
\ No newline at end of file
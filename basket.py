@@ -0,0 +1,122 @@
+# --- basket.py ---
+# Cheapest basket of products meeting macro targets ("at least 700 g protein, at most 200 g sugar"),
+# as an integer program: choose a whole number of packs of each candidate product to minimise total
+# price subject to per-basket nutrient bounds. Per-pack nutrients are Nutr_*_per_100g scaled by the
+# pack size parsed from PackageSize (the PackageGrams column).
+#
+# Solved with scipy's milp (HiGHS) under a time limit; needs scipy >= 1.9, otherwise optimize_basket()
+# returns None. To keep solves interactive over the whole catalogue, the integer program only sees a
+# few hundred candidates: for each minimum target, the products supplying the most of it per dollar,
+# plus the best by a combined score (share of every minimum per dollar, minus share of every maximum).
+# That prune is a heuristic: a basket is optimal over the candidates, which is reported alongside it.
+
+import logging
+import time
+
+import numpy as np
+
+from similarity import SIMILARITY_FEATURES
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, milp  # Optional: pip install scipy
+except ImportError:
+    milp = None
+
+# Nutrients that can be constrained: the same macro columns as the similarity index.
+# Amounts are per basket, in the columns' units (g; sodium mg; energy kJ)
+BASKET_NUTRIENTS = SIMILARITY_FEATURES
+
+DEFAULT_MAX_PACKS = 7        # Packs of any one product (a week's worth of one item a day)
+CANDIDATES_PER_TARGET = 150  # Best-per-dollar products kept for each minimum target
+MAX_CANDIDATES = 600         # Total candidates handed to the solver
+TIME_LIMIT_SECONDS = 2.0
+MIP_REL_GAP = 0.005          # Stop once the basket is provably within 0.5% of the cheapest
+
+# milp status codes
+SOLVE_STATUS = {0: 'optimal', 1: 'time_limit', 2: 'infeasible', 3: 'unbounded', 4: 'error'}
+
+
+def resolve_nutrients(columns):
+    """{nutrient: column name} for the BASKET_NUTRIENTS present in the column store."""
+    found = {}
+    for nutrient, candidates in BASKET_NUTRIENTS.items():
+        name = next((name for name in candidates if name in columns), None)
+        if name:
+            found[nutrient] = name
+    return found
+
+
+def pack_amounts(columns, rows, nutrient_columns):
+    """(price, {nutrient: per-pack amount}) arrays over rows, as float64."""
+    price = columns['Price'][rows].astype(np.float64)
+    grams = columns['PackageGrams'][rows].astype(np.float64)
+    return price, {nutrient: columns[name][rows].astype(np.float64) * grams / 100.0
+                   for nutrient, name in nutrient_columns.items()}
+
+
+def prune_candidates(price, amounts, minimums, maximums, per_target=CANDIDATES_PER_TARGET, limit=MAX_CANDIDATES):
+    """Positions (into price/amounts) of the products worth offering the solver, sorted."""
+    keep = []
+    for nutrient in minimums:
+        per_dollar = amounts[nutrient] / price
+        keep.append(np.argsort(-per_dollar, kind='stable')[:per_target])
+    score = sum(amounts[n] / minimums[n] for n in minimums) - sum(amounts[n] / maximums[n] for n in maximums if maximums[n] > 0)
+    keep = np.unique(np.concatenate(keep))
+    if len(keep) < limit:
+        ranked = np.argsort(-score / price, kind='stable')
+        ranked = ranked[~np.isin(ranked, keep)][:limit - len(keep)]
+        keep = np.union1d(keep, ranked)
+    return keep
+
+
+def optimize_basket(columns, rows, minimums, maximums=None, max_packs=DEFAULT_MAX_PACKS, time_limit=TIME_LIMIT_SECONDS):
+    """Cheapest whole-pack basket from `rows` with each nutrient total within [minimums, maximums].
+
+    minimums/maximums map BASKET_NUTRIENTS names to per-basket amounts. Returns a dict with status
+    (see SOLVE_STATUS), cost, totals, items [(row, packs)], the eligible and candidate counts and
+    solve time, or None if scipy's milp isn't available.
+    """
+    if milp is None:
+        return None
+    maximums = maximums or {}
+    nutrient_columns = resolve_nutrients(columns)
+    constrained = {n: nutrient_columns[n] for n in list(minimums) + list(maximums)}
+    price, amounts = pack_amounts(columns, rows, constrained)
+
+    # Eligible: priced, with a known pack size and every constrained nutrient
+    usable = (price > 0) & ~np.isnan(price)
+    for values in amounts.values():
+        usable &= ~np.isnan(values)
+    rows, price = rows[usable], price[usable]
+    amounts = {n: values[usable] for n, values in amounts.items()}
+    result = {'eligible': len(rows), 'candidates': 0, 'status': 'infeasible', 'cost': None, 'totals': {}, 'items': [],
+              'gap': None, 'solve_seconds': 0.0}
+    if not len(rows):
+        return result
+
+    keep = prune_candidates(price, amounts, minimums, maximums)
+    rows, price = rows[keep], price[keep]
+    amounts = {n: values[keep] for n, values in amounts.items()}
+    result['candidates'] = len(rows)
+
+    nutrients = list(constrained)
+    constraint = LinearConstraint(np.vstack([amounts[n] for n in nutrients]),
+                                  [minimums.get(n, -np.inf) for n in nutrients],
+                                  [maximums.get(n, np.inf) for n in nutrients])
+    started = time.perf_counter()
+    solution = milp(price, integrality=np.ones(len(rows)), bounds=Bounds(0, max_packs), constraints=constraint,
+                    options={'time_limit': time_limit, 'mip_rel_gap': MIP_REL_GAP})
+    result['solve_seconds'] = round(time.perf_counter() - started, 3)
+    result['status'] = SOLVE_STATUS.get(solution.status, 'error')
+    if solution.x is None:
+        if result['status'] == 'time_limit':
+            logging.warning(f"Basket solve hit the {time_limit}s limit without a feasible basket ({len(rows)} candidates).")
+        return result
+
+    packs = np.round(solution.x).astype(np.int64)
+    chosen = np.flatnonzero(packs)
+    result['cost'] = round(float(price[chosen] @ packs[chosen]), 2)
+    result['totals'] = {n: round(float(amounts[n][chosen] @ packs[chosen]), 1) for n in nutrients}
+    result['items'] = [(int(rows[i]), int(packs[i])) for i in chosen]
+    result['gap'] = None if getattr(solution, 'mip_gap', None) is None else round(float(solution.mip_gap), 4)
+    return result
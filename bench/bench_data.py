@@ -0,0 +1,209 @@
+# --- START OF FILE bench/bench_data.py ---
+
+# Data-layer benchmark: how dedupe_jsonj.py, app.py's load_and_prepare_data and the product API
+# scale with catalogue size. For each size it generates a synthetic scrape (bench/catalogue.py),
+# then in separate subprocesses, so peak RSS is per stage:
+#   1. runs dedupe_jsonj.py on it (wall time, rows/s, peak RSS)
+#   2. converts its output into the files app.py loads
+#   3. imports app.py (load + prepare time, RSS) and hits the API from concurrent threads with the
+#      Flask test client (per-endpoint p50/p99 latency and requests/s)
+#
+#   python bench/bench_data.py --sizes 10000 100000 2000000 --json bench_data.json
+#
+# Results are JSON (with the git commit) so runs can be compared across commits.
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from catalogue import scraped_rows
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [10000, 100000]
+
+
+def rss_mb(usage):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_measured(cmd, cwd, timeout):
+    """Runs cmd, returning (wall seconds, exit code, stdout)."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            env=dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', '')))
+    try:
+        stdout, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        stdout, _ = proc.communicate()
+    return time.perf_counter() - started, proc.returncode, stdout
+
+
+def generate(workdir, products, categories, seed):
+    path = os.path.join(workdir, 'output', 'woolworths_products_nutrition.jsonl')
+    rows = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in scraped_rows(products, categories, seed=seed):
+            f.write(json.dumps({k: v for k, v in row.items() if v is not None}, ensure_ascii=False) + '\n')
+            rows += 1
+    return rows, os.path.getsize(path)
+
+
+def stage_subprocess(args, workdir, timeout):
+    """Runs `bench_data.py --stage ...` in its own process so RSS is measured per stage."""
+    cmd = [sys.executable, os.path.abspath(__file__)] + args
+    wall, code, stdout = run_measured(cmd, workdir, timeout)
+    try:
+        result = json.loads(stdout.decode('utf-8').strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {}
+    result.update({'wall_s': round(wall, 3), 'exit_code': code})
+    return result
+
+
+# --- Stages (run inside the measured subprocess; print one JSON line) ---
+
+def stage_dedupe():
+    import resource
+    import runpy
+    started = time.perf_counter()
+    runpy.run_path(os.path.join(REPO_DIR, 'dedupe_jsonj.py'), run_name='__main__')
+    return {'seconds': round(time.perf_counter() - started, 3),
+            'peak_rss_mb': rss_mb(resource.getrusage(resource.RUSAGE_SELF))}
+
+
+def stage_convert():
+    import resource
+    from convert_csv_to_json import convert
+    started = time.perf_counter()
+    count = convert('output/unique_products_with_categories.jsonl', 'output/unique_products_with_categories_saved.json')
+    shutil.copyfile('output/category_stockcode_mapping.csv', 'output/category_stockcode_mapping_saved.csv')
+    return {'seconds': round(time.perf_counter() - started, 3), 'products': count,
+            'peak_rss_mb': rss_mb(resource.getrusage(resource.RUSAGE_SELF))}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(p * len(values)))], 3) if values else None
+
+
+def stage_app(concurrency, requests_per_endpoint):
+    import resource
+    logging.disable(logging.INFO)  # keep app logging out of the measurement
+    started = time.perf_counter()
+    import app
+    load_s = time.perf_counter() - started
+    rss_after_load = rss_mb(resource.getrusage(resource.RUSAGE_SELF))
+
+    # Biggest categories first: the worst case for the API
+    sizes = app.category_map_df.groupby('ScrapedCategoryID').size().sort_values(ascending=False)
+    sample = list(sizes.index[:5]) + list(sizes.index[-5:])
+    endpoints = {
+        'products': [f'/api/products/{c}' for c in sample],
+        'products_dietary': [f'/api/products/{c}?dietary=vegan' for c in sample],
+        'bins': [f'/api/products/{c}/bins?x=Protein_per_g&y=Sugar_per_100g&resolution=50' for c in sample],
+    }
+
+    def call(url):
+        client = app.app.test_client()
+        t0 = time.perf_counter()
+        response = client.get(url)
+        return (time.perf_counter() - t0) * 1000.0, response.status_code, len(response.data)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for name, urls in endpoints.items():
+            calls = [urls[i % len(urls)] for i in range(requests_per_endpoint)]
+            t0 = time.perf_counter()
+            outcomes = list(executor.map(call, calls))
+            elapsed = time.perf_counter() - t0
+            latencies = [o[0] for o in outcomes]
+            results[name] = {
+                'requests': len(outcomes), 'requests_per_s': round(len(outcomes) / elapsed, 2),
+                'p50_ms': percentile(latencies, 0.5), 'p99_ms': percentile(latencies, 0.99),
+                'errors': sum(1 for o in outcomes if o[1] != 200),
+                'mean_response_bytes': round(sum(o[2] for o in outcomes) / len(outcomes)),
+            }
+    return {'load_and_prepare_s': round(load_s, 3), 'rss_after_load_mb': rss_after_load,
+            'products': len(app.unique_products_df), 'concurrency': concurrency, 'endpoints': results,
+            'peak_rss_mb': rss_mb(resource.getrusage(resource.RUSAGE_SELF))}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def bench_size(products, args):
+    workdir = tempfile.mkdtemp(prefix=f'bench-data-{products}-')
+    try:
+        os.makedirs(os.path.join(workdir, 'output'))
+        started = time.perf_counter()
+        rows, size = generate(workdir, products, args.categories, args.seed)
+        result = {'products': products, 'scraped_rows': rows, 'scraped_jsonl_bytes': size,
+                  'generate_s': round(time.perf_counter() - started, 3)}
+        logging.info(f"[{products}] generated {rows} scraped rows ({size / 1e6:.1f} MB)")
+
+        dedupe = stage_subprocess(['--stage', 'dedupe'], workdir, args.timeout)
+        if dedupe.get('seconds'):
+            dedupe['rows_per_s'] = round(rows / dedupe['seconds'], 1)
+        result['dedupe'] = dedupe
+        logging.info(f"[{products}] dedupe: {dedupe}")
+
+        result['convert'] = stage_subprocess(['--stage', 'convert'], workdir, args.timeout)
+        logging.info(f"[{products}] convert: {result['convert']}")
+
+        result['app'] = stage_subprocess(['--stage', 'app', '--concurrency', str(args.concurrency),
+                                          '--requests', str(args.requests)], workdir, args.timeout)
+        logging.info(f"[{products}] app: {json.dumps(result['app'])}")
+        return result
+    finally:
+        if args.keep:
+            logging.info(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark dedupe, app load and the product API over synthetic catalogues.")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, help="Catalogue sizes in unique products.")
+    parser.add_argument('--categories', type=int, default=400, help="Leaf categories in the synthetic catalogue.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent API client threads.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint.")
+    parser.add_argument('--timeout', type=float, default=3600.0, help="Per-stage timeout in seconds.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help="Keep the generated working directories.")
+    parser.add_argument('--json', help="Write results to this JSON file.")
+    parser.add_argument('--stage', choices=['dedupe', 'convert', 'app'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # Internal: one measured stage, run in the benchmark's working directory
+        stage = {'dedupe': stage_dedupe, 'convert': stage_convert,
+                 'app': lambda: stage_app(args.concurrency, args.requests)}[args.stage]
+        print(json.dumps(stage()))
+        sys.exit(0)
+
+    report = {'commit': git_commit(), 'python': sys.version.split()[0], 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'config': {k: v for k, v in vars(args).items() if k != 'stage'}, 'results': []}
+    for products in args.sizes:
+        report['results'].append(bench_size(products, args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Results written to {args.json}")
+
+# --- END OF FILE bench/bench_data.py ---
@@ -0,0 +1,136 @@
+# --- START OF FILE bench/bench_scraper.py ---
+
+# Scraper throughput benchmark against the offline mock (bench/mock_woolworths.py).
+# Runs bigparallel.py and/or scraper2.py as subprocesses in a scratch directory and reports
+# requests/s, products/s, server-side p50/p99 latency, CPU time and peak RSS.
+#
+#   python bench/bench_scraper.py --scrapers bigparallel --max-workers 8 16 --json bench_output.json
+#
+# Note: scraper2.py has no duplicate-page stop, so it never finishes on categories that repeat
+# their last page; keep --duplicate-page-rate at 0 when benchmarking it.
+
+import argparse
+import csv
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from mock_woolworths import add_config_arguments, config_from_args, start_server
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPERS = {
+    'bigparallel': {'script': 'bigparallel.py', 'output': 'output/woolworths_products_nutrition.jsonl', 'workers': True},
+    'scraper2': {'script': 'scraper2.py', 'output': 'output/woolworths_products_nutrition.csv', 'workers': False},
+}
+
+
+def write_categories_csv(path, leaves):
+    """Writes the discovered_categories.csv a --discover-only run would have produced."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'name', 'parent_id', 'level', 'url_friendly_name'])
+        writer.writeheader()
+        for leaf in leaves:
+            writer.writerow({'id': leaf['NodeId'], 'name': leaf['Description'], 'parent_id': leaf['ParentNodeId'],
+                             'level': leaf['NodeLevel'], 'url_friendly_name': leaf['UrlFriendlyName']})
+
+
+def count_products(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            return sum(1 for line in f if line.strip())
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def run_scraper(name, base_url, state, max_workers, request_delay, timeout):
+    spec = SCRAPERS[name]
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as workdir:
+        os.makedirs(os.path.join(workdir, 'output'))
+        write_categories_csv(os.path.join(workdir, 'output', 'discovered_categories.csv'), state.leaves)
+        cmd = [sys.executable, os.path.join(REPO_DIR, spec['script']), '--scrape-from-file']
+        if spec['workers']:
+            cmd += ['--max-workers', str(max_workers)]
+        env = dict(os.environ, WOOLIES_BASE_URL=base_url, WOOLIES_REQUEST_DELAY=str(request_delay),
+                   PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        urllib.request.urlopen(urllib.request.Request(base_url + '/__reset', method='POST')).read()
+
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timed_out = False
+        deadline = started + timeout
+        # wait4 gives the child's own CPU time and peak RSS
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() > deadline:
+                proc.kill()
+                timed_out = True
+                pid, status, usage = os.wait4(proc.pid, 0)
+                break
+            time.sleep(0.05)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - started
+
+        stats = json.loads(urllib.request.urlopen(base_url + '/__stats').read())
+        products = count_products(os.path.join(workdir, spec['output']))
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {
+        'scraper': name, 'max_workers': max_workers if spec['workers'] else 1, 'request_delay_s': request_delay,
+        'exit_code': proc.returncode, 'timed_out': timed_out, 'wall_s': round(wall, 3),
+        'requests': stats['requests'], 'requests_per_s': round(stats['requests'] / wall, 2),
+        'products': products, 'products_per_s': round(products / wall, 2),
+        'latency_p50_ms': stats['latency_ms']['p50'], 'latency_p99_ms': stats['latency_ms']['p99'],
+        'by_status': stats['by_status'], 'bytes_received': stats['bytes_sent'],
+        'cpu_user_s': round(usage.ru_utime, 3), 'cpu_system_s': round(usage.ru_stime, 3), 'peak_rss_mb': round(rss_mb, 1),
+        'expected_listings': stats['catalogue']['listings'],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against the offline Woolworths mock.")
+    parser.add_argument('--scrapers', nargs='+', choices=sorted(SCRAPERS), default=sorted(SCRAPERS))
+    parser.add_argument('--max-workers', nargs='+', type=int, default=[8], help="Worker counts to try for bigparallel.py.")
+    parser.add_argument('--request-delay', type=float, default=0.0, help="WOOLIES_REQUEST_DELAY passed to the scrapers (default: 0).")
+    parser.add_argument('--timeout', type=float, default=600.0, help="Per-run timeout in seconds.")
+    parser.add_argument('--json', help="Also write the results to this JSON file.")
+    add_config_arguments(parser)
+    parser.set_defaults(duplicate_page_rate=0.0)
+    args = parser.parse_args()
+
+    server, state, base_url = start_server(config_from_args(args))
+    logging.info(f"Mock at {base_url}: {state.stats()['catalogue']}")
+    results = []
+    try:
+        for name in args.scrapers:
+            worker_counts = args.max_workers if SCRAPERS[name]['workers'] else [1]
+            for workers in worker_counts:
+                logging.info(f"Running {name} (workers={workers})...")
+                result = run_scraper(name, base_url, state, workers, args.request_delay, args.timeout)
+                results.append(result)
+                logging.info(json.dumps(result))
+    finally:
+        server.shutdown()
+
+    header = f"{'scraper':<12}{'workers':>8}{'wall s':>9}{'req/s':>9}{'prod/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'cpu s':>8}{'rss MB':>8}"
+    print(header)
+    for r in results:
+        print(f"{r['scraper']:<12}{r['max_workers']:>8}{r['wall_s']:>9.2f}{r['requests_per_s']:>9.1f}{r['products_per_s']:>10.1f}"
+              f"{r['latency_p50_ms']:>9.1f}{r['latency_p99_ms']:>9.1f}{r['cpu_user_s'] + r['cpu_system_s']:>8.2f}{r['peak_rss_mb']:>8.1f}"
+              + ('  TIMED OUT' if r['timed_out'] else ''))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        logging.info(f"Results written to {args.json}")
+
+# --- END OF FILE bench/bench_scraper.py ---
@@ -0,0 +1,139 @@
+# --- bench/catalogue.py ---
+# Deterministic synthetic Woolworths catalogue shared by the offline mock server and benchmarks.
+
+import json
+import random
+
+BRANDS = ['Woolworths', 'Macro', 'Bega', 'Arnott\'s', 'Sanitarium', 'Uncle Tobys', 'Chobani', 'Primo', 'Coon', 'Kellogg\'s']
+NOUNS = ['Yoghurt', 'Muesli', 'Cheese', 'Chicken Breast', 'Crackers', 'Oats', 'Protein Bar', 'Milk', 'Tofu', 'Ham', 'Bread', 'Beans']
+ADJECTIVES = ['Greek', 'Light', 'Original', 'Wholegrain', 'Smoked', 'Organic', 'High Protein', 'Reduced Fat', 'Natural', 'Classic']
+DIETARY = ['', '', 'Vegetarian', 'Vegan, Vegetarian', 'Gluten Free', 'Vegetarian, Gluten Free', 'Halal']
+PACKAGE_SIZES = ['150g', '250g', '500g', '1kg', '2L', '600ml', '12 pack', '170g']
+
+
+def build_categories(level1_count=8, level2_per_level1=6, seed=42):
+    """Returns (level1_nodes, leaf_nodes): the nested tree PiesCategoriesWithSpecials serves and its leaves."""
+    rng = random.Random(seed)
+    tree, leaves = [], []
+    for i in range(level1_count):
+        noun = NOUNS[i % len(NOUNS)]
+        top = {
+            'NodeId': f'1_{1000 + i:X}', 'Description': f'{noun} & More {i}', 'ParentNodeId': '1',
+            'NodeLevel': 1, 'UrlFriendlyName': f'{noun.lower().replace(" ", "-")}-more-{i}', 'Children': [],
+        }
+        for j in range(level2_per_level1):
+            name = f'{rng.choice(ADJECTIVES)} {noun} {j}'
+            leaf = {
+                'NodeId': f'1_{1000 + i:X}_{j}', 'Description': name, 'ParentNodeId': top['NodeId'],
+                'NodeLevel': 2, 'UrlFriendlyName': name.lower().replace(' ', '-'), 'Children': [],
+            }
+            top['Children'].append(leaf)
+            leaves.append(leaf)
+        tree.append(top)
+    return tree, leaves
+
+
+def make_product(stockcode, rng):
+    """One product as the browse/category API returns it (nutrition as an embedded JSON string)."""
+    name = f'{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'
+    protein, fat, carbs = rng.uniform(0, 35), rng.uniform(0, 40), rng.uniform(0, 75)
+    sugars = rng.uniform(0, carbs)
+    energy = 17 * protein + 37 * fat + 17 * carbs
+    nutrition = {'Attributes': [
+        {'Name': 'Serving Size', 'Value': f'{rng.choice([30, 40, 100, 170, 250])}g'},
+        {'Name': 'Energy kJ Quantity Per 100g', 'Value': f'{energy:.0f}kJ'},
+        {'Name': 'Protein Quantity Per 100g', 'Value': f'{protein:.1f}g'},
+        {'Name': 'Protein Quantity Per Serve', 'Value': f'{protein * 0.4:.1f}g'},
+        {'Name': 'Fat Total Quantity Per 100g', 'Value': f'{fat:.1f}g'},
+        {'Name': 'Carbohydrate Quantity Per 100g', 'Value': f'{carbs:.1f}g'},
+        {'Name': 'Sugars Quantity Per 100g', 'Value': f'{sugars:.1f}g' if rng.random() > 0.05 else 'LESS THAN 1g'},
+        {'Name': 'Sodium Quantity Per 100g', 'Value': f'{rng.uniform(0, 900):.0f}mg'},
+    ]}
+    return {
+        'Stockcode': stockcode,
+        'Name': name,
+        'DisplayName': f'{name} {rng.choice(PACKAGE_SIZES)}',
+        'UrlFriendlyName': name.lower().replace(' ', '-').replace("'", ''),
+        'Brand': name.split(' ')[0],
+        'Price': round(rng.uniform(0.9, 25), 2),
+        'CupString': f'${rng.uniform(0.2, 4):.2f} / 100G',
+        'PackageSize': rng.choice(PACKAGE_SIZES),
+        'AdditionalAttributes': {
+            'nutritionalinformation': json.dumps(nutrition) if rng.random() > 0.1 else None,
+            'ingredients': ', '.join(rng.sample(['Milk', 'Sugar', 'Oats', 'Salt', 'Wheat Flour', 'Soy', 'Water', 'Canola Oil'], 4)),
+            'allergystatement': rng.choice(['Contains Milk.', 'Contains Wheat, Gluten.', 'Contains Soy.', '']),
+            'allergenmaybepresent': rng.choice(['Peanuts, Tree Nuts', '', 'Sesame']),
+            'lifestyleclaim': rng.choice(['', 'High in Protein', 'Low Fat']),
+            'lifestyleanddietarystatement': rng.choice(DIETARY),
+            'healthstarrating': rng.choice(['1.5', '2', '3.5', '4', '5', None]),
+            'containsgluten': rng.choice(['true', 'false']),
+            'containsnuts': rng.choice(['true', 'false', 'false']),
+        },
+    }
+
+
+def build_catalogue(leaves, products_per_category=(40, 160), overlap=0.15, seed=42):
+    """Returns {leaf NodeId: [product dicts]}. A fraction `overlap` of each category's products
+    also appear in another category, as real cross-listed products do."""
+    rng = random.Random(seed)
+    by_category = {}
+    next_stockcode = 100000
+    all_products = []
+    for leaf in leaves:
+        count = rng.randint(*products_per_category)
+        products = []
+        for _ in range(count):
+            if all_products and rng.random() < overlap:
+                products.append(rng.choice(all_products))
+            else:
+                product = make_product(next_stockcode, rng)
+                next_stockcode += 1
+                all_products.append(product)
+                products.append(product)
+        by_category[leaf['NodeId']] = products
+    return by_category
+
+
+def scraped_rows(product_count, category_count=400, mean_extra_categories=0.6, seed=42):
+    """Yields flat rows as bigparallel.py's save_data writes them: one row per (product, category)
+    listing, nutrition already parsed into Nutr_* strings. Cheap enough for millions of products."""
+    rng = random.Random(seed)
+    level1_count = max(1, category_count // 20)
+    categories = []
+    for c in range(category_count):
+        parent = c % level1_count
+        categories.append((f'1_{c:05X}', f'{ADJECTIVES[c % len(ADJECTIVES)]} {NOUNS[c % len(NOUNS)]} {c}', f'1_L{parent:03d}', 2))
+    level1 = [(f'1_L{p:03d}', f'{NOUNS[p % len(NOUNS)]} Aisle {p}', '1', 1) for p in range(level1_count)]
+    for i in range(product_count):
+        protein, fat, carbs = rng.uniform(0, 35), rng.uniform(0, 40), rng.uniform(0, 75)
+        brand, adjective, noun = rng.choice(BRANDS), rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        base = {
+            'Stockcode': 100000 + i,
+            'ProductName': f'{brand} {adjective} {noun} {rng.choice(PACKAGE_SIZES)}',
+            'Brand': brand,
+            'Price': round(rng.uniform(0.9, 25), 2),
+            'CupString': f'${rng.uniform(0.2, 4):.2f} / 100G',
+            'PackageSize': rng.choice(PACKAGE_SIZES),
+            'Ingredients': 'Milk, Sugar, Oats, Salt, Wheat Flour, Soy, Water, Canola Oil, Emulsifier (Soy Lecithin)',
+            'AllergyStatement': rng.choice(['Contains Milk.', 'Contains Wheat, Gluten.', 'Contains Soy.', None]),
+            'LifestyleAndDietaryStatement': rng.choice(DIETARY) or None,
+            'HealthStarRating': rng.choice(['1.5', '2', '3.5', '4', '5', None]),
+            'ContainsGluten': rng.choice(['true', 'false']),
+            'ContainsNuts': rng.choice(['true', 'false', 'false']),
+        }
+        if rng.random() > 0.1:
+            base.update({
+                'Nutr_Energy_kJ_per_100g': f'{17 * protein + 37 * fat + 17 * carbs:.0f}kJ',
+                'Nutr_Protein_per_100g': f'{protein:.1f}g',
+                'Nutr_Fat_Total_per_100g': f'{fat:.1f}g',
+                'Nutr_Carbohydrate_per_100g': f'{carbs:.1f}g',
+                'Nutr_Sugars_per_100g': f'{rng.uniform(0, carbs):.1f}g',
+                'Nutr_Sodium_per_100g': f'{rng.uniform(0, 900):.0f}mg',
+            })
+        listings = 1 + min(4, int(rng.expovariate(1 / mean_extra_categories))) if mean_extra_categories else 1
+        leaves = rng.sample(categories, listings)
+        # Level-1 categories are scraped too, so a product is also listed under each of its aisles
+        aisles = {level1[int(parent_id[4:])] for _, _, parent_id, _ in leaves}
+        for cat_id, cat_name, parent_id, level in leaves + sorted(aisles):
+            yield dict(base, ScrapedCategoryID=cat_id, ScrapedCategoryName=cat_name,
+                       ScrapedCategoryParentID=parent_id, ScrapedCategoryLevel=level)
@@ -0,0 +1,235 @@
+# --- START OF FILE bench/mock_woolworths.py ---
+
+# Offline stand-in for the Woolworths endpoints the scrapers use, so throughput can be measured
+# without touching the live site. Serves:
+#   GET  /                                        session warm-up page (sets a cookie)
+#   GET  /apis/ui/PiesCategoriesWithSpecials      category tree
+#   POST /apis/ui/browse/category                 paginated products with TotalRecordCount
+#   GET  /apis/ui/product/detail/<stockcode>      one product (used by rescrape.py)
+#   GET  /__stats, POST /__reset                  request counters and latency samples for benchmarks
+#
+# Latency, 429/5xx injection and the "last page repeats forever" behaviour are configurable.
+# Point a scraper at it with WOOLIES_BASE_URL=http://127.0.0.1:<port>.
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from catalogue import build_categories, build_catalogue
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_PORT = 8765
+DETAIL_PATH = '/apis/ui/product/detail/'
+
+
+class MockConfig:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, rate_429=0.0, rate_5xx=0.0,
+                 duplicate_page_rate=0.2, level1_count=8, level2_per_level1=6,
+                 products_per_category=(40, 160), seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        # Fraction of categories that omit TotalRecordCount and repeat their last page instead of
+        # returning an empty one, so the scraper has to fall back on duplicate-page detection
+        self.duplicate_page_rate = duplicate_page_rate
+        self.level1_count = level1_count
+        self.level2_per_level1 = level2_per_level1
+        self.products_per_category = products_per_category
+        self.seed = seed
+
+
+class MockState:
+    """Catalogue plus thread-safe request statistics."""
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.tree, self.leaves = build_categories(config.level1_count, config.level2_per_level1, config.seed)
+        self.products = build_catalogue(self.leaves, config.products_per_category, seed=config.seed)
+        self.products_by_stockcode = {p['Stockcode']: p for products in self.products.values() for p in products}
+        self.duplicate_page_categories = {
+            leaf['NodeId'] for leaf in self.leaves if random.Random(leaf['NodeId']).random() < config.duplicate_page_rate
+        }
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.requests = 0
+            self.by_path = {}
+            self.by_status = {}
+            self.bytes_sent = 0
+            self.latencies_ms = []
+            self.started = time.time()
+
+    def record(self, path, status, size, elapsed_ms):
+        with self.stats_lock:
+            self.requests += 1
+            self.by_path[path] = self.by_path.get(path, 0) + 1
+            self.by_status[str(status)] = self.by_status.get(str(status), 0) + 1
+            self.bytes_sent += size
+            self.latencies_ms.append(elapsed_ms)
+
+    def stats(self):
+        with self.stats_lock:
+            latencies = sorted(self.latencies_ms)
+            pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+            return {
+                'requests': self.requests, 'by_path': dict(self.by_path), 'by_status': dict(self.by_status),
+                'bytes_sent': self.bytes_sent, 'elapsed_s': time.time() - self.started,
+                'latency_ms': {'p50': pct(0.50), 'p90': pct(0.90), 'p99': pct(0.99), 'max': latencies[-1] if latencies else None},
+                'catalogue': {'categories': len(self.leaves), 'products': len(self.products_by_stockcode),
+                              'listings': sum(len(p) for p in self.products.values())},
+            }
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def product_detail(self, stockcode):
+        product = self.products_by_stockcode.get(int(stockcode)) if stockcode.isdigit() else None  # Stockcodes are ints in the API
+        if product is None:
+            return None
+        return {'Product': product, 'AdditionalAttributes': product.get('AdditionalAttributes') or {}}
+
+    def browse_page(self, category_id, page_number, page_size):
+        products = self.products.get(category_id, [])
+        last_page = max(1, (len(products) + page_size - 1) // page_size)
+        repeats = category_id in self.duplicate_page_categories
+        if page_number > last_page and repeats:
+            page_number = last_page
+        page = products[(page_number - 1) * page_size: page_number * page_size]
+        body = {'Bundles': [{'Products': [p]} for p in page]}
+        if not repeats:
+            body['TotalRecordCount'] = len(products)
+        return body
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real site
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, body, content_type='application/json', headers=None):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+            return len(data)
+
+        def _simulate(self):
+            """Sleeps for the configured latency and returns an injected error status, if any."""
+            config = state.config
+            delay = max(0.0, config.latency_ms + (state.random() * 2 - 1) * config.jitter_ms)
+            time.sleep(delay / 1000.0)
+            roll = state.random()
+            if roll < config.rate_429:
+                return 429
+            if roll < config.rate_429 + config.rate_5xx:
+                return [500, 502, 503, 504][int(state.random() * 4)]
+            return None
+
+        def _handle(self, method):
+            started = time.perf_counter()
+            path = self.path.split('?', 1)[0]
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            status, size = 404, 0
+            try:
+                if path == '/__stats':
+                    status, size = 200, self._send(200, state.stats())
+                    return
+                if path == '/__reset' and method == 'POST':
+                    state.reset_stats()
+                    status, size = 200, self._send(200, {'ok': True})
+                    return
+                injected = self._simulate()
+                if injected:
+                    headers = {'Retry-After': '1'} if injected == 429 else None
+                    status, size = injected, self._send(injected, {'error': 'injected'}, headers=headers)
+                elif path == '/' and method == 'GET':
+                    status, size = 200, self._send(200, b'<html><body>mock</body></html>', 'text/html',
+                                                   {'Set-Cookie': 'mock-session=1; Path=/'})
+                elif path == '/apis/ui/PiesCategoriesWithSpecials' and method == 'GET':
+                    status, size = 200, self._send(200, {'Categories': state.tree})
+                elif path == '/apis/ui/browse/category' and method == 'POST':
+                    payload = json.loads(raw or b'{}')
+                    body = state.browse_page(str(payload.get('categoryId')), int(payload.get('pageNumber', 1)),
+                                             int(payload.get('pageSize', 36)) or 36)
+                    status, size = 200, self._send(200, body)
+                elif path.startswith(DETAIL_PATH) and method == 'GET':
+                    body = state.product_detail(path[len(DETAIL_PATH):])
+                    status = 200 if body is not None else 404
+                    size = self._send(status, body if body is not None else {'error': 'not found'})
+                else:
+                    status, size = 404, self._send(404, {'error': 'not found'})
+            finally:
+                if not path.startswith('/__'):
+                    # Detail requests are counted under one path rather than one per stockcode
+                    state.record(DETAIL_PATH + '<stockcode>' if path.startswith(DETAIL_PATH) else path, status, size, (time.perf_counter() - started) * 1000.0)
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+    return Handler
+
+
+def start_server(config=None, host='127.0.0.1', port=0):
+    """Starts the mock in a background thread. Returns (server, state, base_url)."""
+    state = MockState(config or MockConfig())
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-woolworths', daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    return server, state, base_url
+
+
+def add_config_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Mean injected latency per request (default: 50).")
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help="Uniform +/- jitter on the latency (default: 20).")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help="Fraction of requests answered with 500/502/503/504.")
+    parser.add_argument('--duplicate-page-rate', type=float, default=0.2, help="Fraction of categories that repeat their last page and omit TotalRecordCount.")
+    parser.add_argument('--level1', type=int, default=8, help="Number of level-1 categories.")
+    parser.add_argument('--level2', type=int, default=6, help="Leaf categories per level-1 category.")
+    parser.add_argument('--min-products', type=int, default=40, help="Minimum products per leaf category.")
+    parser.add_argument('--max-products', type=int, default=160, help="Maximum products per leaf category.")
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def config_from_args(args):
+    return MockConfig(args.latency_ms, args.jitter_ms, args.rate_429, args.rate_5xx, args.duplicate_page_rate,
+                      args.level1, args.level2, (args.min_products, args.max_products), args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the offline Woolworths API mock.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server, state, base_url = start_server(config_from_args(args), port=args.port)
+    stats = state.stats()['catalogue']
+    logging.info(f"Mock serving {stats['products']} products in {stats['categories']} categories at {base_url}")
+    logging.info(f"Run a scraper against it with WOOLIES_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+# --- END OF FILE bench/mock_woolworths.py ---
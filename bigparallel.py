@@ -11,6 +11,10 @@ import os
 import argparse
 import concurrent.futures # Added for parallelization
 
+from metrics import Registry, start_http_server
+from product_schema import DESIRED_COLUMNS
+from transport import make_transport
+
 # --- Basic Logging Setup ---
 # (Keep unchanged)
 logging.basicConfig(
@@ -25,9 +29,10 @@ logging.basicConfig(
 
 # --- Constants ---
 # (Keep API URLs, BASE_URL, Headers, Config, File Paths)
-CATEGORY_API_URL = "https://www.woolworths.com.au/apis/ui/PiesCategoriesWithSpecials"
-PRODUCT_API_URL = "https://www.woolworths.com.au/apis/ui/browse/category"
-BASE_URL = "https://www.woolworths.com.au"
+# WOOLIES_BASE_URL points the scraper at another host, e.g. the offline mock in bench/
+BASE_URL = os.environ.get('WOOLIES_BASE_URL', "https://www.woolworths.com.au").rstrip('/')
+CATEGORY_API_URL = f"{BASE_URL}/apis/ui/PiesCategoriesWithSpecials"
+PRODUCT_API_URL = f"{BASE_URL}/apis/ui/browse/category"
 
 SESSION_HEADERS = { # Headers for the session
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36',
@@ -41,7 +46,7 @@ SPECIFIC_POST_HEADERS = { # Headers specific to the POST request
 }
 
 PAGE_SIZE = 36
-REQUEST_DELAY_SECONDS = 5 # Delay *within* a single category's pagination
+REQUEST_DELAY_SECONDS = float(os.environ.get('WOOLIES_REQUEST_DELAY', 5)) # Delay *within* a single category's pagination
 POST_TIMEOUT_SECONDS = 90
 GET_TIMEOUT_SECONDS = 30
 
@@ -61,6 +66,35 @@ MAX_PAGES_PER_CATEGORY = 200
 # *** Parallelization Configuration ***
 MAX_WORKERS = 8 # Adjust based on your system and network. Start lower (e.g., 4-8) and increase if stable.
 
+# --- Metrics ---
+# Exposed on --metrics-port while running; summary logged and written to METRICS_SUMMARY_JSON at the end
+METRICS_SUMMARY_JSON = 'output/scraper_metrics_summary.json'
+METRICS = Registry()
+REQUESTS_IN_FLIGHT = METRICS.gauge('scraper_requests_in_flight', 'HTTP requests currently in flight.')
+REQUEST_LATENCY = METRICS.histogram('scraper_request_latency_seconds', 'HTTP request latency by endpoint.', ['endpoint'])
+RESPONSES = METRICS.counter('scraper_responses_total', 'HTTP responses by endpoint and status (or timeout/error).', ['endpoint', 'status'])
+RETRIES = METRICS.counter('scraper_retries_total', 'Retried product page requests by reason (status code, timeout or error).', ['reason'])
+PAGES = METRICS.counter('scraper_pages_total', 'Product pages parsed.')
+PRODUCTS = METRICS.counter('scraper_products_total', 'Products parsed.')
+BYTES_DOWNLOADED = METRICS.counter('scraper_bytes_downloaded_total', 'Response body bytes by endpoint.', ['endpoint'])
+PARSE_SECONDS = METRICS.histogram('scraper_parse_seconds', 'Time to decode and parse one product page.',
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+CATEGORY_QUEUE = METRICS.gauge('scraper_categories', 'Categories by state (queued, running, awaiting_save).', ['state'])
+SAVE_SECONDS = METRICS.histogram('scraper_save_seconds', 'save_data flush time.')
+
+def timed_request(session, method, endpoint, url, **kwargs):
+    """session.request with latency, in-flight, status and byte metrics recorded under `endpoint`."""
+    with REQUESTS_IN_FLIGHT.track(), REQUEST_LATENCY.labels(endpoint).time():
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            RESPONSES.labels(endpoint, 'timeout').inc(); raise
+        except requests.exceptions.RequestException:
+            RESPONSES.labels(endpoint, 'error').inc(); raise
+    RESPONSES.labels(endpoint, response.status_code).inc()
+    BYTES_DOWNLOADED.labels(endpoint).inc(len(response.content))
+    return response
+
 # --- Category Discovery Functions ---
 # (Keep unchanged)
 def extract_recursive(category_node, category_list):
@@ -78,7 +112,7 @@ def extract_recursive(category_node, category_list):
 def get_categories(session):
     all_categories = []; logging.info(f"Fetching category structure from {CATEGORY_API_URL}...")
     try:
-        response = session.get(CATEGORY_API_URL, timeout=GET_TIMEOUT_SECONDS)
+        response = timed_request(session, 'GET', 'categories', CATEGORY_API_URL, timeout=GET_TIMEOUT_SECONDS)
         response.raise_for_status(); logging.info(f"Category data received (Status: {response.status_code}).")
         data = response.json(); logging.info("Parsed category JSON.")
         if 'Categories' in data and isinstance(data['Categories'], list):
@@ -110,15 +144,54 @@ def parse_nutrition(nutrition_string):
     except json.JSONDecodeError: logging.debug(f"Minor JSON decode error nutrition: {nutrition_string[:50]}..."); return {}
     except Exception as e: logging.error(f"Nutrition parsing error: {e}"); return {}
 
+# --- Product Row Builder ---
+# Shared by the category scrape and rescrape.py (product detail responses have the same fields).
+# With no category_info the ScrapedCategory* fields are None.
+def build_product_row(product, category_info=None):
+    category_info = category_info or {}
+    additional_attrs = product.get('AdditionalAttributes') or {}
+    product_row = {
+        'Stockcode': product.get('Stockcode'),
+        'ProductName': product.get('DisplayName', product.get('Name')),
+        'Brand': product.get('Brand'),
+        'Price': product.get('Price'),
+        'CupString': product.get('CupString'),
+        'PackageSize': product.get('PackageSize'),
+        'ProductURL': f"{BASE_URL}/shop/productdetails/{product.get('Stockcode')}/{product.get('UrlFriendlyName')}" if product.get('Stockcode') and product.get('UrlFriendlyName') else None,
+        'ScrapedCategoryID': category_info.get('id'),
+        'ScrapedCategoryName': category_info.get('name', category_info.get('id')),
+        'ScrapedCategoryParentID': category_info.get('parent_id'),
+        'ScrapedCategoryLevel': category_info.get('level'),
+        'Ingredients': additional_attrs.get('ingredients'),
+        'AllergyStatement': additional_attrs.get('allergystatement'),
+        'AllergenMayBePresent': additional_attrs.get('allergenmaybepresent'),
+        'LifestyleClaim': additional_attrs.get('lifestyleclaim'),
+        'LifestyleAndDietaryStatement': additional_attrs.get('lifestyleanddietarystatement'),
+        'HealthStarRating': additional_attrs.get('healthstarrating'),
+        'ContainsGluten': additional_attrs.get('containsgluten'),
+        'ContainsNuts': additional_attrs.get('containsnuts')
+    }
+    product_row.update(parse_nutrition(additional_attrs.get('nutritionalinformation')))
+    return product_row
+
+class CategoryScrapeError(Exception):
+    """A category scrape stopped before the end of the category (only raised with raise_on_error=True).
+    `products` holds what was collected before it stopped."""
+    def __init__(self, message, products):
+        super().__init__(message)
+        self.products = products
+
+
 # --- Product Scraping Function (Unchanged - Called by Threads) ---
 # Note: This function will now be executed concurrently by multiple threads.
 # The REQUEST_DELAY_SECONDS applies *within* the pagination loop for a *single* category.
 # Overall request rate increases due to parallel execution.
-def scrape_products_for_category(session, category_info, is_test_run=False):
+def scrape_products_for_category(session, category_info, is_test_run=False, raise_on_error=False):
+    # `session` is the shared Transport (transport.py): thread-safe, with a pool sized to MAX_WORKERS.
+    # By default a failed page ends the category and returns the products so far; with raise_on_error
+    # it raises CategoryScrapeError instead, so a caller that can retry (crawl_coordinator.py) knows
+    # the category is incomplete and can requeue it.
     category_id = category_info.get('id');
-    # ** Thread Safety Note: If issues arise with shared session, create session here instead **
-    # session = requests.Session()
-    # session.headers.update(SESSION_HEADERS)
 
     if not category_id: logging.warning(f"Missing 'id' in {category_info}. Skipping."); return []
     category_name = category_info.get('name', category_id)
@@ -162,10 +235,11 @@ def scrape_products_for_category(session, category_info, is_test_run=False):
 
             try:
                 # Using the potentially shared session object passed as an argument
-                response = session.post(PRODUCT_API_URL, headers=current_post_headers, json=payload, timeout=POST_TIMEOUT_SECONDS)
+                response = timed_request(session, 'POST', 'browse', PRODUCT_API_URL, headers=current_post_headers, json=payload, timeout=POST_TIMEOUT_SECONDS)
 
-                if response.status_code in [500, 502, 503, 504]: logging.warning(f"{log_prefix}: Server error ({response.status_code}) page {page_number}. Retrying..."); retry_count += 1; time.sleep(request_delay * (retry_count + 1)); continue
+                if response.status_code in [500, 502, 503, 504]: logging.warning(f"{log_prefix}: Server error ({response.status_code}) page {page_number}. Retrying..."); RETRIES.labels(response.status_code).inc(); retry_count += 1; time.sleep(request_delay * (retry_count + 1)); continue
                 response.raise_for_status(); logging.debug(f"{log_prefix}: Received Page {page_number} (Status: {response.status_code}).")
+                parse_started = time.perf_counter()
                 data = response.json()
 
                 # --- Check for Total Records ---
@@ -200,31 +274,8 @@ def scrape_products_for_category(session, category_info, is_test_run=False):
                 # --- Process Products ---
                 logging.debug(f"{log_prefix}: Found {len(products_on_page_list)} products page {page_number}.")
                 for product in products_on_page_list:
-                    additional_attrs = product.get('AdditionalAttributes', {})
-                    nutrition_string = additional_attrs.get('nutritionalinformation') if additional_attrs else None
-                    parsed_nutrition = parse_nutrition(nutrition_string)
-                    product_row = {
-                        'Stockcode': product.get('Stockcode'),
-                        'ProductName': product.get('DisplayName', product.get('Name')),
-                        'Brand': product.get('Brand'),
-                        'Price': product.get('Price'),
-                        'CupString': product.get('CupString'),
-                        'PackageSize': product.get('PackageSize'),
-                        'ProductURL': f"{BASE_URL}/shop/productdetails/{product.get('Stockcode')}/{product.get('UrlFriendlyName')}" if product.get('Stockcode') and product.get('UrlFriendlyName') else None,
-                        'ScrapedCategoryID': category_id,
-                        'ScrapedCategoryName': category_name,
-                        'ScrapedCategoryParentID': category_info.get('parent_id'),
-                        'ScrapedCategoryLevel': category_info.get('level'),
-                        'Ingredients': additional_attrs.get('ingredients'),
-                        'AllergyStatement': additional_attrs.get('allergystatement'),
-                        'AllergenMayBePresent': additional_attrs.get('allergenmaybepresent'),
-                        'LifestyleClaim': additional_attrs.get('lifestyleclaim'),
-                        'LifestyleAndDietaryStatement': additional_attrs.get('lifestyleanddietarystatement'),
-                        'HealthStarRating': additional_attrs.get('healthstarrating'),
-                        'ContainsGluten': additional_attrs.get('containsgluten'),
-                        'ContainsNuts': additional_attrs.get('containsnuts')
-                    }
-                    product_row.update(parsed_nutrition); products_in_category.append(product_row)
+                    products_in_category.append(build_product_row(product, category_info))
+                PARSE_SECONDS.observe(time.perf_counter() - parse_started); PAGES.inc(); PRODUCTS.inc(len(products_on_page_list))
 
                 # --- Stop Condition 3: Reached Calculated Last Page ---
                 if calculated_last_page is not None and page_number >= calculated_last_page:
@@ -233,13 +284,24 @@ def scrape_products_for_category(session, category_info, is_test_run=False):
 
                 break # Successful page processed, break retry loop
 
-            except requests.exceptions.Timeout: logging.warning(f"{log_prefix}: Timeout page {page_number}. Retrying..."); retry_count += 1
-            except requests.exceptions.RequestException as e: logging.error(f"{log_prefix}: Request error page {page_number}: {e}. Retrying..."); retry_count += 1
-            except json.JSONDecodeError as e: logging.error(f"{log_prefix}: JSON decode error page {page_number}: {e}. Stopping category."); return products_in_category # Return what we have
-            except Exception as e: logging.error(f"{log_prefix}: Unexpected error page {page_number}: {e}. Stopping category."); return products_in_category # Return what we have
+            except requests.exceptions.Timeout: logging.warning(f"{log_prefix}: Timeout page {page_number}. Retrying..."); RETRIES.labels('timeout').inc(); retry_count += 1
+            except requests.exceptions.RequestException as e:
+                logging.error(f"{log_prefix}: Request error page {page_number}: {e}. Retrying..."); retry_count += 1
+                RETRIES.labels(e.response.status_code if getattr(e, 'response', None) is not None else 'error').inc()
+            except json.JSONDecodeError as e:
+                logging.error(f"{log_prefix}: JSON decode error page {page_number}: {e}. Stopping category.")
+                if raise_on_error: raise CategoryScrapeError(f"JSON decode error on page {page_number}: {e}", products_in_category) from e
+                return products_in_category # Return what we have
+            except Exception as e:
+                logging.error(f"{log_prefix}: Unexpected error page {page_number}: {e}. Stopping category.")
+                if raise_on_error: raise CategoryScrapeError(f"Unexpected error on page {page_number}: {e}", products_in_category) from e
+                return products_in_category # Return what we have
             if retry_count < max_retries: time.sleep(request_delay * (retry_count + 1))
 
-        if retry_count == max_retries: logging.error(f"{log_prefix}: Max retries page {page_number}. Stopping category."); break
+        if retry_count == max_retries:
+            logging.error(f"{log_prefix}: Max retries page {page_number}. Stopping category.")
+            if raise_on_error: raise CategoryScrapeError(f"Max retries on page {page_number}", products_in_category)
+            break
         if response and response.ok and not (retry_count == max_retries):
             if calculated_last_page is None or page_number < calculated_last_page: # Only increment if not at calculated end
                  stockcodes_on_previous_page = stockcodes_on_current_page
@@ -247,7 +309,10 @@ def scrape_products_for_category(session, category_info, is_test_run=False):
                  # Apply delay *between* successful page requests within this category thread
                  time.sleep(request_delay)
             else: break # Break if we just processed the calculated last page
-        else: logging.warning(f"{log_prefix}: Exiting pagination due to errors page {page_number}."); break
+        else:
+            logging.warning(f"{log_prefix}: Exiting pagination due to errors page {page_number}.")
+            if raise_on_error: raise CategoryScrapeError(f"Errors on page {page_number}", products_in_category)
+            break
 
     # No delay needed here, as the main loop manages processing completed futures
     # if made_request: logging.debug(f"{log_prefix}: Waiting {request_delay}s before next action..."); time.sleep(request_delay)
@@ -255,25 +320,27 @@ def scrape_products_for_category(session, category_info, is_test_run=False):
     return products_in_category # Return list of products for this category
 
 
-# --- save_data function (Unchanged - Called Sequentially by Main Thread) ---
+def scrape_category_tracked(session, category_info, is_test_run=False):
+    """scrape_products_for_category, keeping the category queue gauges up to date."""
+    CATEGORY_QUEUE.labels('queued').dec(); CATEGORY_QUEUE.labels('running').inc()
+    try:
+        return scrape_products_for_category(session, category_info, is_test_run)
+    finally:
+        CATEGORY_QUEUE.labels('running').dec(); CATEGORY_QUEUE.labels('awaiting_save').inc()
+
+
+# --- save_data function (Called Sequentially by Main Thread) ---
 def save_data(data_list, csv_filename, jsonl_filename, is_first_csv_save):
     if not data_list: logging.info("No new data to save."); return
+    with SAVE_SECONDS.time():
+        _save_data(data_list, csv_filename, jsonl_filename, is_first_csv_save)
+
+def _save_data(data_list, csv_filename, jsonl_filename, is_first_csv_save):
     logging.info(f"Appending {len(data_list)} products to {csv_filename} and {jsonl_filename}...")
     # CSV
     try:
         df = pd.DataFrame(data_list)
-        desired_columns = [
-            'Stockcode', 'ProductName', 'Brand', 'Price', 'CupString', 'PackageSize', 'ProductURL',
-            'ScrapedCategoryID', 'ScrapedCategoryName', 'ScrapedCategoryParentID', 'ScrapedCategoryLevel',
-            'Ingredients', 'AllergyStatement', 'AllergenMayBePresent', 'LifestyleClaim',
-            'LifestyleAndDietaryStatement', 'HealthStarRating', 'ContainsGluten', 'ContainsNuts',
-            'Nutr_ServingSize', 'Nutr_ServingsPerPack', 'Nutr_Energy_kJ_per_100g', 'Nutr_Energy_kJ_per_Serve',
-            'Nutr_Protein_g_per_100g', 'Nutr_Protein_g_per_Serve', 'Nutr_Fat_Total_g_per_100g', 'Nutr_Fat_Total_g_per_Serve',
-            'Nutr_Fat_Saturated_g_per_100g', 'Nutr_Fat_Saturated_g_per_Serve', 'Nutr_Carbohydrate_g_per_100g',
-            'Nutr_Carbohydrate_g_per_Serve', 'Nutr_Sugars_g_per_100g', 'Nutr_Sugars_g_per_Serve',
-            'Nutr_Sodium_mg_per_100g', 'Nutr_Sodium_mg_per_Serve', 'Nutr_Calcium_mg_per_100g', 'Nutr_Calcium_mg_per_Serve',
-            'Nutr_Dietary_Fibre_g_per_100g', 'Nutr_Dietary_Fibre_g_per_Serve'
-        ]
+        desired_columns = DESIRED_COLUMNS
         all_found_columns = df.columns.tolist(); extra_columns = sorted([col for col in all_found_columns if col not in desired_columns])
         final_column_order = desired_columns + extra_columns; df = df.reindex(columns=final_column_order)
         file_exists = os.path.exists(csv_filename); write_header = not file_exists or is_first_csv_save
@@ -297,11 +364,14 @@ if __name__ == "__main__":
     parser.add_argument('--scrape-from-file', action='store_true', help=f"Scrape all categories listed in {DISCOVERED_CATEGORIES_CSV}.")
     parser.add_argument('--test-run', action='store_true', help=f"Limited test scrape (first {TEST_RUN_CATEGORY_LIMIT} cats, {TEST_RUN_PAGE_LIMIT} pages each, {MAX_WORKERS} workers) using {DISCOVERED_CATEGORIES_CSV}.")
     parser.add_argument('--max-workers', type=int, default=MAX_WORKERS, help=f"Number of parallel workers (default: {MAX_WORKERS}).") # Added max-workers arg
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running.")
     args = parser.parse_args()
 
     # Update MAX_WORKERS if provided via command line
     MAX_WORKERS = args.max_workers
     logging.info(f"Using MAX_WORKERS = {MAX_WORKERS}")
+    if args.metrics_port is not None:
+        start_http_server(METRICS, args.metrics_port)
 
 
     output_dir = 'output'
@@ -309,11 +379,11 @@ if __name__ == "__main__":
         try: os.makedirs(output_dir); logging.info(f"Created directory: {output_dir}")
         except OSError as e: logging.critical(f"Failed create dir '{output_dir}': {e}. Exiting."); exit()
 
-    # Initialize ONE session for potential sharing (see note above)
-    session = requests.Session(); session.headers.update(SESSION_HEADERS)
+    # One pooled transport shared by every worker (+1 connection for the main thread)
+    session = make_transport(SESSION_HEADERS, pool_size=MAX_WORKERS + 1)
     logging.info("Attempting initial GET to activate session...")
     try:
-        init_resp = session.get(BASE_URL, timeout=GET_TIMEOUT_SECONDS); init_resp.raise_for_status();
+        session.warm_up(BASE_URL, GET_TIMEOUT_SECONDS, request=lambda method, url, **kw: timed_request(session, method, 'home', url, **kw))
         logging.info(f"Initial GET OK. Session active."); time.sleep(1)
     except requests.exceptions.RequestException as e: logging.warning(f"Initial GET failed: {e}. Proceeding anyway.")
 
@@ -374,13 +444,15 @@ if __name__ == "__main__":
         with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             # Store futures keyed by category ID for potential reference (optional)
             # future_to_category = {executor.submit(scrape_products_for_category, session, category, is_test): category['id'] for category in category_list}
-            futures = [executor.submit(scrape_products_for_category, session, category, is_test) for category in category_list]
+            CATEGORY_QUEUE.labels('queued').set(len(category_list))
+            futures = [executor.submit(scrape_category_tracked, session, category, is_test) for category in category_list]
             total_categories = len(futures)
             logging.info(f"Submitted {total_categories} categories to the executor.")
 
             # Process results as they complete
             for future in concurrent.futures.as_completed(futures):
                 categories_processed_count += 1
+                CATEGORY_QUEUE.labels('awaiting_save').dec()
                 try:
                     # Get the result (list of product dicts) from the completed future
                     products_from_cat = future.result()
@@ -409,6 +481,11 @@ if __name__ == "__main__":
         logging.info(f"Total products saved: {total_scraped_count}")
         if total_scraped_count > 0: logging.info(f"Data saved to {output_csv_filename} and {output_jsonl_filename}")
         else: logging.warning("No products scraped.");
+        METRICS.log_summary()
+        try:
+            with open(METRICS_SUMMARY_JSON, 'w', encoding='utf-8') as f: json.dump(METRICS.summary(), f, indent=2)
+            logging.info(f"Metrics summary saved to {METRICS_SUMMARY_JSON}")
+        except OSError as e: logging.error(f"Failed to save metrics summary: {e}")
         logging.info(f"=== {run_mode} Finished ===")
 
     else:
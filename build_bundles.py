@@ -0,0 +1,173 @@
+# --- START OF FILE build_bundles.py ---
+
+# Build step for the front end's data: splits the product JSON and category mapping into one
+# bundle per level-1 category, minified, content-hashed and precompressed (gzip + brotli).
+# app.py serves them with immutable cache headers; main.js/data_worker.js load them via the manifest.
+# The manifest also lists every category with the bundle holding its products, so the front end can
+# render the category selector and fetch just the bundle a view needs, loading the rest behind it.
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Configuration ---
+PRODUCTS_JSON = 'output/unique_products_with_categories_saved.json'
+MAPPING_JSON = 'output/product_to_categories_mapping.json'
+BUNDLE_DIR = 'output/bundles'
+MANIFEST_NAME = 'manifest.json'
+UNCATEGORISED_ID = 'uncategorised'
+HASH_LENGTH = 12
+
+
+def level1_ancestors(mapping):
+    """Maps every category ID in the mapping to its level-1 ancestor ID (and that ancestor's name)."""
+    categories = {}
+    for cats in mapping.values():
+        for cat in cats:
+            categories.setdefault(str(cat.get('ScrapedCategoryID')), cat)
+
+    roots = {}
+    for cat_id in categories:
+        current, seen = cat_id, set()
+        # Walk up until a level-1 category, or a parent we don't know about
+        while current not in seen:
+            seen.add(current)
+            cat = categories[current]
+            parent_id = str(cat.get('ScrapedCategoryParentID') or '')
+            if str(cat.get('ScrapedCategoryLevel')) == '1' or parent_id not in categories:
+                break
+            current = parent_id
+        roots[cat_id] = (current, categories[current].get('ScrapedCategoryName') or current)
+    return roots
+
+
+def manifest_categories(mapping, roots, bundle_ids):
+    """Every category in the mapping (the fields main.js builds its tree from) plus the level-1
+    bundle its products are in, or None if that bundle is empty."""
+    categories = {}
+    for cats in mapping.values():
+        for cat in cats:
+            cat_id = cat.get('ScrapedCategoryID')
+            if str(cat_id) in categories:
+                continue
+            root_id = roots[str(cat_id)][0]
+            categories[str(cat_id)] = {
+                'ScrapedCategoryID': cat_id,
+                'ScrapedCategoryName': cat.get('ScrapedCategoryName'),
+                'ScrapedCategoryParentID': cat.get('ScrapedCategoryParentID'),
+                'ScrapedCategoryLevel': cat.get('ScrapedCategoryLevel'),
+                'bundle': root_id if root_id in bundle_ids else None,
+            }
+    return [categories[cat_id] for cat_id in sorted(categories)]
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-') or 'category'
+
+
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def write_bundle(bundle_dir, slug, payload, reuse_dir=None):
+    """Writes payload as a minified, content-hashed JSON file plus .gz/.br siblings. Returns (filename, raw size).
+
+    If reuse_dir (e.g. the previous dataset version's bundles) already has this exact bundle, its files
+    are linked instead of compressed again.
+    """
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()[:HASH_LENGTH]
+    filename = f"{slug}.{digest}.json"
+    path = os.path.join(bundle_dir, filename)
+    if reuse_dir and os.path.abspath(reuse_dir) != os.path.abspath(bundle_dir):
+        previous = os.path.join(reuse_dir, filename)
+        wanted = ['', '.gz'] + (['.br'] if brotli is not None else [])
+        if all(os.path.exists(previous + suffix) for suffix in wanted):
+            for suffix in wanted:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+                link_or_copy(previous + suffix, path + suffix)
+            return filename, len(raw)
+    with open(path, 'wb') as f:
+        f.write(raw)
+    # mtime=0 keeps the gzip bytes reproducible for identical input
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(raw, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(raw, quality=11))
+    return filename, len(raw)
+
+
+def build_bundles(products_json=PRODUCTS_JSON, mapping_json=MAPPING_JSON, bundle_dir=BUNDLE_DIR, reuse_dir=None):
+    """Builds all bundles and the manifest, reusing unchanged bundles from reuse_dir. Returns the manifest dict."""
+    with open(products_json, encoding='utf-8') as f:
+        products = json.load(f)
+    with open(mapping_json, encoding='utf-8') as f:
+        mapping = json.load(f)
+    logging.info(f"Loaded {len(products)} products and {len(mapping)} mapping entries.")
+    if brotli is None:
+        logging.warning("brotli module not installed; writing gzip bundles only.")
+
+    roots = level1_ancestors(mapping)
+    groups = {}  # level-1 id -> {'name', 'products', 'mapping'}
+    for product in products:
+        stockcode = str(product.get('Stockcode'))
+        cats = mapping.get(stockcode, [])
+        root_ids = sorted({roots[str(cat.get('ScrapedCategoryID'))] for cat in cats}) or [(UNCATEGORISED_ID, 'Uncategorised')]
+        # A product that sits under several level-1 categories goes into each of their bundles;
+        # the loader de-duplicates by Stockcode
+        for root_id, root_name in root_ids:
+            group = groups.setdefault(root_id, {'name': root_name, 'products': [], 'mapping': {}})
+            group['products'].append(product)
+            if cats:
+                group['mapping'][stockcode] = cats
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    manifest = {'bundles': []}
+    for root_id in sorted(groups):
+        group = groups[root_id]
+        filename, size = write_bundle(bundle_dir, f"{slugify(group['name'])}-{slugify(root_id)}",
+                                      {'products': group['products'], 'mapping': group['mapping']}, reuse_dir)
+        manifest['bundles'].append({
+            'category_id': root_id, 'name': group['name'], 'file': filename,
+            'products': len(group['products']), 'bytes': size,
+        })
+        logging.info(f"Bundle {filename}: {len(group['products'])} products, {size} bytes.")
+
+    manifest['categories'] = manifest_categories(mapping, roots, set(groups))
+
+    # Remove bundles from previous builds that the new manifest no longer references
+    current = {b['file'] for b in manifest['bundles']}
+    for name in os.listdir(bundle_dir):
+        base = re.sub(r'\.(gz|br)$', '', name)
+        if name != MANIFEST_NAME and base not in current:
+            os.remove(os.path.join(bundle_dir, name))
+
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    logging.info(f"Wrote {len(manifest['bundles'])} bundles and {MANIFEST_NAME} to {bundle_dir}.")
+    return manifest
+
+
+if __name__ == '__main__':
+    try:
+        build_bundles()
+    except FileNotFoundError as e:
+        logging.error(f"Input file not found: {e}")
+
+# --- END OF FILE build_bundles.py ---
@@ -0,0 +1,341 @@
+# --- column_store.py ---
+# NumPy column store built from unique_products_df at load time, so API queries can
+# work on contiguous arrays instead of filtering and copying DataFrames per request.
+# Numeric columns are float32 (half the memory, twice as many values per cache line); the
+# serving DataFrame keeps only a few compact text columns, and the heavy per-product text
+# (ingredients, allergy statements, category lists, ...) stays on disk in a TextStore. pipeline.py
+# builds that file into each dataset (build_text_store); app.py opens it, building one only if it's
+# missing or was built from different products or columns. The store's first line records the SHA-256
+# of the products JSON it came from and its columns, so a linked or copied store is checked by content.
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from product_schema import package_grams
+
+# Columns worth exposing as numeric axes (besides anything already numeric)
+NUMERIC_CANDIDATE_PREFIXES = ('Nutr_',)
+NUMERIC_CANDIDATE_COLUMNS = ['Price', 'HealthStarRating', 'Protein_per_g', 'Sugar_per_100g']
+
+MAX_BIN_RESOLUTION = 200
+
+# Text columns kept in memory for filtering and responses; low-cardinality ones become categoricals
+SERVING_TEXT_COLUMNS = ['Stockcode', 'ProductName', 'Brand', 'PackageSize', 'LifestyleAndDietaryStatement']
+CATEGORICAL_COLUMNS = ['Brand', 'PackageSize', 'LifestyleAndDietaryStatement']
+TEXT_STORE_SUFFIX = '.text.jsonl'  # Heavy text columns, next to the products JSON they come from
+TEXT_STORE_MODE = 0o644            # Readable by a serving user other than the one who built it
+TEXT_STORE_READ_BYTES = 1 << 22
+
+# Ranking: metrics with precomputed per-category leaderboards, and how deep those go
+LEADERBOARD_METRICS = ['Protein_per_dollar', 'Protein_to_sugar', 'Protein_per_g', 'Sugar_per_100g', 'Price', 'HealthStarRating']
+LEADERBOARD_SIZE = 100
+MIN_SUGAR_FOR_RATIO = 0.1  # g/100g; "0g sugar" would otherwise make the protein:sugar ratio infinite
+
+# Pareto prefilter pivots: strictly positive weightings over min-max scaled columns
+PARETO_PIVOT_WEIGHTS = {
+    2: [np.array(w) for w in ([1.0, 1.0], [3.0, 1.0], [1.0, 3.0])],
+    3: [np.array(w) for w in ([1.0, 1.0, 1.0], [3.0, 1.0, 1.0], [1.0, 3.0, 1.0], [1.0, 1.0, 3.0])],
+}
+
+
+def build_column_store(df):
+    """Returns {column: float32 array} for every numeric (or numeric-looking) product column."""
+    columns = {}
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            values = df[col]
+        elif col in NUMERIC_CANDIDATE_COLUMNS or col.startswith(NUMERIC_CANDIDATE_PREFIXES):
+            values = pd.to_numeric(df[col].astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce')
+        else:
+            continue
+        if values.notna().any():
+            columns[col] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+    logging.info(f"Column store built with {len(columns)} numeric columns for {len(df)} products.")
+    return columns
+
+
+def add_derived_columns(columns, df):
+    """Adds value metrics to the column store: PackageGrams, Protein_per_dollar (g protein per $)
+    and Protein_to_sugar (protein per g of sugar per 100g)."""
+    if 'PackageSize' in df.columns:
+        columns['PackageGrams'] = df['PackageSize'].map(package_grams).to_numpy(dtype=np.float32, na_value=np.nan)
+    protein = columns.get('Nutr_Protein_per_100g')
+    if protein is None:
+        return
+    price, grams = columns.get('Price'), columns.get('PackageGrams')
+    if price is not None and grams is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns['Protein_per_dollar'] = np.where(price > 0, protein * grams / 100.0 / price, np.nan)
+    sugar = columns.get('Nutr_Sugars_per_100g')
+    if sugar is not None:
+        columns['Protein_to_sugar'] = protein / np.maximum(sugar, MIN_SUGAR_FOR_RATIO)
+
+
+def compact_products(df, columns):
+    """Serving copy of df: SERVING_TEXT_COLUMNS only (numeric columns live in the column store
+    `columns`), CATEGORICAL_COLUMNS as categoricals and Stockcode as int64 when every code is a number."""
+    compact = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    for col in SERVING_TEXT_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if col == 'Stockcode':
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().all() and (numeric % 1 == 0).all():
+                values = numeric.astype(np.int64)
+        elif col in CATEGORICAL_COLUMNS:
+            values = values.astype('category')
+        compact[col] = values.values
+    before, after = df.memory_usage(deep=True).sum(), compact.memory_usage(deep=True).sum()
+    numeric_bytes = sum(values.nbytes for values in columns.values())
+    logging.info(f"Compact product table: {after / 1e6:.1f} MB + {numeric_bytes / 1e6:.1f} MB numeric columns "
+                 f"(full DataFrame was {before / 1e6:.1f} MB).")
+    return compact
+
+
+def source_digest(data):
+    """SHA-256 of a products JSON file's bytes: what a TextStore records it was built from."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class TextStore:
+    """Per-row text columns kept on disk, one JSON line per row after a header line, read on demand with pread."""
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets  # int64 byte offsets, one per row plus the end
+        self.fd = os.open(path, os.O_RDONLY)
+
+    @classmethod
+    def build(cls, records, columns, path, source=None):
+        """Writes `columns` of each record (dicts, in row order) to path and opens the store.
+        `source` (source_digest of the products JSON) is recorded in the header for open() to check.
+
+        Falls back to a temp file if path's directory isn't writable.
+        """
+        columns = list(columns)
+        header = json.dumps({'source': source, 'columns': columns}).encode('utf-8') + b'\n'
+        offsets = np.empty(len(records) + 1, dtype=np.int64)
+        offsets[0] = len(header)
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        except OSError:
+            handle, temp_path = tempfile.mkstemp(suffix='.text.jsonl')
+            path = temp_path
+        with os.fdopen(handle, 'wb') as f:
+            f.write(header)
+            for i, record in enumerate(records):
+                text = {}
+                for col in columns:
+                    value = record.get(col)
+                    if value is not None and value == value and value != '':  # skip None/NaN/empty
+                        text[col] = value
+                line = json.dumps(text, ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+        os.chmod(temp_path, TEXT_STORE_MODE)  # mkstemp creates files 0600
+        if temp_path != path:
+            os.replace(temp_path, path)
+        logging.info(f"Text store: {len(columns)} columns for {len(records)} products in {path} ({offsets[-1] / 1e6:.1f} MB on disk).")
+        return cls(path, offsets)
+
+    @classmethod
+    def open(cls, path, rows=None, source=None, columns=None):
+        """Opens an existing store, finding the row offsets from its newlines. None if its header doesn't
+        match `source`/`columns` or its row count isn't `rows` (each check skipped when None)."""
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or 'source' not in header:
+                logging.warning(f"Text store {path} has no header (built by an older version); ignoring it.")
+                return None
+            if (source is not None and header['source'] != source) or (columns is not None and header.get('columns') != list(columns)):
+                logging.info(f"Text store {path} was built from other products or columns; ignoring it.")
+                return None
+            position = f.tell()
+            ends = [np.full(1, position, dtype=np.int64)]
+            for chunk in iter(lambda: f.read(TEXT_STORE_READ_BYTES), b''):
+                ends.append(np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')) + position + 1)
+                position += len(chunk)
+        offsets = np.concatenate(ends).astype(np.int64)
+        if rows is not None and len(offsets) - 1 != rows:
+            logging.warning(f"Text store {path} has {len(offsets) - 1} rows, expected {rows}; ignoring it.")
+            return None
+        logging.info(f"Text store: opened {path} ({len(offsets) - 1} products, {position / 1e6:.1f} MB on disk).")
+        return cls(path, offsets)
+
+    def close(self):
+        os.close(self.fd)
+
+    def get(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return json.loads(os.pread(self.fd, int(end - start), int(start)))
+
+
+def text_store_columns(df, numeric_columns):
+    """Columns of df that go to the TextStore: everything not kept in memory as text or numbers."""
+    return [col for col in df.columns if col not in SERVING_TEXT_COLUMNS and col not in numeric_columns]
+
+
+def build_text_store(products_json, path):
+    """Writes the TextStore for a products JSON file (the pipeline's text_store stage)."""
+    with open(products_json, 'rb') as f:
+        data = f.read()
+    records = json.loads(data)
+    df = pd.DataFrame(records)
+    store = TextStore.build(records, text_store_columns(df, build_column_store(df)), path, source_digest(data))
+    store.close()
+
+
+def build_category_index(df_map, stockcodes):
+    """Maps each ScrapedCategoryID to the sorted product row positions directly in it."""
+    stockcode_index = pd.Index(stockcodes.astype(str))
+    rows = stockcode_index.get_indexer(df_map['Stockcode'].astype(str))
+    pairs = pd.DataFrame({'cat': df_map['ScrapedCategoryID'].astype(str).to_numpy(), 'row': rows})
+    pairs = pairs[pairs['row'] >= 0].drop_duplicates()
+    index = {cat: np.sort(group['row'].to_numpy(dtype=np.int64)) for cat, group in pairs.groupby('cat', sort=False)}
+    logging.info(f"Category index built for {len(index)} categories.")
+    return index
+
+
+def bin_products(x, y, resolution):
+    """2D histogram over x/y with one representative point per non-empty bin.
+
+    Returns (x_edges, y_edges, bin_ix, bin_iy, counts, mean_x, mean_y, representative), where
+    representative holds the position (into x/y) of the point closest to its bin's mean.
+    """
+    resolution = max(1, min(int(resolution), MAX_BIN_RESOLUTION))
+    # float64 throughout: float32 column values would give float32-precision edges and means
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    x_edges = np.histogram_bin_edges(x, bins=resolution)
+    y_edges = np.histogram_bin_edges(y, bins=resolution)
+    # Right-most edge is inclusive, as with np.histogram2d
+    ix = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, resolution - 1)
+    iy = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, resolution - 1)
+    flat = ix * resolution + iy
+
+    occupied, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+    mean_x = np.bincount(inverse, weights=x) / counts
+    mean_y = np.bincount(inverse, weights=y) / counts
+
+    # Representative = point nearest its bin mean: sort by (bin, distance) and take each bin's first
+    x_scale = (x_edges[-1] - x_edges[0]) or 1.0
+    y_scale = (y_edges[-1] - y_edges[0]) or 1.0
+    dist = ((x - mean_x[inverse]) / x_scale) ** 2 + ((y - mean_y[inverse]) / y_scale) ** 2
+    order = np.lexsort((dist, inverse))
+    first = np.r_[0, np.cumsum(counts)[:-1]]
+    representative = order[first]
+
+    return (x_edges, y_edges, occupied // resolution, occupied % resolution,
+            counts, mean_x, mean_y, representative)
+
+
+def build_subtree_index(hierarchy, category_rows):
+    """Maps every category in the hierarchy to the sorted rows in it or any of its descendants."""
+    subtree = {}
+
+    def visit(node):
+        parts = [category_rows.get(node['id'], np.empty(0, dtype=np.int64))]
+        parts += [visit(child) for child in node.get('children', {}).values()]
+        subtree[node['id']] = np.unique(np.concatenate(parts))
+        return subtree[node['id']]
+
+    for root in hierarchy.values():
+        visit(root)
+    # Categories missing from the hierarchy (e.g. orphans) still rank over their own rows
+    for cat, rows in category_rows.items():
+        subtree.setdefault(cat, rows)
+    return subtree
+
+
+def top_k(values, rows, k, descending=True):
+    """The k rows (from `rows`) with the highest (or lowest) values, best first; NaNs never rank."""
+    candidates = rows[~np.isnan(values[rows])]
+    k = min(k, len(candidates))
+    if k <= 0:
+        return candidates[:0]
+    keyed = -values[candidates] if descending else values[candidates]
+    if k < len(candidates):
+        # Keep every row tied with the k-th value, not argpartition's arbitrary pick among them,
+        # so the row tie-break below decides which of them make the cut
+        kth = keyed[np.argpartition(keyed, k - 1)[k - 1]]
+        within = keyed <= kth
+        candidates, keyed = candidates[within], keyed[within]
+    return candidates[np.lexsort((candidates, keyed))][:k]  # ties broken by row for stable output
+
+
+def build_leaderboards(columns, subtree_rows, all_rows, metrics=LEADERBOARD_METRICS, size=LEADERBOARD_SIZE):
+    """Precomputes {(category, metric, descending): (top rows, candidate count)} for each category
+    subtree and the catalogue root (category None), so unfiltered rankings are a slice."""
+    boards = {}
+    scopes = list(subtree_rows.items()) + [(None, all_rows)]
+    for metric in metrics:
+        values = columns.get(metric)
+        if values is None:
+            continue
+        for cat, rows in scopes:
+            total = int(np.count_nonzero(~np.isnan(values[rows])))
+            for descending in (True, False):
+                boards[(cat, metric, descending)] = (top_k(values, rows, size, descending), total)
+    logging.info(f"Leaderboards built: {len(boards)} (top {size}) for {len(scopes)} scopes.")
+    return boards
+
+
+def pareto_front(points, maximize):
+    """Positions of the Pareto-optimal rows of `points` (n x 2 or n x 3, no NaNs).
+
+    maximize[j] says whether larger is better in column j. A row is dropped only if another row is
+    at least as good in every column and strictly better in one. O(n log n): rows are sorted by the
+    first column (best first) and swept, keeping the best second column seen (2D) or a staircase
+    of the (second, third) columns seen (3D).
+    """
+    points = np.where(np.asarray(maximize), points, -points)  # now larger is better everywhere
+    dims = points.shape[1]
+    if dims not in (2, 3):
+        raise ValueError("pareto_front supports 2 or 3 columns.")
+    positions = np.arange(len(points))
+    if not len(points):
+        return positions
+
+    # Prefilter: the best row under a positive weighting is on the front, and typically dominates
+    # most of the rest, so drop everything a few such pivots dominate before the sweep
+    spans = np.ptp(points, axis=0)
+    scaled = (points - points.min(axis=0)) / np.where(spans > 0, spans, 1.0)
+    for weights in PARETO_PIVOT_WEIGHTS[dims]:
+        pivot = points[np.argmax(scaled @ weights)]
+        dominated = np.all(points <= pivot, axis=1) & np.any(points < pivot, axis=1)
+        points, scaled, positions = points[~dominated], scaled[~dominated], positions[~dominated]
+
+    order = np.lexsort(tuple(-points[:, j] for j in reversed(range(dims))))
+    ordered = points[order]
+    # Identical rows can't dominate each other: decide on the first of each run of identical rows
+    run_start = np.r_[True, np.any(ordered[1:] != ordered[:-1], axis=1)]
+    run_id = np.cumsum(run_start) - 1
+    firsts = ordered[run_start]
+    if dims == 2:
+        y = firsts[:, 1]
+        on_front = y > np.maximum.accumulate(np.r_[-np.inf, y[:-1]])
+    else:
+        on_front = np.zeros(len(firsts), dtype=bool)
+        stair_y, stair_z = [], []  # non-dominated (y, z) so far: y ascending, z descending
+        for i, (_, y, z) in enumerate(firsts.tolist()):
+            j = bisect.bisect_left(stair_y, y)
+            if j < len(stair_y) and stair_z[j] >= z:
+                continue  # an earlier (x at least as good) row is at least as good in y and z
+            on_front[i] = True
+            # Drop staircase points this one dominates in (y, z): y <= this y and z <= this z
+            k = j
+            while k > 0 and stair_z[k - 1] <= z:
+                k -= 1
+            end = j + 1 if j < len(stair_y) and stair_y[j] == y else j
+            stair_y[k:end] = [y]
+            stair_z[k:end] = [z]
+    return np.sort(positions[order[on_front[run_id]]])
@@ -1,14 +1,154 @@
+# --- START OF FILE convert_csv_to_json.py ---
+
+# Streaming CSV (or JSONL) -> JSON converter for the unique products file.
+# Rows are read and written one at a time, so memory stays flat regardless of catalogue size.
+# Numeric columns (see product_schema.py) are written as numbers and empty values are dropped,
+# so loaders don't have to re-parse strings.
+#
+# Output formats:
+#   json     - a single minified JSON array (what app.py and the front end read)
+#   ndjson   - one JSON object per line
+#   columnar - {"length": n, "columns": {name: [values...]}}; columns are spooled to temp files
+# Any format can be written gzip- or brotli-compressed directly (--compress).
+
+import argparse
 import csv
+import gzip
 import json
+import logging
+import sys
+import tempfile
+
+try:
+    import brotli  # Optional: only needed for --compress brotli
+except ImportError:
+    brotli = None
+
+from product_schema import type_row
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 csv_file = 'output/unique_products_with_categories_saved.csv'
 json_file = 'output/unique_products_with_categories_saved.json'
 
-data = []
-with open(csv_file, encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        data.append(row)
+# Ingredients/allergy text can exceed the csv module's default 128KB field limit
+csv.field_size_limit(sys.maxsize)
+
+
+class BrotliTextWriter:
+    """Minimal text file wrapper that brotli-compresses as it writes."""
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._compressor = brotli.Compressor(quality=11)
+
+    def write(self, text):
+        self._file.write(self._compressor.process(text.encode('utf-8')))
+
+    def close(self):
+        self._file.write(self._compressor.finish())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(path, compress=None):
+    if compress == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8')
+    if compress == 'brotli':
+        if brotli is None:
+            raise RuntimeError("brotli output requested but the brotli module is not installed.")
+        return BrotliTextWriter(path)
+    return open(path, 'w', encoding='utf-8')
+
+
+def read_rows(path):
+    """Yields product dicts from a CSV file, or from a JSONL file if the name ends in .jsonl."""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_json_array(rows, out):
+    count = 0
+    out.write('[')
+    for row in rows:
+        out.write((',\n' if count else '\n') + dumps(row))
+        count += 1
+    out.write('\n]\n')
+    return count
+
+
+def write_ndjson(rows, out):
+    count = 0
+    for row in rows:
+        out.write(dumps(row) + '\n')
+        count += 1
+    return count
+
+
+def write_columnar(rows, out):
+    """Spools each column to its own temp file, then stitches them into one columnar object."""
+    spools = {}  # column -> temp file holding its comma-separated values so far
+    count = 0
+    try:
+        for row in rows:
+            for key in row:
+                if key not in spools:
+                    # Column first seen now: earlier rows are null
+                    spools[key] = tempfile.TemporaryFile('w+', encoding='utf-8')
+                    if count:
+                        spools[key].write(','.join(['null'] * count))
+            for key, spool in spools.items():
+                spool.write((',' if count else '') + dumps(row.get(key)))
+            count += 1
+        out.write('{"length":%d,"columns":{' % count)
+        for i, (key, spool) in enumerate(spools.items()):
+            out.write((',' if i else '') + dumps(key) + ':[')
+            spool.seek(0)
+            while chunk := spool.read(1 << 20):
+                out.write(chunk)
+            out.write(']')
+        out.write('}}\n')
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return count
+
+
+WRITERS = {'json': write_json_array, 'ndjson': write_ndjson, 'columnar': write_columnar}
+
+
+def convert(input_path=csv_file, output_path=json_file, output_format='json', compress=None):
+    """Streams input_path into output_path in the given format. Returns the number of rows written."""
+    rows = (type_row(row) for row in read_rows(input_path))
+    with open_output(output_path, compress) as out:
+        count = WRITERS[output_format](rows, out)
+    logging.info(f"Wrote {count} products from {input_path} to {output_path} ({output_format}{', ' + compress if compress else ''}).")
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the unique products CSV (or JSONL) to typed JSON.")
+    parser.add_argument('--input', default=csv_file, help=f"Input CSV, or .jsonl file (default: {csv_file}).")
+    parser.add_argument('--output', default=json_file, help=f"Output file (default: {json_file}).")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='json', help="Output format (default: json).")
+    parser.add_argument('--compress', choices=['gzip', 'brotli'], default=None, help="Write the output precompressed.")
+    args = parser.parse_args()
+    try:
+        convert(args.input, args.output, args.format, args.compress)
+    except FileNotFoundError as e:
+        logging.error(f"Input file not found: {e}")
 
-with open(json_file, 'w', encoding='utf-8') as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+# --- END OF FILE convert_csv_to_json.py ---
@@ -0,0 +1,372 @@
+# --- START OF FILE crawl_coordinator.py ---
+
+# Sharded crawl: splits discovered_categories.csv into leased work items in a shared SQLite queue,
+# so several bigparallel-style worker processes (on one or more hosts) can crawl it together.
+#
+#   python crawl_coordinator.py init                 # load categories into the queue
+#   python crawl_coordinator.py worker --threads 8   # run on each host; exits when the queue is drained
+#   python crawl_coordinator.py status
+#   python crawl_coordinator.py merge                # deterministic CSV/JSONL from the finished parts
+#
+# Each item is one category (pagination stop conditions are per category, so it is the smallest unit
+# that can be scraped independently). A worker claims an item with a time-limited lease and renews
+# it from a heartbeat thread while scraping; if the worker dies, the lease expires and another worker
+# takes the item over. Results are written to one part file per item and only recorded if the
+# worker still holds the lease, so a late finisher can't clobber its replacement.
+# Merge concatenates the parts in category-file order, so output doesn't depend on who scraped what.
+#
+# For multiple hosts, --db and --parts-dir must be on storage every host can reach, with working file
+# locking (SQLite's rollback journal is used, not WAL, for that reason), and host clocks must be synced.
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import bigparallel  # Also sets up logging (console + scraper.log)
+from product_schema import DESIRED_COLUMNS
+from transport import make_transport
+
+QUEUE_DB = 'output/crawl_queue.sqlite'
+PARTS_DIR = 'output/crawl_parts'
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',   -- pending, leased, done, failed
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    product_count INTEGER,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS items_claim ON items (state, seq);
+"""
+
+
+class WorkQueue:
+    """Lease-based work queue in SQLite. One instance per thread (connections aren't shared)."""
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, sql, params=()):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers serialise cleanly
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = self.conn.execute(sql, params)
+            self.conn.execute('COMMIT')
+            return cursor.rowcount
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def add_items(self, items):
+        """Adds (id, payload dict) pairs in order. Existing ids are left untouched. Returns how many were new."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            start = self.conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM items').fetchone()[0]
+            added = 0
+            for offset, (item_id, payload) in enumerate(items):
+                added += self.conn.execute(
+                    'INSERT OR IGNORE INTO items (id, seq, payload, updated) VALUES (?, ?, ?, ?)',
+                    (item_id, start + offset, json.dumps(payload, ensure_ascii=False), time.time())).rowcount
+            self.conn.execute('COMMIT')
+            return added
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def claim(self, owner, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """Leases the next pending (or expired) item to owner. Returns the row, or None if nothing is claimable."""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute(
+                "SELECT * FROM items WHERE attempts < ? AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "ORDER BY seq LIMIT 1", (max_attempts, now)).fetchone()
+            if row is not None:
+                if row['state'] == 'leased':
+                    logging.warning(f"Lease on item {row['id']} held by {row['owner']} expired; reassigning to {owner}.")
+                self.conn.execute(
+                    "UPDATE items SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, row['id']))
+                row = self.conn.execute('SELECT * FROM items WHERE id = ?', (row['id'],)).fetchone()
+            # Expired leases that have used up their attempts are failed, so the queue can drain
+            self.conn.execute(
+                "UPDATE items SET state = 'failed', error = COALESCE(error, 'lease expired'), updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, max_attempts))
+            self.conn.execute('COMMIT')
+            return row
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def renew(self, item_id, owner, lease_seconds=LEASE_SECONDS):
+        """Extends owner's lease. Returns False if the lease was lost (expired and reassigned)."""
+        now = time.time()
+        return self._write("UPDATE items SET lease_expires = ?, updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (now + lease_seconds, now, item_id, owner)) == 1
+
+    def complete(self, item_id, owner, result_path, product_count):
+        """Records the result if owner still holds the lease. Returns whether it was recorded."""
+        return self._write("UPDATE items SET state = 'done', result_path = ?, product_count = ?, error = NULL, lease_expires = NULL, updated = ? "
+                           "WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (result_path, product_count, time.time(), item_id, owner)) == 1
+
+    def fail(self, item_id, owner, error, max_attempts=MAX_ATTEMPTS):
+        """Releases a failed item for retry, or marks it failed once it has used up its attempts."""
+        return self._write("UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                           "owner = NULL, lease_expires = NULL, error = ?, updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (max_attempts, str(error)[:1000], time.time(), item_id, owner)) == 1
+
+    def counts(self):
+        return {row['state']: row['n'] for row in self.conn.execute('SELECT state, COUNT(*) AS n FROM items GROUP BY state')}
+
+    def rows(self):
+        return self.conn.execute('SELECT * FROM items ORDER BY seq').fetchall()
+
+
+class LeaseKeeper:
+    """Heartbeat thread renewing every lease a worker process currently holds."""
+    def __init__(self, db_path, owner, lease_seconds):
+        self.db_path = db_path
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.held = set()
+        self.lost = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def hold(self, item_id):
+        with self.lock:
+            self.held.add(item_id)
+
+    def release(self, item_id):
+        with self.lock:
+            self.held.discard(item_id)
+            self.lost.discard(item_id)
+
+    def _run(self):
+        queue = WorkQueue(self.db_path)
+        try:
+            while not self.stop_event.wait(self.lease_seconds / 3):
+                with self.lock:
+                    held = list(self.held - self.lost)
+                for item_id in held:
+                    try:
+                        if not queue.renew(item_id, self.owner, self.lease_seconds):
+                            logging.warning(f"Lost lease on item {item_id}; its result will be discarded.")
+                            with self.lock:
+                                self.lost.add(item_id)
+                    except sqlite3.Error as e:
+                        logging.error(f"Lease renewal for {item_id} failed: {e}")
+        finally:
+            queue.close()
+
+
+# --- Commands ---
+
+def init_queue(db_path, categories_csv):
+    if not os.path.exists(categories_csv):
+        logging.critical(f"{categories_csv} missing. Run bigparallel.py --discover-only first.")
+        return
+    categories = pd.read_csv(categories_csv, dtype={'id': str, 'parent_id': str}).to_dict('records')
+    items = []
+    for category in categories:
+        category = {k: (None if pd.isna(v) else v.item() if hasattr(v, 'item') else v) for k, v in category.items()}
+        if category.get('id'):
+            items.append((str(category['id']), category))
+    queue = WorkQueue(db_path)
+    added = queue.add_items(items)
+    logging.info(f"Queued {added} new categories from {categories_csv} ({len(items) - added} already queued). Queue: {queue.counts()}")
+    queue.close()
+
+
+def write_part(parts_dir, item_id, owner, products):
+    """Writes one item's products to its part file atomically. Returns the path."""
+    safe_owner = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in owner)
+    path = os.path.join(parts_dir, f"{item_id}.{safe_owner}.jsonl")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for product in products:
+            f.write(json.dumps({k: v for k, v in product.items() if not pd.isna(v)}, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def process_item(args, queue, owner, session, keeper, row):
+    """Scrapes one claimed item and records it as done, or releases it for retry if the scrape failed."""
+    item_id = row['id']
+    keeper.hold(item_id)
+    try:
+        category = json.loads(row['payload'])
+        logging.info(f"Claimed item {item_id} (attempt {row['attempts']}): {category.get('name')}")
+        # Raises CategoryScrapeError if the category stopped early, so a partial scrape is retried, not recorded
+        products = bigparallel.scrape_products_for_category(session, category, raise_on_error=True)
+        path = write_part(args.parts_dir, item_id, owner, products)
+        if queue.complete(item_id, owner, path, len(products)):
+            logging.info(f"Item {item_id} done: {len(products)} products.")
+        else:
+            logging.warning(f"Item {item_id} finished after its lease was lost; discarding {path}.")
+            os.remove(path)
+    except bigparallel.CategoryScrapeError as e:
+        logging.error(f"Item {item_id} incomplete ({len(e.products)} products before it stopped): {e}")
+        queue.fail(item_id, owner, e, args.max_attempts)
+    except Exception as e:
+        logging.error(f"Item {item_id} failed: {e}", exc_info=True)
+        queue.fail(item_id, owner, e, args.max_attempts)
+    finally:
+        keeper.release(item_id)
+
+
+def worker_loop(args, owner, session, keeper):
+    queue = WorkQueue(args.db)
+    try:
+        while True:
+            row = queue.claim(owner, args.lease_seconds, args.max_attempts)
+            if row is None:
+                counts = queue.counts()
+                if not counts.get('leased') and not counts.get('pending'):
+                    return
+                time.sleep(args.poll_seconds)  # Others are still working; wait in case a lease expires
+                continue
+            process_item(args, queue, owner, session, keeper, row)
+    finally:
+        queue.close()
+
+
+def run_worker(args):
+    os.makedirs(args.parts_dir, exist_ok=True)
+    owner = args.owner or f"{socket.gethostname()}-{os.getpid()}"
+    session = make_transport(bigparallel.SESSION_HEADERS, pool_size=args.threads)
+    try:
+        session.warm_up(bigparallel.BASE_URL, bigparallel.GET_TIMEOUT_SECONDS)
+    except Exception as e:
+        logging.warning(f"Initial GET failed: {e}. Proceeding anyway.")
+
+    keeper = LeaseKeeper(args.db, owner, args.lease_seconds)
+    keeper.start()
+    logging.info(f"Worker {owner} starting {args.threads} threads on {args.db}.")
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix='crawl') as executor:
+            for future in [executor.submit(worker_loop, args, owner, session, keeper) for _ in range(args.threads)]:
+                future.result()
+    finally:
+        keeper.stop()
+        session.close()
+    queue = WorkQueue(args.db)
+    logging.info(f"Worker {owner} finished. Queue: {queue.counts()}")
+    queue.close()
+
+
+def show_status(db_path):
+    queue = WorkQueue(db_path)
+    rows = queue.rows()
+    counts = queue.counts()
+    now = time.time()
+    print(f"Items: {len(rows)}  " + '  '.join(f"{state}: {n}" for state, n in sorted(counts.items())))
+    print(f"Products in finished items: {sum(row['product_count'] or 0 for row in rows)}")
+    for row in rows:
+        if row['state'] == 'leased':
+            print(f"  leased  {row['id']:<12} {row['owner']:<30} expires in {row['lease_expires'] - now:7.0f}s  attempt {row['attempts']}")
+        elif row['state'] == 'failed':
+            print(f"  failed  {row['id']:<12} attempts {row['attempts']}: {row['error']}")
+    queue.close()
+
+
+def merge_parts(db_path, output_csv, output_jsonl):
+    """Concatenates finished parts in queue order into the usual scraper output files."""
+    queue = WorkQueue(db_path)
+    rows = queue.rows()
+    queue.close()
+    unfinished = [row['id'] for row in rows if row['state'] != 'done']
+    if unfinished:
+        logging.warning(f"{len(unfinished)} items are not done and will be missing from the merge: {unfinished[:10]}")
+    parts = [row['result_path'] for row in rows if row['state'] == 'done']
+
+    # First pass: JSONL, and the union of columns for the CSV header
+    extra_columns = set()
+    count = 0
+    with open(output_jsonl, 'w', encoding='utf-8') as out:
+        for path in parts:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        extra_columns.update(k for k in json.loads(line) if k not in DESIRED_COLUMNS)
+                        out.write(line if line.endswith('\n') else line + '\n')
+                        count += 1
+    # Second pass: CSV with a stable column order
+    with open(output_csv, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=DESIRED_COLUMNS + sorted(extra_columns))
+        writer.writeheader()
+        for path in parts:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        writer.writerow(json.loads(line))
+    logging.info(f"Merged {count} products from {len(parts)} parts into {output_csv} and {output_jsonl}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Coordinate a crawl across several worker processes/hosts.")
+    parser.add_argument('--db', default=QUEUE_DB, help=f"Shared queue database (default: {QUEUE_DB}).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = commands.add_parser('init', help="Load categories into the queue.")
+    init_parser.add_argument('--categories', default=bigparallel.DISCOVERED_CATEGORIES_CSV)
+
+    worker_parser = commands.add_parser('worker', help="Claim and scrape items until the queue is drained.")
+    worker_parser.add_argument('--threads', type=int, default=bigparallel.MAX_WORKERS, help="Concurrent items per worker process.")
+    worker_parser.add_argument('--owner', help="Worker id (default: hostname-pid).")
+    worker_parser.add_argument('--parts-dir', default=PARTS_DIR)
+    worker_parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS)
+    worker_parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    worker_parser.add_argument('--poll-seconds', type=float, default=POLL_SECONDS)
+
+    commands.add_parser('status', help="Show queue progress, current leases and failures.")
+
+    merge_parser = commands.add_parser('merge', help="Write the merged output files from finished items.")
+    merge_parser.add_argument('--output-csv', default=bigparallel.FINAL_OUTPUT_CSV)
+    merge_parser.add_argument('--output-jsonl', default=bigparallel.FINAL_OUTPUT_JSONL)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    if args.command == 'init':
+        init_queue(args.db, args.categories)
+    elif args.command == 'worker':
+        run_worker(args)
+    elif args.command == 'status':
+        show_status(args.db)
+    elif args.command == 'merge':
+        merge_parts(args.db, args.output_csv, args.output_jsonl)
+
+# --- END OF FILE crawl_coordinator.py ---
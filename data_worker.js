@@ -0,0 +1,251 @@
+// Data worker: owns the product catalogue as typed arrays and does all filtering,
+// sorting and scale computation off the UI thread. main.js only renders.
+
+const DIETARY_FLAGS = {
+  'Vegetarian': 1,
+  'Vegan': 2,
+  'Gluten Free': 4,
+  'Nut Free': 8,
+};
+
+let catalogue = null;
+// Filtering only depends on category/dietary/keyword, so axis switches reuse the last row set
+let lastFilterKey = null;
+let lastRows = null;
+let lastQuery = null;
+let ready = false;
+// Bundle mode: bundle id -> URL, category id -> the bundle holding its products, bundle id -> load
+let bundleUrls = null;
+const bundleOfCategory = new Map();
+const bundleLoads = new Map();
+
+async function fetchJSON(path) {
+  const response = await fetch(path);
+  if (!response.ok) throw new Error(`${path}: HTTP ${response.status}`);
+  return await response.json();
+}
+
+// Prefer the per-category bundles from build_bundles.py (hashed, immutable, precompressed): only the
+// first one is loaded before the first plot, a category view waits for just its own bundle, and the
+// rest load in the background. Falls back to the flat JSON files when no manifest has been built.
+async function loadInitial(msg) {
+  const manifestResponse = await fetch(msg.manifestUrl).catch(() => null);
+  if (!manifestResponse || !manifestResponse.ok) {
+    const [products, mapping] = await Promise.all([fetchJSON(msg.productsUrl), fetchJSON(msg.mappingUrl)]);
+    addProducts(products, mapping);
+    return;
+  }
+  const manifest = await manifestResponse.json();
+  bundleUrls = new Map(manifest.bundles.map(b => [b.category_id, new URL(b.file, msg.manifestUrl).href]));
+  if (manifest.categories) {
+    manifest.categories.forEach(cat => bundleOfCategory.set(String(cat.ScrapedCategoryID), cat.bundle));
+    await Promise.all(manifest.bundles.slice(0, 1).map(b => loadBundle(b.category_id)));
+    if (!catalogue) catalogue = createCatalogue([]);
+    manifest.categories.forEach(cat => addCategory(cat));
+  } else {
+    // Manifests from before build_bundles.py listed categories don't say which bundle a category needs
+    await Promise.all(manifest.bundles.map(b => loadBundle(b.category_id)));
+  }
+}
+
+function loadBundle(id) {
+  if (!bundleLoads.has(id)) {
+    const load = fetchJSON(bundleUrls.get(id)).then(bundle => addProducts(bundle.products, bundle.mapping));
+    load.catch(() => bundleLoads.delete(id)); // A later query retries it
+    bundleLoads.set(id, load);
+  }
+  return bundleLoads.get(id);
+}
+
+async function loadRemainingBundles() {
+  if (!bundleUrls) return;
+  for (const id of bundleUrls.keys()) {
+    try {
+      await loadBundle(id);
+    } catch (err) {
+      console.warn(`Bundle ${id} failed to load: ${err.message}`);
+    }
+  }
+}
+
+function createCatalogue(numericFields) {
+  const columns = {};
+  numericFields.forEach(f => { columns[f] = new Float64Array(0); });
+  return {
+    count: 0, numericFields, columns, dietary: new Uint8Array(0), searchText: [], names: [], stockcodes: [], urls: [],
+    rowByStockcode: new Map(), categoryRows: new Map(), categories: new Map(),
+  };
+}
+
+// Typed arrays grow by doubling as bundles are appended
+function grow(array, size) {
+  if (array.length >= size) return array;
+  const out = new array.constructor(Math.max(size, array.length * 2));
+  out.set(array);
+  return out;
+}
+
+function addCategory(cat) {
+  if (catalogue.categories.has(cat.ScrapedCategoryID)) return;
+  catalogue.categories.set(cat.ScrapedCategoryID, {
+    ScrapedCategoryID: cat.ScrapedCategoryID,
+    ScrapedCategoryName: cat.ScrapedCategoryName,
+    ScrapedCategoryParentID: cat.ScrapedCategoryParentID,
+    ScrapedCategoryLevel: cat.ScrapedCategoryLevel,
+  });
+}
+
+// Appends products not already in the catalogue (products under several level-1 categories appear
+// in more than one bundle). Once main.js has the catalogue, it is sent the new rows' names and links,
+// and an all-categories view is replotted to include them.
+function addProducts(products, mapping) {
+  if (!catalogue) {
+    // Same detection as before: any field of the first product that parses as a number
+    const first = products[0] || {};
+    catalogue = createCatalogue(Object.keys(first).filter(k => typeof first[k] === 'number' || !isNaN(parseFloat(first[k]))));
+  }
+  const c = catalogue;
+  const start = c.count;
+  const fresh = [];
+  products.forEach(p => {
+    if (c.rowByStockcode.has(p.Stockcode)) return;
+    c.rowByStockcode.set(p.Stockcode, start + fresh.length);
+    fresh.push(p);
+  });
+  const end = start + fresh.length;
+  c.numericFields.forEach(f => { c.columns[f] = grow(c.columns[f], end); });
+  c.dietary = grow(c.dietary, end);
+  for (let k = 0; k < fresh.length; k++) {
+    const p = fresh[k], i = start + k;
+    c.numericFields.forEach(f => { c.columns[f][i] = parseFloat(p[f]) || 0; });
+    const lifestyle = (p.LifestyleAndDietaryStatement || '').toLowerCase();
+    let flags = 0;
+    if (lifestyle.includes('vegetarian')) flags |= DIETARY_FLAGS['Vegetarian'];
+    if (lifestyle.includes('vegan')) flags |= DIETARY_FLAGS['Vegan'];
+    if ((p.AllergyStatement || '').toLowerCase().includes('gluten free')) flags |= DIETARY_FLAGS['Gluten Free'];
+    if ((p.ContainsNuts || '').toLowerCase() !== 'true') flags |= DIETARY_FLAGS['Nut Free'];
+    c.dietary[i] = flags;
+    c.searchText.push([p.ProductName, p.Brand, p.Description].filter(Boolean).join('\n').toLowerCase());
+    c.names.push(p.ProductName);
+    c.stockcodes.push(p.Stockcode);
+    c.urls.push(p.WoolworthsUrl || null);
+  }
+  c.count = end;
+
+  // Category -> rows (direct membership, as in the old filterProducts). New rows all come after the
+  // existing ones, so appending keeps each list sorted.
+  const added = new Map();
+  Object.entries(mapping).forEach(([stockcode, cats]) => {
+    const row = c.rowByStockcode.get(stockcode);
+    cats.forEach(cat => {
+      addCategory(cat);
+      if (row === undefined || row < start) return;
+      let rows = added.get(cat.ScrapedCategoryID);
+      if (!rows) added.set(cat.ScrapedCategoryID, rows = new Set());
+      rows.add(row);
+    });
+  });
+  added.forEach((rows, catId) => {
+    const previous = c.categoryRows.get(catId) || new Uint32Array(0);
+    const merged = new Uint32Array(previous.length + rows.size);
+    merged.set(previous);
+    merged.set(Uint32Array.from(rows).sort(), previous.length);
+    c.categoryRows.set(catId, merged);
+  });
+  lastFilterKey = null;
+
+  if (ready && end > start) {
+    self.postMessage({ type: 'rows', names: c.names.slice(start), stockcodes: c.stockcodes.slice(start), urls: c.urls.slice(start) });
+    if (lastQuery && !lastQuery.categoryId) postPlot(lastQuery);
+  }
+}
+
+function filterRows(query) {
+  const key = JSON.stringify([query.categoryId, query.dietaryFilters, query.keyword]);
+  if (key === lastFilterKey) return lastRows;
+  let candidates;
+  if (query.categoryId) {
+    candidates = catalogue.categoryRows.get(query.categoryId) || new Uint32Array(0);
+  } else {
+    candidates = null; // every row
+  }
+  const required = (query.dietaryFilters || []).reduce((mask, f) => mask | (DIETARY_FLAGS[f] || 0), 0);
+  const kw = (query.keyword || '').trim().toLowerCase();
+  const total = candidates ? candidates.length : catalogue.count;
+  const out = new Uint32Array(total);
+  let m = 0;
+  for (let j = 0; j < total; j++) {
+    const i = candidates ? candidates[j] : j;
+    if ((catalogue.dietary[i] & required) !== required) continue;
+    if (kw && !catalogue.searchText[i].includes(kw)) continue;
+    out[m++] = i;
+  }
+  lastFilterKey = key;
+  lastRows = out.subarray(0, m);
+  return lastRows;
+}
+
+function buildPlot(query) {
+  const rows = filterRows(query);
+  const n = rows.length;
+  const xCol = catalogue.columns[query.xField], yCol = catalogue.columns[query.yField], sizeCol = catalogue.columns[query.sizeField];
+  // Draw large dots first so smaller ones stay visible (and win hit-tests) on top of them
+  const order = Uint32Array.from(rows);
+  if (sizeCol) order.sort((a, b) => sizeCol[b] - sizeCol[a]);
+  const xs = new Float32Array(n), ys = new Float32Array(n), sizes = new Float32Array(n);
+  let maxX = 20, maxY = 20, minSize = Infinity, maxSize = -Infinity;
+  for (let k = 0; k < n; k++) {
+    const i = order[k];
+    const x = xCol ? xCol[i] : 0, y = yCol ? yCol[i] : 0, s = sizeCol ? sizeCol[i] : 0;
+    xs[k] = x; ys[k] = y; sizes[k] = s;
+    if (x > maxX) maxX = x;
+    if (y > maxY) maxY = y;
+    if (s < minSize) minSize = s;
+    if (s > maxSize) maxSize = s;
+  }
+  if (!n || minSize === maxSize) { minSize = 0; maxSize = 1; }
+  return { count: n, rows: order, xs, ys, sizes, maxX, maxY, minSize, maxSize };
+}
+
+function postPlot(query) {
+  const plot = buildPlot(query);
+  self.postMessage({ type: 'plot', id: query.id, plot },
+    [plot.rows.buffer, plot.xs.buffer, plot.ys.buffer, plot.sizes.buffer]);
+}
+
+self.onmessage = async (e) => {
+  const msg = e.data;
+  if (msg.type === 'init') {
+    // main.js waits on this reply, so a failed load must still answer (with an error)
+    try {
+      await loadInitial(msg);
+    } catch (err) {
+      self.postMessage({ type: 'error', message: err.message || String(err) });
+      return;
+    }
+    if (!catalogue) catalogue = createCatalogue([]);
+    ready = true;
+    self.postMessage({
+      type: 'ready',
+      numericFields: catalogue.numericFields,
+      categories: Array.from(catalogue.categories.values()),
+      names: catalogue.names.slice(),
+      stockcodes: catalogue.stockcodes.slice(),
+      urls: catalogue.urls.slice(),
+    });
+    loadRemainingBundles();
+  } else if (msg.type === 'query') {
+    lastQuery = msg;
+    const bundle = msg.categoryId && bundleUrls ? bundleOfCategory.get(String(msg.categoryId)) : null;
+    if (bundle && bundleUrls.has(bundle)) {
+      try {
+        await loadBundle(bundle);
+      } catch (err) {
+        if (msg === lastQuery) self.postMessage({ type: 'error', id: msg.id, message: err.message || String(err) });
+        return;
+      }
+    }
+    // A newer query arrived while the bundle loaded; it gets its own reply
+    if (msg === lastQuery) postPlot(msg);
+  }
+};
@@ -8,6 +8,9 @@ import pandas as pd
 import json
 import os
 import logging
+import datetime
+
+from history_store import ingest_snapshot
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -19,6 +22,8 @@ UNIQUE_PRODUCTS_JSONL = os.path.join(OUTPUT_DIR, 'unique_products_with_categorie
 # --- Keep CSV for mapping/utility files ---
 CATEGORY_MAPPING_CSV = os.path.join(OUTPUT_DIR, 'category_stockcode_mapping.csv')
 UNIQUE_STOCKCODES_CSV = os.path.join(OUTPUT_DIR, 'unique_stockcodes_for_rescraping.csv')
+# --- Append each deduped scrape to the price/nutrition history (history_store.py) ---
+RECORD_HISTORY = os.environ.get('WOOLIES_RECORD_HISTORY', '1') != '0'
 
 # Columns containing the category information that varies
 CATEGORY_COLUMNS = ['ScrapedCategoryID', 'ScrapedCategoryName', 'ScrapedCategoryParentID', 'ScrapedCategoryLevel']
@@ -80,7 +85,8 @@ try:
             for product_dict in df_unique_products.to_dict('records'):
                  # Clean dictionary for JSON serialization (remove NaN which json.dumps doesn't like)
                  # The 'All_Categories_Info' field already contains the list of dicts directly
-                 serializable_dict = {k: v for k, v in product_dict.items() if not pd.isna(v)}
+                 # (pd.isna on a list returns an array, so lists are kept without checking)
+                 serializable_dict = {k: v for k, v in product_dict.items() if isinstance(v, list) or not pd.isna(v)}
                  # Convert the dictionary to a JSON string
                  json_string = json.dumps(serializable_dict, ensure_ascii=False)
                  # Write the JSON string as a line in the JSONL file
@@ -112,6 +118,15 @@ try:
     unique_stockcodes.to_csv(UNIQUE_STOCKCODES_CSV, index=False, encoding='utf-8')
     logging.info(f"Saved {len(unique_stockcodes)} unique stockcodes for re-scraping to: {UNIQUE_STOCKCODES_CSV}")
 
+    # --- Output 4: History Snapshot ---
+    if RECORD_HISTORY:
+        # The scrape's date is when its JSONL was last written, not when dedupe runs
+        scrape_date = datetime.date.fromtimestamp(os.path.getmtime(INPUT_JSONL))
+        try:
+            ingest_snapshot(df_unique_products.to_dict('records'), scrape_date)
+        except Exception as e:
+            logging.error(f"Failed to record history snapshot: {e}", exc_info=True)
+
 except FileNotFoundError:
     logging.error(f"ERROR: Input JSONL file not found: {INPUT_JSONL}")
 except Exception as e:
@@ -0,0 +1,305 @@
+# --- START OF FILE history_store.py ---
+
+# Price and nutrition history, keyed by (Stockcode, scrape date).
+#
+# Each snapshot ingested (the dedupe output, or any products JSONL) is diffed against the latest
+# known values, and only products whose tracked values changed - plus new and delisted products -
+# are appended as a change segment. Segments are columnar .npz files:
+#   sid (int32 index into stockcodes.json), day (int32 days since 1970-01-01), listed (bool),
+#   one float32 array per HISTORY_FIELDS entry (NaN = not known)
+# so years of daily snapshots cost roughly (changes per day x 30 bytes).
+#
+# Loading concatenates the segments and sorts them by (sid, day), which gives a per-stockcode index
+# (offsets): a product's history is one slice, and "value as of day D" for a whole category is a
+# vectorised searchsorted, so app.py's history/price-move queries take milliseconds.
+#
+#   python history_store.py ingest --input output/unique_products_with_categories.jsonl --date 2025-01-31
+#   python history_store.py history 123456
+#   python history_store.py compact        # merge all segments into one, e.g. monthly
+
+import argparse
+import datetime
+import json
+import logging
+import os
+
+import numpy as np
+
+from product_schema import package_grams, to_number
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+HISTORY_DIR = 'output/history'
+MANIFEST = 'manifest.json'
+STOCKCODES = 'stockcodes.json'
+STATE = 'latest.npz'  # Latest values per stockcode, so ingest doesn't have to read every segment
+
+# Values tracked over time. PackageGrams is derived from PackageSize, for per-gram/per-dollar figures.
+HISTORY_FIELDS = ['Price', 'Nutr_Protein_per_100g', 'Nutr_Sugars_per_100g', 'Nutr_Energy_kJ_per_100g',
+                  'HealthStarRating', 'PackageGrams']
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def to_day(date):
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    return (date - EPOCH).days
+
+
+def from_day(day):
+    return (EPOCH + datetime.timedelta(days=int(day))).isoformat()
+
+
+def snapshot_values(product):
+    """The HISTORY_FIELDS values of one product row, as floats (NaN when unknown)."""
+    values = []
+    for field in HISTORY_FIELDS:
+        value = package_grams(product.get('PackageSize')) if field == 'PackageGrams' else to_number(product.get(field))
+        values.append(np.nan if value is None else float(value))
+    return values
+
+
+def _save_npz(path, **arrays):
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _save_json(path, value):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# --- Writing ---
+
+def ingest_snapshot(products, date, history_dir=HISTORY_DIR, mark_missing=True):
+    """Appends the changes in one snapshot (iterable of product dicts) taken on `date`.
+
+    Products missing from the snapshot are recorded as delisted unless mark_missing is False
+    (use that for partial scrapes). Returns the number of change records written.
+    """
+    os.makedirs(history_dir, exist_ok=True)
+    day = to_day(date)
+    manifest = _load_json(os.path.join(history_dir, MANIFEST), {'fields': HISTORY_FIELDS, 'segments': [], 'last_day': None})
+    if manifest['fields'] != HISTORY_FIELDS:
+        raise ValueError(f"History in {history_dir} tracks {manifest['fields']}, not {HISTORY_FIELDS}.")
+    if manifest['last_day'] is not None and day < manifest['last_day']:
+        raise ValueError(f"Snapshot date {from_day(day)} is before the latest ingested date {from_day(manifest['last_day'])}.")
+
+    stockcodes = _load_json(os.path.join(history_dir, STOCKCODES), [])
+    code_to_id = {code: i for i, code in enumerate(stockcodes)}
+
+    # Current snapshot as arrays (first occurrence wins for scrapes that list a product per category)
+    seen = {}
+    for product in products:
+        code = product.get('Stockcode')
+        if code is None or code == '':
+            continue
+        code = str(code)
+        if code in seen:
+            continue
+        if code not in code_to_id:
+            code_to_id[code] = len(stockcodes)
+            stockcodes.append(code)
+        seen[code] = snapshot_values(product)
+    snap_sids = np.fromiter((code_to_id[c] for c in seen), dtype=np.int32, count=len(seen))
+    snap_values = np.array(list(seen.values()), dtype=np.float32).reshape(len(seen), len(HISTORY_FIELDS))
+
+    # Latest known state, grown to cover new stockcodes
+    state_path = os.path.join(history_dir, STATE)
+    n = len(stockcodes)
+    latest = np.full((n, len(HISTORY_FIELDS)), np.nan, dtype=np.float32)
+    listed = np.zeros(n, dtype=bool)
+    known = np.zeros(n, dtype=bool)
+    if os.path.exists(state_path):
+        with np.load(state_path) as state:
+            m = len(state['listed'])
+            latest[:m], listed[:m], known[:m] = state['values'], state['listed'], state['known']
+
+    # Changed = new, relisted, or any tracked value differs (NaN == NaN)
+    previous = latest[snap_sids]
+    same = (previous == snap_values) | (np.isnan(previous) & np.isnan(snap_values))
+    changed = ~known[snap_sids] | ~listed[snap_sids] | ~same.all(axis=1)
+    change_sids = snap_sids[changed]
+    change_values = snap_values[changed]
+    change_listed = np.ones(len(change_sids), dtype=bool)
+
+    if mark_missing:
+        in_snapshot = np.zeros(n, dtype=bool)
+        in_snapshot[snap_sids] = True
+        gone = np.flatnonzero(listed & ~in_snapshot).astype(np.int32)
+        change_sids = np.concatenate([change_sids, gone])
+        change_values = np.concatenate([change_values, latest[gone]])  # keep last values; listed=False marks the delisting
+        change_listed = np.concatenate([change_listed, np.zeros(len(gone), dtype=bool)])
+        listed[gone] = False
+
+    latest[change_sids] = change_values
+    listed[change_sids] = change_listed
+    known[change_sids] = True
+
+    # Write segment, then stockcodes, then the manifest that makes them visible, then the state
+    if len(change_sids):
+        name = f"seg-{from_day(day)}-{len(manifest['segments']):05d}.npz"
+        _save_npz(os.path.join(history_dir, name), sid=change_sids,
+                  day=np.full(len(change_sids), day, dtype=np.int32), listed=change_listed,
+                  **{field: change_values[:, i] for i, field in enumerate(HISTORY_FIELDS)})
+        manifest['segments'].append(name)
+    _save_json(os.path.join(history_dir, STOCKCODES), stockcodes)
+    manifest['last_day'] = day
+    _save_json(os.path.join(history_dir, MANIFEST), manifest)
+    _save_npz(state_path, values=latest, listed=listed, known=known)
+    logging.info(f"History: {len(seen)} products on {from_day(day)}, {int(changed.sum())} changed/new, "
+                 f"{len(change_sids) - int(changed.sum())} delisted -> {history_dir}")
+    return len(change_sids)
+
+
+def compact(history_dir=HISTORY_DIR):
+    """Merges all segments into one sorted segment (fewer files to open on load)."""
+    store = HistoryStore.open(history_dir)
+    manifest = _load_json(os.path.join(history_dir, MANIFEST), None)
+    if store is None or len(manifest['segments']) < 2:
+        return
+    name = f"base-{from_day(manifest['last_day'])}.npz"
+    _save_npz(os.path.join(history_dir, name), sid=store.sid, day=store.day, listed=store.listed, **store.fields)
+    old_segments, manifest['segments'] = manifest['segments'], [name]
+    _save_json(os.path.join(history_dir, MANIFEST), manifest)
+    for segment in old_segments:
+        if segment != name:
+            os.remove(os.path.join(history_dir, segment))
+    logging.info(f"Compacted {len(old_segments)} segments ({len(store.sid)} records) into {name}.")
+
+
+# --- Reading ---
+
+class HistoryStore:
+    """All change records sorted by (sid, day), with a per-stockcode offset index."""
+    def __init__(self, stockcodes, sid, day, listed, fields):
+        order = np.argsort((sid.astype(np.int64) << 32) | day.astype(np.int64), kind='stable')  # stable: ingest order within a day
+        self.stockcodes = stockcodes
+        self.code_to_id = {code: i for i, code in enumerate(stockcodes)}
+        self.sid = sid[order]
+        self.day = day[order]
+        self.listed = listed[order]
+        self.fields = {name: values[order] for name, values in fields.items()}
+        self.offsets = np.searchsorted(self.sid, np.arange(len(stockcodes) + 1))
+        self._keys = (self.sid.astype(np.int64) << 32) | self.day.astype(np.int64)
+
+    @classmethod
+    def open(cls, history_dir=HISTORY_DIR):
+        """Loads the store, or returns None if nothing has been ingested yet."""
+        manifest = _load_json(os.path.join(history_dir, MANIFEST), None)
+        if manifest is None:
+            return None
+        stockcodes = _load_json(os.path.join(history_dir, STOCKCODES), [])
+        parts = {name: [] for name in ['sid', 'day', 'listed'] + manifest['fields']}
+        for segment in manifest['segments']:
+            with np.load(os.path.join(history_dir, segment)) as data:
+                for name in parts:
+                    parts[name].append(data[name])
+        empty = {'sid': np.int32, 'day': np.int32, 'listed': bool}
+        arrays = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=empty.get(name, np.float32))
+                  for name, chunks in parts.items()}
+        store = cls(stockcodes, arrays.pop('sid'), arrays.pop('day'), arrays.pop('listed'), arrays)
+        store.last_day = manifest['last_day']
+        return store
+
+    def lookup(self, stockcodes):
+        """History ids for an array of stockcodes (-1 where unknown)."""
+        return np.fromiter((self.code_to_id.get(str(code), -1) for code in stockcodes), dtype=np.int64, count=len(stockcodes))
+
+    def history(self, stockcode, start_day=None, end_day=None):
+        """Change points for one stockcode as a list of dicts, oldest first. None if unknown."""
+        sid = self.code_to_id.get(str(stockcode))
+        if sid is None:
+            return None
+        lo, hi = self.offsets[sid], self.offsets[sid + 1]
+        days = self.day[lo:hi]
+        if start_day is not None:
+            # Include the value in force at start_day, not just changes after it
+            lo += max(0, np.searchsorted(days, start_day, side='right') - 1)
+        if end_day is not None:
+            hi = self.offsets[sid] + np.searchsorted(days, end_day, side='right')
+        points = []
+        for i in range(lo, hi):
+            point = {'date': from_day(self.day[i]), 'listed': bool(self.listed[i])}
+            for name, values in self.fields.items():
+                value = float(values[i])
+                point[name] = None if np.isnan(value) else round(value, 4)
+            point['Protein_per_dollar'] = protein_per_dollar(point)
+            points.append(point)
+        return points
+
+    def value_at(self, sids, day, field):
+        """`field` as of `day` for each sid (NaN where unknown, not yet seen or delisted)."""
+        sids = np.asarray(sids, dtype=np.int64)
+        result = np.full(len(sids), np.nan, dtype=np.float32)
+        valid = (sids >= 0) & (sids < len(self.offsets) - 1)
+        pos = np.searchsorted(self._keys, (sids[valid] << 32) | day, side='right') - 1
+        hit = pos >= self.offsets[sids[valid]]  # the record found belongs to this sid
+        hit_pos = pos[hit]
+        values = np.where(self.listed[hit_pos], self.fields[field][hit_pos], np.nan)
+        valid_index = np.flatnonzero(valid)
+        result[valid_index[hit]] = values
+        return result
+
+    def price_moves(self, sids, since_day, until_day=None, field='Price'):
+        """Where `field` changed between since_day and until_day: (positions in sids, before, after, change, pct)."""
+        until_day = self.last_day if until_day is None else until_day
+        sids = np.asarray(sids, dtype=np.int64)
+        before = self.value_at(sids, since_day, field)
+        after = self.value_at(sids, until_day, field)
+        moved = np.flatnonzero(~np.isnan(before) & ~np.isnan(after) & (before != after) & (before > 0))
+        before, after = before[moved], after[moved]
+        change = after - before
+        return moved, before, after, change, change / before * 100.0
+
+
+def protein_per_dollar(point):
+    """Grams of protein per dollar from a history point's price, protein per 100g and pack size."""
+    price, protein, grams = point.get('Price'), point.get('Nutr_Protein_per_100g'), point.get('PackageGrams')
+    if not price or protein is None or not grams:
+        return None
+    return round(protein * grams / 100.0 / price, 3)
+
+
+def read_products(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Price/nutrition history store.")
+    parser.add_argument('--dir', default=HISTORY_DIR, help=f"History directory (default: {HISTORY_DIR}).")
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help="Append one snapshot's changes.")
+    ingest_parser.add_argument('--input', default='output/unique_products_with_categories.jsonl', help="Products JSONL.")
+    ingest_parser.add_argument('--date', help="Snapshot date, YYYY-MM-DD (default: the input file's modification date).")
+    ingest_parser.add_argument('--partial', action='store_true', help="Partial scrape: don't mark missing products as delisted.")
+    history_parser = commands.add_parser('history', help="Print one stockcode's history.")
+    history_parser.add_argument('stockcode')
+    commands.add_parser('compact', help="Merge all segments into one.")
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        date = args.date or datetime.date.fromtimestamp(os.path.getmtime(args.input)).isoformat()
+        ingest_snapshot(read_products(args.input), date, args.dir, mark_missing=not args.partial)
+    elif args.command == 'history':
+        store = HistoryStore.open(args.dir)
+        points = store.history(args.stockcode) if store else None
+        print(json.dumps(points, indent=2) if points is not None else f"No history for {args.stockcode}.")
+    elif args.command == 'compact':
+        compact(args.dir)
+
+# --- END OF FILE history_store.py ---
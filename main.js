@@ -1,20 +1,10 @@
-// Utility to fetch JSON files
-async function fetchJSON(path) {
-  const response = await fetch(path);
-  return await response.json();
-}
-
-// Build category tree from product_to_categories_mapping.json
-async function buildCategoryTree() {
-  const mapping = await fetchJSON('output/product_to_categories_mapping.json');
+// Build category tree from the flat category list the data worker extracts
+// out of product_to_categories_mapping.json
+function buildCategoryTree(categories) {
   const catMap = {};
   const catTree = {};
-  // Flatten all categories
-  Object.values(mapping).forEach(catArr => {
-    catArr.forEach(cat => {
-      catMap[cat.ScrapedCategoryID] = cat;
-      cat.children = cat.children || [];
-    });
+  categories.forEach(cat => {
+    catMap[cat.ScrapedCategoryID] = { ...cat, children: [] };
   });
   // Build parent-child relationships
   Object.values(catMap).forEach(cat => {
@@ -140,41 +130,86 @@ function renderDietaryToggles(container, onChange) {
   });
 }
 
-// Filter products by category and dietary toggles
-function filterProducts(products, mapping, selectedCat, dietaryFilters) {
-  let filteredProducts = products;
-  if (selectedCat) {
-    // Find all stockcodes for the selected category (direct or descendant)
-    const relevantStockcodes = Object.entries(mapping)
-      .filter(([stockcode, cats]) => cats.some(cat => cat.ScrapedCategoryID === selectedCat.ScrapedCategoryID))
-      .map(([stockcode]) => stockcode);
-    filteredProducts = filteredProducts.filter(prod => relevantStockcodes.includes(prod.Stockcode));
+// --- Canvas scatter renderer ---
+// Above this many points the dots are binned into a density grid instead of drawn one by one
+const LOD_POINT_THRESHOLD = 20000;
+const LOD_CELL_PX = 4;
+const MIN_DOT_SIZE = 8, MAX_DOT_SIZE = 32;
+
+// Point quadtree over screen coordinates, used for hover/click hit-testing
+class QuadTree {
+  constructor(x, y, w, h, depth = 0) {
+    this.x = x; this.y = y; this.w = w; this.h = h;
+    this.depth = depth;
+    this.points = [];
+    this.children = null;
   }
-  // Apply dietary filters
-  return filteredProducts.filter(prod => {
-    if (dietaryFilters.includes('Vegetarian') && !(prod.LifestyleAndDietaryStatement || '').toLowerCase().includes('vegetarian')) return false;
-    if (dietaryFilters.includes('Vegan') && !(prod.LifestyleAndDietaryStatement || '').toLowerCase().includes('vegan')) return false;
-    if (dietaryFilters.includes('Gluten Free') && !(prod.AllergyStatement || '').toLowerCase().includes('gluten free')) return false;
-    if (dietaryFilters.includes('Nut Free') && (prod.ContainsNuts || '').toLowerCase() === 'true') return false;
-    return true;
-  });
-}
 
-function renderVisualization(container, products, xField, yField, sizeField, fieldMeta, reverseX, reverseY, reverseSize) {
-  container.innerHTML = '';
-  if (!products.length) {
-    container.textContent = 'No products found for this category and filters.';
-    return;
+  insert(i, xs, ys) {
+    if (this.children) {
+      this.childFor(xs[i], ys[i]).insert(i, xs, ys);
+      return;
+    }
+    this.points.push(i);
+    if (this.points.length > 16 && this.depth < 12) {
+      const hw = this.w / 2, hh = this.h / 2, d = this.depth + 1;
+      this.children = [
+        new QuadTree(this.x, this.y, hw, hh, d),
+        new QuadTree(this.x + hw, this.y, hw, hh, d),
+        new QuadTree(this.x, this.y + hh, hw, hh, d),
+        new QuadTree(this.x + hw, this.y + hh, hw, hh, d),
+      ];
+      this.points.forEach(p => this.childFor(xs[p], ys[p]).insert(p, xs, ys));
+      this.points = [];
+    }
   }
-  const width = 600, height = 600, pad = 45;
-  // Find axis max/min
-  const maxX = Math.max(...products.map(p => parseFloat(p[xField]) || 0), 20);
-  const maxY = Math.max(...products.map(p => parseFloat(p[yField]) || 0), 20);
-  // Matrix container
+
+  childFor(px, py) {
+    const right = px >= this.x + this.w / 2 ? 1 : 0;
+    const bottom = py >= this.y + this.h / 2 ? 2 : 0;
+    return this.children[right + bottom];
+  }
+
+  // Topmost point whose dot covers (px, py); later points are drawn on top so they win ties
+  hit(px, py, maxRadius, xs, ys, radii) {
+    if (px < this.x - maxRadius || px > this.x + this.w + maxRadius ||
+        py < this.y - maxRadius || py > this.y + this.h + maxRadius) return -1;
+    let best = -1;
+    if (this.children) {
+      this.children.forEach(child => {
+        const i = child.hit(px, py, maxRadius, xs, ys, radii);
+        if (i > best) best = i;
+      });
+      return best;
+    }
+    this.points.forEach(i => {
+      const dx = xs[i] - px, dy = ys[i] - py;
+      if (dx * dx + dy * dy <= radii[i] * radii[i] && i > best) best = i;
+    });
+    return best;
+  }
+}
+
+function createMatrix(container, width, height) {
   const matrix = document.createElement('div');
   matrix.className = 'matrix-container';
   matrix.style.width = width + 'px';
   matrix.style.height = height + 'px';
+  const dpr = window.devicePixelRatio || 1;
+  const layer = className => {
+    const c = document.createElement('canvas');
+    c.className = className;
+    c.width = width * dpr;
+    c.height = height * dpr;
+    c.style.width = width + 'px';
+    c.style.height = height + 'px';
+    c.getContext('2d').setTransform(dpr, 0, 0, dpr, 0, 0);
+    matrix.appendChild(c);
+    return c;
+  };
+  const canvas = layer('matrix-canvas');
+  // Hover highlight lives on its own layer so hovering never repaints the scatter underneath
+  const overlay = layer('matrix-canvas matrix-overlay');
   // Axes
   const axes = document.createElement('div');
   axes.className = 'matrix-axes';
@@ -185,138 +220,241 @@ function renderVisualization(container, products, xField, yField, sizeField, fie
   yAxis.className = 'matrix-y-axis';
   axes.appendChild(yAxis);
   matrix.appendChild(axes);
-  // X axis label
-  const xLabelDiv = document.createElement('div');
-  xLabelDiv.className = 'matrix-axis-header' + (reverseX ? ' reversed' : '');
-  xLabelDiv.textContent = fieldMeta[xField]?.label || xField;
-  xLabelDiv.style.left = width / 2 + 'px';
-  xLabelDiv.style.bottom = (pad - 16) + 'px';
-  xLabelDiv.style.transform = 'translateX(-50%)';
-  matrix.appendChild(xLabelDiv);
+  const label = (className, style) => {
+    const div = document.createElement('div');
+    div.className = className;
+    Object.assign(div.style, style);
+    matrix.appendChild(div);
+    return div;
+  };
+  const pad = 45;
+  const state = {
+    matrix, canvas, overlay, width, height, pad,
+    // Axis labels
+    xLabel: label('matrix-axis-header', { left: width / 2 + 'px', bottom: (pad - 16) + 'px', transform: 'translateX(-50%)' }),
+    yLabel: label('matrix-axis-header', { top: height / 2 + 'px', left: (pad - 16) + 'px', transform: 'translateY(-50%) rotate(-90deg)' }),
+    // Tick labels (0 and max)
+    x0: label('matrix-tick-label', { left: (pad - 10) + 'px', top: (height - pad + 4) + 'px' }),
+    xMax: label('matrix-tick-label', { left: (width - pad - 8) + 'px', top: (height - pad + 4) + 'px' }),
+    y0: label('matrix-tick-label', { left: (pad - 28) + 'px', top: (height - pad - 10) + 'px' }),
+    yMax: label('matrix-tick-label', { left: (pad - 32) + 'px', top: (pad - 10) + 'px' }),
+    tooltip: label('matrix-tooltip', {}),
+    hovered: -1,
+  };
+  state.x0.textContent = '0';
+  state.y0.textContent = '0';
+  canvas.addEventListener('mousemove', e => onMatrixHover(state, e));
+  canvas.addEventListener('mouseleave', () => setHovered(state, -1));
+  canvas.addEventListener('click', e => {
+    e.stopPropagation();
+    if (state.hovered < 0) return;
+    const row = state.plot.rows[state.hovered];
+    const stockcode = state.catalogue.stockcodes[row];
+    let url = state.catalogue.urls[row];
+    if (!url && stockcode) {
+      url = `https://www.woolworths.com.au/shop/productdetails/${stockcode}`;
+    }
+    if (url) {
+      window.open(url, '_blank', 'noopener');
+    }
+  });
+  container.appendChild(matrix);
+  return state;
+}
 
-  // Y axis label
-  const yLabelDiv = document.createElement('div');
-  yLabelDiv.className = 'matrix-axis-header' + (reverseY ? ' reversed' : '');
-  yLabelDiv.textContent = fieldMeta[yField]?.label || yField;
-  yLabelDiv.style.top = height / 2 + 'px';
-  yLabelDiv.style.left = (pad - 16) + 'px';
-  yLabelDiv.style.transform = 'translateY(-50%) rotate(-90deg)';
-  matrix.appendChild(yLabelDiv);
-  // Tick labels (0 and max)
-  const x0 = document.createElement('div');
-  x0.className = 'matrix-tick-label';
-  x0.style.left = (pad-10) + 'px';
-  x0.style.top = (height - pad + 4) + 'px';
-  x0.textContent = '0';
-  matrix.appendChild(x0);
-  const xMax = document.createElement('div');
-  xMax.className = 'matrix-tick-label';
-  xMax.style.left = (width - pad - 8) + 'px';
-  xMax.style.top = (height - pad + 4) + 'px';
-  xMax.textContent = maxX.toFixed(1);
-  matrix.appendChild(xMax);
-  const y0 = document.createElement('div');
-  y0.className = 'matrix-tick-label';
-  y0.style.left = (pad - 28) + 'px';
-  y0.style.top = (height - pad - 10) + 'px';
-  y0.textContent = '0';
-  matrix.appendChild(y0);
-  const yMax = document.createElement('div');
-  yMax.className = 'matrix-tick-label';
-  yMax.style.left = (pad - 32) + 'px';
-  yMax.style.top = (pad - 10) + 'px';
-  yMax.textContent = maxY.toFixed(1);
-  matrix.appendChild(yMax);
-  // Tooltip
-  const tooltip = document.createElement('div');
-  tooltip.className = 'matrix-tooltip';
-  matrix.appendChild(tooltip);
-  // Plot dots
-  // Determine min/max for size field
-  let minSize = 8, maxSize = 32;
-  let minVal = Math.min(...products.map(p => parseFloat(p[sizeField]) || 0));
-  let maxVal = Math.max(...products.map(p => parseFloat(p[sizeField]) || 0));
-  if (minVal === maxVal) { minVal = 0; maxVal = minVal + 1; }
-  products.forEach(prod => {
-    let xVal = parseFloat(prod[xField]) || 0;
-    let yVal = parseFloat(prod[yField]) || 0;
-    let sizeVal = parseFloat(prod[sizeField]) || 0;
-    const x = pad + ((reverseX ? (maxX - xVal) : xVal) / maxX) * (width - 2*pad);
-    const y = height - pad - ((reverseY ? (maxY - yVal) : yVal) / maxY) * (height - 2*pad);
-    let rawSize = sizeVal;
-    let sizeNorm = (rawSize - minVal) / (maxVal - minVal);
+// Project data values to screen space; cheap enough to redo on every axis/size/reverse switch
+function projectPoints(state, plot, reverseX, reverseY, reverseSize) {
+  const { width, height, pad } = state;
+  const n = plot.count;
+  const px = new Float32Array(n), py = new Float32Array(n), radii = new Float32Array(n);
+  const spanX = (width - 2 * pad) / plot.maxX, spanY = (height - 2 * pad) / plot.maxY;
+  const sizeRange = plot.maxSize - plot.minSize;
+  let maxRadius = MIN_DOT_SIZE / 2;
+  for (let i = 0; i < n; i++) {
+    const xVal = plot.xs[i], yVal = plot.ys[i];
+    let sizeNorm = (plot.sizes[i] - plot.minSize) / sizeRange;
     if (reverseSize) sizeNorm = 1 - sizeNorm;
-    let size = isNaN(sizeNorm) ? minSize : minSize + sizeNorm * (maxSize - minSize);
-    size = Math.max(minSize, Math.min(maxSize, size));
-    const dot = document.createElement('div');
-    dot.className = 'matrix-dot';
-    dot.style.left = `${x}px`;
-    dot.style.top = `${y}px`;
-    dot.style.width = `${size}px`;
-    dot.style.height = `${size}px`;
+    let size = isNaN(sizeNorm) ? MIN_DOT_SIZE : MIN_DOT_SIZE + sizeNorm * (MAX_DOT_SIZE - MIN_DOT_SIZE);
+    size = Math.max(MIN_DOT_SIZE, Math.min(MAX_DOT_SIZE, size));
+    // Same placement as the old DOM dots: (x, y) was the dot's top-left corner
+    const r = size / 2;
+    px[i] = pad + (reverseX ? (plot.maxX - xVal) : xVal) * spanX + r;
+    py[i] = height - pad - (reverseY ? (plot.maxY - yVal) : yVal) * spanY + r;
+    radii[i] = r;
+    if (r > maxRadius) maxRadius = r;
+  }
+  return { px, py, radii, maxRadius, quadtree: null };
+}
 
-    // Add click to open Woolworths product link
-    dot.onclick = (e) => {
-      e.stopPropagation();
-      let url = prod.WoolworthsUrl;
-      if (!url && prod.Stockcode) {
-        url = `https://www.woolworths.com.au/shop/productdetails/${prod.Stockcode}`;
-      }
-      if (url) {
-        window.open(url, '_blank', 'noopener');
-      }
-    };
-    dot.onmouseenter = () => {
-      tooltip.innerHTML = `<b>${prod.ProductName}</b><br>${fieldMeta[xField]?.label || xField}: ${prod[xField] || 0}<br>${fieldMeta[yField]?.label || yField}: ${prod[yField] || 0}<br>${fieldMeta[sizeField]?.label || sizeField}: ${prod[sizeField] || 0}`;
-      tooltip.style.display = 'block';
-      const matrixRect = matrix.getBoundingClientRect();
-      const dotRect = dot.getBoundingClientRect();
-      let left = dotRect.right - matrixRect.left + 8;
-      let top = dotRect.top - matrixRect.top - 4;
-      const tooltipRect = tooltip.getBoundingClientRect();
-      const matrixWidth = matrixRect.width;
-      const matrixHeight = matrixRect.height;
-      if (left + tooltipRect.width > matrixWidth) {
-        left = dotRect.left - matrixRect.left - tooltipRect.width - 8;
-      }
-      if (top + tooltipRect.height > matrixHeight) {
-        top = matrixHeight - tooltipRect.height - 8;
-      }
-      if (top < 0) top = 4;
-      if (left < 0) left = 4;
-      tooltip.style.left = left + 'px';
-      tooltip.style.top = top + 'px';
-    };
-    dot.onmouseleave = () => { tooltip.style.display = 'none'; };
-    matrix.appendChild(dot);
-  });
-  container.appendChild(matrix);
+function drawPoints(state) {
+  const ctx = state.canvas.getContext('2d');
+  const { width, height } = state;
+  const { px, py, radii } = state.screen;
+  const n = state.plot.count;
+  ctx.clearRect(0, 0, width, height);
+  if (n > LOD_POINT_THRESHOLD) {
+    // Level of detail: accumulate counts per LOD_CELL_PX cell and shade by log density
+    const cols = Math.ceil(width / LOD_CELL_PX), rows = Math.ceil(height / LOD_CELL_PX);
+    const counts = new Uint32Array(cols * rows);
+    let maxCount = 1;
+    for (let i = 0; i < n; i++) {
+      const cx = Math.floor(px[i] / LOD_CELL_PX), cy = Math.floor(py[i] / LOD_CELL_PX);
+      if (cx < 0 || cy < 0 || cx >= cols || cy >= rows) continue;
+      const c = ++counts[cy * cols + cx];
+      if (c > maxCount) maxCount = c;
+    }
+    const logMax = Math.log(maxCount + 1);
+    ctx.fillStyle = '#4caf50';
+    for (let cell = 0; cell < counts.length; cell++) {
+      if (!counts[cell]) continue;
+      ctx.globalAlpha = 0.25 + 0.75 * Math.log(counts[cell] + 1) / logMax;
+      ctx.fillRect((cell % cols) * LOD_CELL_PX, Math.floor(cell / cols) * LOD_CELL_PX, LOD_CELL_PX, LOD_CELL_PX);
+    }
+    ctx.globalAlpha = 1;
+  } else {
+    ctx.fillStyle = '#4caf50';
+    ctx.strokeStyle = '#333';
+    ctx.lineWidth = 2;
+    for (let i = 0; i < n; i++) {
+      ctx.beginPath();
+      ctx.arc(px[i], py[i], radii[i], 0, 2 * Math.PI);
+      ctx.fill();
+      ctx.stroke();
+    }
+  }
+}
+
+function drawHover(state) {
+  const ctx = state.overlay.getContext('2d');
+  ctx.clearRect(0, 0, state.width, state.height);
+  if (state.hovered < 0) return;
+  const i = state.hovered;
+  const { px, py, radii } = state.screen;
+  ctx.fillStyle = '#2196f3';
+  ctx.strokeStyle = '#333';
+  ctx.lineWidth = 2;
+  ctx.beginPath();
+  ctx.arc(px[i], py[i], radii[i] * 1.2, 0, 2 * Math.PI);
+  ctx.fill();
+  ctx.stroke();
+}
+
+// Plot values are float32, so print them rounded rather than with float32 noise (12.300000190734863)
+const DEFAULT_TOOLTIP_PRECISION = 6;
+function formatValue(fieldMeta, field, value) {
+  const digits = fieldMeta[field]?.digits;
+  if (digits !== undefined) return value.toFixed(digits);
+  return String(Number(value.toPrecision(DEFAULT_TOOLTIP_PRECISION)));
+}
+
+function setHovered(state, i) {
+  if (i === state.hovered) return;
+  state.hovered = i;
+  state.canvas.style.cursor = i >= 0 ? 'pointer' : 'default';
+  drawHover(state);
+  const tooltip = state.tooltip;
+  if (i < 0) {
+    tooltip.style.display = 'none';
+    return;
+  }
+  const { plot, xField, yField, sizeField, fieldMeta } = state;
+  const name = state.catalogue.names[plot.rows[i]];
+  const line = (field, value) => `${fieldMeta[field]?.label || field}: ${formatValue(fieldMeta, field, value)}`;
+  tooltip.innerHTML = `<b>${name}</b><br>${line(xField, plot.xs[i])}<br>${line(yField, plot.ys[i])}<br>${line(sizeField, plot.sizes[i])}`;
+  tooltip.style.display = 'block';
+  const r = state.screen.radii[i];
+  let left = state.screen.px[i] + r + 8;
+  let top = state.screen.py[i] - r - 4;
+  const tooltipRect = tooltip.getBoundingClientRect();
+  if (left + tooltipRect.width > state.width) {
+    left = state.screen.px[i] - r - tooltipRect.width - 8;
+  }
+  if (top + tooltipRect.height > state.height) {
+    top = state.height - tooltipRect.height - 8;
+  }
+  if (top < 0) top = 4;
+  if (left < 0) left = 4;
+  tooltip.style.left = left + 'px';
+  tooltip.style.top = top + 'px';
+}
+
+function onMatrixHover(state, e) {
+  const screen = state.screen;
+  if (!screen) return;
+  // The index is only needed once the user actually hovers, so redraws never pay for it
+  if (!screen.quadtree) {
+    const tree = new QuadTree(-MAX_DOT_SIZE, -MAX_DOT_SIZE, state.width + 2 * MAX_DOT_SIZE, state.height + 2 * MAX_DOT_SIZE);
+    for (let i = 0; i < state.plot.count; i++) tree.insert(i, screen.px, screen.py);
+    screen.quadtree = tree;
+  }
+  const rect = state.canvas.getBoundingClientRect();
+  const x = e.clientX - rect.left, y = e.clientY - rect.top;
+  setHovered(state, screen.quadtree.hit(x, y, screen.maxRadius, screen.px, screen.py, screen.radii));
+}
+
+// plot comes from the data worker: typed arrays of plotted values plus the catalogue row of each point
+function renderVisualization(container, plot, catalogue, xField, yField, sizeField, fieldMeta, reverseX, reverseY, reverseSize) {
+  if (!plot.count) {
+    container.innerHTML = '';
+    container._scatter = null;
+    container.textContent = 'No products found for this category and filters.';
+    return;
+  }
+  // Reuse the canvas between renders; other code paths may have replaced the container's content
+  let state = container._scatter;
+  if (!state || !container.contains(state.matrix)) {
+    container.innerHTML = '';
+    state = container._scatter = createMatrix(container, 600, 600);
+  }
+  Object.assign(state, { plot, catalogue, xField, yField, sizeField, fieldMeta, hovered: -1 });
+  state.tooltip.style.display = 'none';
+  state.xLabel.className = 'matrix-axis-header' + (reverseX ? ' reversed' : '');
+  state.xLabel.textContent = fieldMeta[xField]?.label || xField;
+  state.yLabel.className = 'matrix-axis-header' + (reverseY ? ' reversed' : '');
+  state.yLabel.textContent = fieldMeta[yField]?.label || yField;
+  state.xMax.textContent = state.plot.maxX.toFixed(1);
+  state.yMax.textContent = state.plot.maxY.toFixed(1);
+  state.screen = projectPoints(state, state.plot, reverseX, reverseY, reverseSize);
+  drawPoints(state);
+  drawHover(state);
 }
 
 async function main() {
-  const [products, mapping, catTree] = await Promise.all([
-    fetchJSON('output/unique_products_with_categories_saved.json'),
-    fetchJSON('output/product_to_categories_mapping.json'),
-    buildCategoryTree()
-  ]);
+  // JSON parsing, filtering and scaling all happen in the data worker
+  const worker = new Worker('data_worker.js');
+  const visContainer = document.getElementById('visualization');
+  visContainer.textContent = 'Loading products...';
+  let catalogue;
+  try {
+    catalogue = await new Promise((resolve, reject) => {
+      worker.onmessage = e => {
+        if (e.data.type === 'ready') resolve(e.data);
+        else if (e.data.type === 'error') reject(new Error(e.data.message));
+      };
+      // Script errors inside the worker (e.g. it failed to load) never reach onmessage
+      worker.onerror = e => reject(new Error(e.message || 'The data worker failed to start.'));
+      worker.postMessage({
+        type: 'init',
+        productsUrl: new URL('output/unique_products_with_categories_saved.json', location.href).href,
+        mappingUrl: new URL('output/product_to_categories_mapping.json', location.href).href,
+        manifestUrl: new URL('output/bundles/manifest.json', location.href).href,
+      });
+    });
+  } catch (err) {
+    worker.terminate();
+    visContainer.textContent = `Could not load product data: ${err.message}`;
+    return;
+  }
+  visContainer.textContent = '';
+  const catTree = buildCategoryTree(catalogue.categories);
 
   // --- CATEGORY AUTOCOMPLETE ---
-  // Flatten all categories from mapping
-  const allCategories = [];
-  const seenCatIDs = new Set();
-  Object.values(mapping).forEach(catArr => {
-    catArr.forEach(cat => {
-      if (!seenCatIDs.has(cat.ScrapedCategoryID)) {
-        allCategories.push({
-          id: cat.ScrapedCategoryID,
-          name: cat.ScrapedCategoryName,
-          parent: cat.ScrapedCategoryParentID,
-          level: cat.ScrapedCategoryLevel
-        });
-        seenCatIDs.add(cat.ScrapedCategoryID);
-      }
-    });
-  });
+  const allCategories = catalogue.categories.map(cat => ({
+    id: cat.ScrapedCategoryID,
+    name: cat.ScrapedCategoryName,
+    parent: cat.ScrapedCategoryParentID,
+    level: cat.ScrapedCategoryLevel
+  }));
   const searchInput = document.getElementById('category-search');
   const suggestionsBox = document.getElementById('category-suggestions');
   let suggestions = [];
@@ -388,13 +526,12 @@ async function main() {
     Nutr_Sugars_per_100g: { label: 'Sugar per 100g' },
     Nutr_Fat_Total_per_100g: { label: 'Fat per 100g' },
     Nutr_Carbohydrate_per_100g: { label: 'Carbs per 100g' },
-    Price: { label: 'Price ($)' },
+    Price: { label: 'Price ($)', digits: 2 },
     Nutr_Energy_kJ_per_100g: { label: 'Energy (kJ/100g)' },
-    HealthStarRating: { label: 'Health Star Rating' },
+    HealthStarRating: { label: 'Health Star Rating', digits: 1 },
     // Add more if needed
   };
-  // Find all numeric fields in products
-  const numericFields = Object.keys(products[0] || {}).filter(k => typeof products[0][k] === 'number' || !isNaN(parseFloat(products[0][k])));
+  const numericFields = catalogue.numericFields;
   // Populate dropdowns
   const xSel = document.getElementById('x-axis-select');
   const ySel = document.getElementById('y-axis-select');
@@ -449,7 +586,6 @@ async function main() {
 
   const catSelContainer = document.getElementById('category-selector');
   const dietaryContainer = document.getElementById('dietary-toggles');
-  const visContainer = document.getElementById('visualization');
   renderCategorySelector(catTree, catSelContainer, cat => {
     selectedCat = cat;
     updateView();
@@ -459,48 +595,34 @@ async function main() {
     updateView();
   });
   let productKeyword = '';
-  function updateView() {
-    let filtered;
-    if (!selectedCat) {
-      // No category selected: show all products, filtered by dietary and keyword
-      filtered = products;
-      if (dietaryFilters && dietaryFilters.length > 0) {
-        filtered = filterProducts(filtered, mapping, null, dietaryFilters);
-      }
-      if (productKeyword && productKeyword.trim() !== '') {
-        const kw = productKeyword.toLowerCase();
-        filtered = filtered.filter(p => {
-          return (
-            (p.ProductName && p.ProductName.toLowerCase().includes(kw)) ||
-            (p.Brand && p.Brand.toLowerCase().includes(kw)) ||
-            (p.Description && p.Description.toLowerCase().includes(kw))
-          );
-        });
-      }
-      if (!filtered.length) {
-        visContainer.textContent = 'No products found.';
-        return;
-      }
-    } else {
-      filtered = filterProducts(products, mapping, selectedCat, dietaryFilters);
-      if (productKeyword && productKeyword.trim() !== '') {
-        const kw = productKeyword.toLowerCase();
-        filtered = filtered.filter(p => {
-          return (
-            (p.ProductName && p.ProductName.toLowerCase().includes(kw)) ||
-            (p.Brand && p.Brand.toLowerCase().includes(kw)) ||
-            (p.Description && p.Description.toLowerCase().includes(kw))
-          );
-        });
-      }
-      if (!filtered.length) {
-        visContainer.textContent = 'Please select a category.';
-        return;
-      }
+  // Only the newest query's result is rendered; older replies still in flight are dropped
+  let latestQueryId = 0;
+  worker.onmessage = e => {
+    const msg = e.data;
+    if (msg.type === 'rows') {
+      // Products from a bundle the worker loaded after the first plot; plots index rows in load order
+      catalogue.names = catalogue.names.concat(msg.names);
+      catalogue.stockcodes = catalogue.stockcodes.concat(msg.stockcodes);
+      catalogue.urls = catalogue.urls.concat(msg.urls);
+      return;
+    }
+    if (msg.id !== latestQueryId) return;
+    if (msg.type === 'error') {
+      visContainer.innerHTML = '';
+      visContainer._scatter = null;
+      visContainer.textContent = `Could not load product data: ${msg.message}`;
+      return;
+    }
+    if (msg.type !== 'plot') return;
+    const plot = msg.plot;
+    if (!plot.count) {
+      visContainer.textContent = selectedCat ? 'Please select a category.' : 'No products found.';
+      return;
     }
     renderVisualization(
       visContainer,
-      filtered,
+      plot,
+      catalogue,
       xField,
       yField,
       sizeField,
@@ -509,6 +631,18 @@ async function main() {
       reverseY,
       reverseSize
     );
+  };
+  function updateView() {
+    worker.postMessage({
+      type: 'query',
+      id: ++latestQueryId,
+      categoryId: selectedCat ? selectedCat.ScrapedCategoryID : null,
+      dietaryFilters,
+      keyword: productKeyword,
+      xField,
+      yField,
+      sizeField,
+    });
   }
   // Keyword search event
   const productKeywordInput = document.getElementById('product-keyword-search');
@@ -0,0 +1,276 @@
+# --- metrics.py ---
+# Small, dependency-free metrics registry with Prometheus text exposition.
+# Counters, gauges and histograms (optionally labelled), a background /metrics HTTP endpoint,
+# and a plain summary for logging at the end of a run.
+
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} is labelled; use .labels(...)")
+        return self.labels()
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def get(self):
+        return self.value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    _new_child = _Value
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def get(self):
+        return self._default().get()
+
+    def samples(self):
+        for values, child in self.children():
+            yield self.name, values, (), child.get()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    _new_child = _Value
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def get(self):
+        return self._default().get()
+
+    def track(self):
+        """Context manager that increments the gauge for the duration of the block."""
+        return _Tracked(self._default())
+
+    def samples(self):
+        for values, child in self.children():
+            yield self.name, values, (), child.get()
+
+
+class _Tracked:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.child.inc()
+
+    def __exit__(self, *exc):
+        self.child.dec()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimated quantile by linear interpolation within the bucket (like histogram_quantile)."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, c in enumerate(counts):
+            if cumulative + c >= rank and c:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # +Inf bucket: best we can say is "above the last bound"
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / c
+            cumulative += c
+        return self.buckets[-1]
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.target.observe(self.elapsed)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        for values, child in self.children():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                yield self.name + '_bucket', values, (('le', '+Inf' if bound == float('inf') else repr(bound)),), cumulative
+            yield self.name + '_sum', values, (), child.sum
+            yield self.name + '_count', values, (), child.count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self.started = time.time()
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, values, extra, value in metric.samples():
+                lines.append(f'{sample_name}{_format_labels(metric.labelnames, values, extra)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Plain dict of every series, with count/mean/p50/p99 for histograms."""
+        elapsed = time.time() - self.started
+        result = {'elapsed_seconds': round(elapsed, 3)}
+        for metric in self._metrics:
+            series = {}
+            for values, child in metric.children():
+                key = ','.join(f'{k}={v}' for k, v in zip(metric.labelnames, values)) or 'value'
+                if metric.kind == 'histogram':
+                    series[key] = {
+                        'count': child.count, 'sum': round(child.sum, 6),
+                        'mean': round(child.sum / child.count, 6) if child.count else None,
+                        'p50': child.quantile(0.5), 'p99': child.quantile(0.99),
+                    }
+                else:
+                    series[key] = child.get()
+                    if metric.kind == 'counter' and elapsed > 0:
+                        series[key + ' (per s)'] = round(child.get() / elapsed, 3)
+            result[metric.name] = series
+        return result
+
+    def log_summary(self, logger=logging):
+        for name, series in self.summary().items():
+            logger.info(f"[metrics] {name}: {json.dumps(series)}")
+
+
+def start_http_server(registry, port, host='127.0.0.1'):
+    """Serves registry.render() at /metrics from a daemon thread. Returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
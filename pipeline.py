@@ -0,0 +1,360 @@
+# --- START OF FILE pipeline.py ---
+
+# One command for the whole data path: scrape -> dedupe -> history / convert / mapping -> bundles /
+# text_store, publishing a versioned dataset that app.py loads (read-only: app.py never writes to it).
+#
+#   python pipeline.py                    # rebuild whatever is out of date from the current scrape
+#   python pipeline.py --scrape           # run bigparallel.py first
+#   python pipeline.py --force convert    # rerun a stage (and so everything downstream that changes)
+#   python pipeline.py --status
+#
+# Each stage declares its input and output files; a stage depends on whichever stage produces its
+# inputs, so the DAG is derived from the paths. A stage runs only if the SHA-256 of one of its inputs
+# differs from the last successful run recorded in STATE_FILE (or its outputs are missing), so a run
+# after e.g. rescrape.py only redoes the stages downstream of the file that changed. Stages whose
+# dependencies are done run in parallel worker processes.
+#
+# Stages writing to {dataset} build into a staging directory; up-to-date ones link their outputs from
+# the current version instead, and bundles are rebuilt per level-1 category, reusing (linking) every
+# bundle whose content hash is unchanged. If anything in the dataset changed, the staging directory
+# becomes DATASETS_DIR/<version> and DATASETS_DIR/CURRENT is switched to it atomically; the last
+# KEEP_VERSIONS versions are kept. The scrape stage only runs with --scrape (its output depends on
+# the live site, not on its input file).
+
+import argparse
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = 'output/datasets'
+CURRENT_POINTER = 'CURRENT'
+DATASET_INFO = 'dataset.json'
+STATE_FILE = 'output/pipeline_state.json'
+KEEP_VERSIONS = 3
+DATASET = '{dataset}'  # Placeholder for the dataset version directory in stage paths
+
+# Fixed paths of the existing scripts (bigparallel.py and dedupe_jsonj.py don't take arguments)
+CATEGORIES_CSV = 'output/discovered_categories.csv'
+RAW_JSONL = 'output/woolworths_products_nutrition.jsonl'
+RAW_CSV = 'output/woolworths_products_nutrition.csv'
+UNIQUE_JSONL = 'output/unique_products_with_categories.jsonl'
+MAPPING_CSV = 'output/category_stockcode_mapping.csv'
+STOCKCODES_CSV = 'output/unique_stockcodes_for_rescraping.csv'
+HISTORY_MANIFEST = 'output/history/manifest.json'
+
+# Files in a dataset version
+PRODUCTS_JSON = 'products.json'
+CATEGORY_MAPPING_CSV = 'category_stockcode_mapping.csv'
+CATEGORY_MAPPING_JSON = 'product_to_categories_mapping.json'
+BUNDLES = 'bundles'
+PRODUCTS_TEXT = 'products.text.jsonl'  # TextStore for PRODUCTS_JSON (column_store.TEXT_STORE_SUFFIX)
+
+
+# --- Stage functions (run in worker processes) ---
+def run_scrape(inputs, outputs, previous):
+    # bigparallel.py asks before overwriting; with its outputs gone it doesn't need to
+    for path in (RAW_CSV, RAW_JSONL):
+        if os.path.exists(path):
+            os.remove(path)
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'bigparallel.py'), '--scrape-from-file'], stdin=subprocess.DEVNULL, check=True)
+    if not os.path.exists(RAW_JSONL):
+        raise RuntimeError(f"bigparallel.py produced no {RAW_JSONL}")
+
+
+def run_dedupe(inputs, outputs, previous):
+    # History is its own stage here, so dedupe doesn't ingest it as well
+    started = time.time()
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'dedupe_jsonj.py')], env=dict(os.environ, WOOLIES_RECORD_HISTORY='0'), check=True)
+    stale = [path for path in outputs if not os.path.exists(path) or os.path.getmtime(path) < started - 1]
+    if stale:  # dedupe_jsonj.py logs its errors rather than exiting non-zero
+        raise RuntimeError(f"dedupe_jsonj.py did not write {', '.join(stale)}")
+
+
+def run_history(inputs, outputs, previous):
+    from history_store import from_day, ingest_snapshot, read_products, to_day
+    # The scrape's date is when its JSONL was written, as in dedupe_jsonj.py. If history already has a
+    # later day (a partial snapshot from rescrape.py), the input is the merged file as of its own date.
+    snapshot_date = datetime.date.fromtimestamp(os.path.getmtime(RAW_JSONL))
+    if os.path.exists(HISTORY_MANIFEST):
+        with open(HISTORY_MANIFEST, encoding='utf-8') as f:
+            last_day = json.load(f).get('last_day')
+        if last_day is not None and to_day(snapshot_date) < last_day:
+            snapshot_date = datetime.date.fromtimestamp(os.path.getmtime(UNIQUE_JSONL))
+            logging.info(f"History already has {from_day(last_day)}; recording {UNIQUE_JSONL} as of {snapshot_date}.")
+    ingest_snapshot(read_products(UNIQUE_JSONL), snapshot_date)
+
+
+def run_convert(inputs, outputs, previous):
+    from convert_csv_to_json import convert
+    convert(UNIQUE_JSONL, outputs[0])
+
+
+def run_mapping(inputs, outputs, previous):
+    """Stockcode -> category list (for build_bundles.py and main.js) plus the mapping CSV app.py reads."""
+    mapping = {}
+    with open(UNIQUE_JSONL, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                product = json.loads(line)
+                mapping[str(product.get('Stockcode'))] = product.get('All_Categories_Info') or []
+    with open(outputs[0], 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, ensure_ascii=False, separators=(',', ':'))
+    shutil.copyfile(MAPPING_CSV, outputs[1])
+
+
+def run_text_store(inputs, outputs, previous):
+    """Heavy per-product text columns that app.py reads from disk on demand."""
+    from column_store import build_text_store
+    build_text_store(inputs[0], outputs[0])
+
+
+def run_bundles(inputs, outputs, previous):
+    from build_bundles import build_bundles
+    reuse_dir = os.path.join(previous, BUNDLES) if previous else None
+    build_bundles(inputs[0], inputs[1], outputs[0], reuse_dir=reuse_dir)
+
+
+class Stage:
+    def __init__(self, name, inputs, outputs, run, on_request=False):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.on_request = on_request  # Only runs when asked for (--scrape)
+
+    @property
+    def versioned(self):
+        return any(path.startswith(DATASET) for path in self.outputs)
+
+
+STAGES = [
+    Stage('scrape', [CATEGORIES_CSV], [RAW_JSONL], run_scrape, on_request=True),
+    Stage('dedupe', [RAW_JSONL], [UNIQUE_JSONL, MAPPING_CSV, STOCKCODES_CSV], run_dedupe),
+    Stage('history', [UNIQUE_JSONL], [HISTORY_MANIFEST], run_history),
+    Stage('convert', [UNIQUE_JSONL], [f'{DATASET}/{PRODUCTS_JSON}'], run_convert),
+    Stage('mapping', [UNIQUE_JSONL, MAPPING_CSV], [f'{DATASET}/{CATEGORY_MAPPING_JSON}', f'{DATASET}/{CATEGORY_MAPPING_CSV}'], run_mapping),
+    Stage('bundles', [f'{DATASET}/{PRODUCTS_JSON}', f'{DATASET}/{CATEGORY_MAPPING_JSON}'], [f'{DATASET}/{BUNDLES}'], run_bundles),
+    Stage('text_store', [f'{DATASET}/{PRODUCTS_JSON}'], [f'{DATASET}/{PRODUCTS_TEXT}'], run_text_store),
+]
+
+
+# --- State and hashing ---
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'stages': {}, 'files': {}}
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def file_hash(path, cache):
+    """SHA-256 of a file (or of a directory's file names and hashes), cached in `cache` by (size, mtime)."""
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(path)):
+            digest.update(f"{name}={file_hash(os.path.join(path, name), cache)}\n".encode('utf-8'))
+        return digest.hexdigest()
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    hit = cache.get(key)
+    if hit and hit[0] == stat.st_size and hit[1] == stat.st_mtime_ns:
+        return hit[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    cache[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def resolve(path, dataset_dir):
+    return path.replace(DATASET, dataset_dir) if path.startswith(DATASET) else path
+
+
+def link_tree(source, destination):
+    """Hard-links (or copies) a file or directory tree from a previous version into the staging directory."""
+    from build_bundles import link_or_copy
+    if os.path.isdir(source):
+        shutil.copytree(source, destination, copy_function=link_or_copy)
+    else:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        link_or_copy(source, destination)
+
+
+# --- Datasets ---
+def current_dataset_dir(datasets_dir=DATASETS_DIR):
+    """Directory of the dataset version CURRENT points at, or None if nothing has been published."""
+    try:
+        with open(os.path.join(datasets_dir, CURRENT_POINTER), encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(datasets_dir, version)
+    return path if version and os.path.isdir(path) else None
+
+
+def publish(staging, datasets_dir, info):
+    """Renames the staging directory to a new version and points CURRENT at it. Returns the version."""
+    version = f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{info['content_hash'][:8]}"
+    with open(os.path.join(staging, DATASET_INFO), 'w', encoding='utf-8') as f:
+        json.dump(dict(info, version=version), f, indent=2, sort_keys=True)
+    os.rename(staging, os.path.join(datasets_dir, version))
+    pointer = os.path.join(datasets_dir, CURRENT_POINTER)
+    with open(f"{pointer}.tmp", 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(f"{pointer}.tmp", pointer)
+
+    versions = sorted(name for name in os.listdir(datasets_dir)
+                      if os.path.isfile(os.path.join(datasets_dir, name, DATASET_INFO)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(datasets_dir, old), ignore_errors=True)
+    return version
+
+
+# --- Runner ---
+def plan(stages):
+    """Maps each stage name to the names of the stages producing its inputs."""
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages}
+
+
+def run_pipeline(stages, jobs=4, force=(), datasets_dir=DATASETS_DIR, state_path=STATE_FILE):
+    """Runs the out-of-date stages in dependency order. Returns (stages run, stages failed, published version or None)."""
+    state = load_state(state_path)
+    previous = current_dataset_dir(datasets_dir)
+    os.makedirs(datasets_dir, exist_ok=True)
+    staging = os.path.join(datasets_dir, f".staging-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    deps = plan(stages)
+    pending = {stage.name: stage for stage in stages}
+    done, failed, ran = set(), set(), set()
+    running = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                stage = pending[name]
+                if deps[name] & failed:
+                    logging.warning(f"Stage {name}: skipped, an upstream stage failed.")
+                    failed.add(name); del pending[name]
+                    continue
+                if not deps[name] <= done:
+                    continue
+                del pending[name]
+                inputs = [resolve(path, staging) for path in stage.inputs]
+                outputs = [resolve(path, staging) for path in stage.outputs]
+                missing = [path for path in inputs if not os.path.exists(path)]
+                if missing:
+                    logging.error(f"Stage {name}: missing input {', '.join(missing)}.")
+                    failed.add(name)
+                    continue
+                hashes = {template: file_hash(path, state['files']) for template, path in zip(stage.inputs, inputs)}
+                record = state['stages'].get(name)
+                previous_outputs = [resolve(path, previous) if previous else None for path in stage.outputs]
+                outputs_exist = all(p and os.path.exists(p) for p in (previous_outputs if stage.versioned else outputs))
+                if name not in force and record and record['inputs'] == hashes and outputs_exist:
+                    if stage.versioned:
+                        for source, destination in zip(previous_outputs, outputs):
+                            link_tree(source, destination)
+                    logging.info(f"Stage {name}: up to date.")
+                    done.add(name)
+                    continue
+                for path in outputs:
+                    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                logging.info(f"Stage {name}: running.")
+                running[pool.submit(stage.run, inputs, outputs, previous)] = (stage, hashes, time.perf_counter())
+
+            if not running:
+                continue
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                stage, hashes, started = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Stage {stage.name}: failed after {time.perf_counter() - started:.1f}s: {e}")
+                    failed.add(stage.name)
+                    continue
+                state['stages'][stage.name] = {'inputs': hashes, 'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+                                               'seconds': round(time.perf_counter() - started, 3)}
+                save_state(state, state_path)
+                logging.info(f"Stage {stage.name}: done in {time.perf_counter() - started:.1f}s.")
+                done.add(stage.name)
+                ran.add(stage.name)
+    save_state(state, state_path)
+
+    versioned = [stage for stage in stages if stage.versioned]
+    version = None
+    if any(stage.name in failed for stage in versioned):
+        logging.error("Dataset not published: a dataset stage failed.")
+    elif previous is None or any(stage.name in ran for stage in versioned):
+        content = hashlib.sha256()
+        files = {}
+        for stage in versioned:
+            for template in stage.outputs:
+                files[template.replace(f'{DATASET}/', '')] = file_hash(resolve(template, staging), {})
+        for name in sorted(files):
+            content.update(f"{name}={files[name]}\n".encode('utf-8'))
+        version = publish(staging, datasets_dir, {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'), 'content_hash': content.hexdigest(),
+            'files': files, 'stages_run': sorted(ran), 'previous': os.path.basename(previous) if previous else None,
+        })
+        logging.info(f"Published dataset {version} ({DATASETS_DIR}/{CURRENT_POINTER}).")
+    else:
+        logging.info("Dataset unchanged; nothing published.")
+    shutil.rmtree(staging, ignore_errors=True)
+    return ran, failed, version
+
+
+def show_status(stages, state_path=STATE_FILE, datasets_dir=DATASETS_DIR):
+    state = load_state(state_path)
+    current = current_dataset_dir(datasets_dir)
+    print(f"Current dataset: {current or 'none'}")
+    for stage in stages:
+        record = state['stages'].get(stage.name)
+        last_run = f"{record['finished']} ({record['seconds']}s)" if record else 'never'
+        print(f"  {stage.name:<8} last run: {last_run}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the scrape -> dedupe -> convert -> index pipeline incrementally.")
+    parser.add_argument('--scrape', action='store_true', help="Run the scrape stage (bigparallel.py) first.")
+    parser.add_argument('--force', nargs='*', default=[], metavar='STAGE', help="Rerun these stages even if their inputs are unchanged.")
+    parser.add_argument('--jobs', type=int, default=4, help="Stages run in parallel (default: 4).")
+    parser.add_argument('--status', action='store_true', help="Show the current dataset and when each stage last ran.")
+    args = parser.parse_args()
+
+    stages = [stage for stage in STAGES if args.scrape or not stage.on_request]
+    unknown = set(args.force) - {stage.name for stage in stages}
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+    if args.status:
+        show_status(stages)
+    else:
+        force = set(args.force) | ({'scrape'} if args.scrape else set())
+        ran, failed, version = run_pipeline(stages, args.jobs, force)
+        logging.info(f"Pipeline finished: ran {sorted(ran) or 'nothing'}, failed {sorted(failed) or 'nothing'}"
+                     f"{f', published {version}' if version else ''}.")
+        if failed:
+            sys.exit(1)
+
+# --- END OF FILE pipeline.py ---
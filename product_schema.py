@@ -0,0 +1,74 @@
+# --- product_schema.py ---
+# Shared description of the scraped product columns: their preferred order in output files
+# and which of them hold numbers. Used by the scraper's writers and by the converters.
+
+import re
+
+# Preferred column order for product CSV output (extra columns are appended after these)
+DESIRED_COLUMNS = [
+    'Stockcode', 'ProductName', 'Brand', 'Price', 'CupString', 'PackageSize', 'ProductURL',
+    'ScrapedCategoryID', 'ScrapedCategoryName', 'ScrapedCategoryParentID', 'ScrapedCategoryLevel',
+    'Ingredients', 'AllergyStatement', 'AllergenMayBePresent', 'LifestyleClaim',
+    'LifestyleAndDietaryStatement', 'HealthStarRating', 'ContainsGluten', 'ContainsNuts',
+    'Nutr_ServingSize', 'Nutr_ServingsPerPack', 'Nutr_Energy_kJ_per_100g', 'Nutr_Energy_kJ_per_Serve',
+    'Nutr_Protein_g_per_100g', 'Nutr_Protein_g_per_Serve', 'Nutr_Fat_Total_g_per_100g', 'Nutr_Fat_Total_g_per_Serve',
+    'Nutr_Fat_Saturated_g_per_100g', 'Nutr_Fat_Saturated_g_per_Serve', 'Nutr_Carbohydrate_g_per_100g',
+    'Nutr_Carbohydrate_g_per_Serve', 'Nutr_Sugars_g_per_100g', 'Nutr_Sugars_g_per_Serve',
+    'Nutr_Sodium_mg_per_100g', 'Nutr_Sodium_mg_per_Serve', 'Nutr_Calcium_mg_per_100g', 'Nutr_Calcium_mg_per_Serve',
+    'Nutr_Dietary_Fibre_g_per_100g', 'Nutr_Dietary_Fibre_g_per_Serve'
+]
+
+# Numeric columns: fixed ones plus every per-100g / per-serve nutrition quantity
+NUMERIC_COLUMNS = {'Price', 'HealthStarRating', 'Nutr_ServingsPerPack'}
+NUMERIC_COLUMN_PATTERN = re.compile(r'^Nutr_.*_per_(100g|Serve)$')
+
+# First number in strings like '12.5g', '< 1g', 'LESS THAN 0.5'
+_NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?|-?\.\d+')
+
+
+def is_numeric_column(name):
+    return name in NUMERIC_COLUMNS or bool(NUMERIC_COLUMN_PATTERN.match(name))
+
+
+def to_number(value):
+    """Parses the first number out of a scraped value. Returns None if there isn't one."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else value  # NaN -> None
+    match = _NUMBER_PATTERN.search(str(value).replace(',', ''))
+    if not match:
+        return None
+    number = float(match.group())
+    return int(number) if number.is_integer() and '.' not in match.group() else number
+
+
+def type_row(row):
+    """Returns a copy of row with numeric columns converted and empty/unparseable values dropped."""
+    typed = {}
+    for key, value in row.items():
+        if value is None or value == '':
+            continue
+        if is_numeric_column(key):
+            value = to_number(value)
+            if value is None:
+                continue
+        typed[key] = value
+    return typed
+
+
+def package_grams(package_size):
+    """Grams (or ml, taking density as 1) in a PackageSize string like '500g', '1.25kg' or '2L'. None if unknown."""
+    if not isinstance(package_size, str):
+        return None
+    size = package_size.lower().replace(' ', '')
+    match = _NUMBER_PATTERN.search(size)
+    if not match:
+        return None
+    number = float(match.group())
+    unit = size[match.end():]
+    if unit.startswith('kg') or unit.startswith('l'):
+        return number * 1000
+    if unit.startswith('g') or unit.startswith('ml'):
+        return number
+    return None
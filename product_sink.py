@@ -0,0 +1,92 @@
+# --- START OF FILE product_sink.py ---
+
+# Streaming writer for scraped products: the same CSV + JSONL pair bigparallel.py writes, but rows are
+# typed (product_schema.type_row), buffered and appended as they arrive, so a scraper never holds
+# the whole catalogue and a crash loses at most the unflushed buffer.
+#
+# The CSV header is DESIRED_COLUMNS plus the extra columns seen by the first flush (sorted, as in
+# bigparallel.py). Nutrition columns vary between products, so if later rows bring new columns the
+# CSV is rebuilt from the JSONL on close() (streamed, one row at a time); until then those values
+# are only in the JSONL.
+
+import csv
+import json
+import logging
+import os
+
+from product_schema import DESIRED_COLUMNS, type_row
+
+FLUSH_ROWS = 1000
+
+
+class ProductSink:
+    """Buffered, typed CSV + JSONL product writer. Use as a context manager so the buffer is flushed on errors."""
+    def __init__(self, csv_path, jsonl_path, flush_rows=FLUSH_ROWS):
+        self.csv_path = csv_path
+        self.jsonl_path = jsonl_path
+        self.flush_rows = max(1, flush_rows)
+        self.buffer = []
+        self.rows_written = 0
+        self.header = None
+        self.columns = set()
+        self.csv_file = open(csv_path, 'w', newline='', encoding='utf-8')
+        self.jsonl_file = open(jsonl_path, 'w', encoding='utf-8')
+        self.csv_writer = None
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.buffer.append(type_row(row))
+            if len(self.buffer) >= self.flush_rows:
+                self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.header is None:
+            first = set().union(*self.buffer)
+            self.header = DESIRED_COLUMNS + sorted(first - set(DESIRED_COLUMNS))
+            self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=self.header, extrasaction='ignore')
+            self.csv_writer.writeheader()
+        for row in self.buffer:
+            self.columns.update(row)
+            self.csv_writer.writerow(row)
+            self.jsonl_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        for f in (self.csv_file, self.jsonl_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """Flushes, closes both files and rebuilds the CSV if columns appeared after its header was written."""
+        try:
+            self.flush()
+        finally:
+            self.csv_file.close()
+            self.jsonl_file.close()
+        missing = self.columns - set(self.header or ())
+        if missing:
+            logging.info(f"{len(missing)} columns appeared after the CSV header was written; rebuilding {self.csv_path} from {self.jsonl_path}.")
+            rebuild_csv(self.jsonl_path, self.csv_path, self.columns)
+        logging.info(f"Wrote {self.rows_written} products to {self.csv_path} and {self.jsonl_path}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rebuild_csv(jsonl_path, csv_path, columns):
+    """Rewrites csv_path from jsonl_path with DESIRED_COLUMNS + sorted extras, replacing it atomically."""
+    header = DESIRED_COLUMNS + sorted(set(columns) - set(DESIRED_COLUMNS))
+    temp_path = f"{csv_path}.tmp"
+    with open(jsonl_path, encoding='utf-8') as source, open(temp_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=header)
+        writer.writeheader()
+        for line in source:
+            if line.strip():
+                writer.writerow(json.loads(line))
+    os.replace(temp_path, csv_path)
+
+# --- END OF FILE product_sink.py ---
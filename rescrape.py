@@ -0,0 +1,241 @@
+# --- START OF FILE rescrape.py ---
+
+# Targeted re-scrape: fetches individual products from the product detail endpoint and merges the
+# fresh values back into the unique products file written by dedupe_jsonj.py, without a full crawl.
+#
+#   python rescrape.py --missing-nutrition        # products with no Nutr_* values
+#   python rescrape.py --stale-days 14            # products whose price hasn't been checked in 14 days
+#   python rescrape.py --stockcodes 123,456       # explicit list
+#   python rescrape.py --resume                   # continue an interrupted run
+#   python rescrape.py --merge-only               # just merge an existing results file
+#
+# Candidates come from unique_stockcodes_for_rescraping.csv (or --stockcodes); the filters are OR'ed,
+# and with none given every listed stockcode is re-scraped (each once: the list is deduplicated).
+# Stockcodes are fetched on a thread pool sharing one pooled Transport, at far higher concurrency
+# than the category crawl since each request is a single small GET. A bounded window of requests is
+# kept in flight, refilled as each one finishes, so one slow request never holds up the others.
+# Results are appended to RESULTS_JSONL as they arrive and fsynced every BATCH_SIZE results, so an
+# interrupted run keeps what it fetched; the merge then rewrites the unique products file
+# atomically. Merged rows keep their category fields (All_Categories_Info etc.) and any value the
+# detail response didn't include, and get PriceCheckedDate, which --stale-days uses next time.
+# Rows without it count as checked on the date of the last full scrape.
+#
+# After a merge, rerun convert_csv_to_json.py (history ingest is done here for the re-scraped products).
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import itertools
+import json
+import logging
+import os
+import time
+
+import requests
+
+import bigparallel  # Also sets up logging (console + scraper.log)
+from history_store import ingest_snapshot
+from transport import make_transport
+
+UNIQUE_PRODUCTS_JSONL = 'output/unique_products_with_categories.jsonl'
+UNIQUE_STOCKCODES_CSV = 'output/unique_stockcodes_for_rescraping.csv'
+RESULTS_JSONL = 'output/rescrape_results.jsonl'
+DETAIL_API_URL = f"{bigparallel.BASE_URL}/apis/ui/product/detail"
+
+CONCURRENCY = 32
+BATCH_SIZE = 500  # Results between fsyncs and progress logs
+MAX_RETRIES = 3
+RETRY_DELAY_SECONDS = 2.0
+CHECKED_FIELD = 'PriceCheckedDate'
+RECORD_HISTORY = os.environ.get('WOOLIES_RECORD_HISTORY', '1') != '0'
+
+
+# --- Selection ---
+def read_stockcodes(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['Stockcode'].strip() for row in csv.DictReader(f) if (row.get('Stockcode') or '').strip()]
+
+
+def read_products(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def has_nutrition(product):
+    return any(key.startswith('Nutr_') and value is not None for key, value in product.items())
+
+
+def last_full_scrape_date():
+    """Date of the last full scrape (its JSONL's mtime, as dedupe_jsonj.py uses), or None."""
+    for path in (bigparallel.FINAL_OUTPUT_JSONL, UNIQUE_PRODUCTS_JSONL):
+        if os.path.exists(path):
+            return datetime.date.fromtimestamp(os.path.getmtime(path))
+    return None
+
+
+def select_stockcodes(candidates, products_path, missing_nutrition=False, stale_days=None, today=None):
+    """The candidates (in order, deduplicated) matching any of the filters; all of them if no filter is set."""
+    candidates = list(dict.fromkeys(candidates))
+    if not missing_nutrition and stale_days is None:
+        return candidates
+    today = today or datetime.date.today()
+    scrape_date = last_full_scrape_date() or today
+    wanted = set(candidates)
+    selected = set()
+    for product in read_products(products_path):
+        code = str(product.get('Stockcode'))
+        if code not in wanted:
+            continue
+        if missing_nutrition and not has_nutrition(product):
+            selected.add(code)
+        elif stale_days is not None:
+            checked = product.get(CHECKED_FIELD)
+            checked = datetime.date.fromisoformat(checked) if checked else scrape_date
+            if (today - checked).days >= stale_days:
+                selected.add(code)
+    return [code for code in candidates if code in selected]
+
+
+# --- Fetching ---
+def fetch_product(session, stockcode):
+    """('ok', product row) | ('not_found', None) | ('failed', None) for one stockcode, with retries."""
+    url = f"{DETAIL_API_URL}/{stockcode}"
+    headers = {'Accept': bigparallel.SPECIFIC_POST_HEADERS['Accept']}
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            response = bigparallel.timed_request(session, 'GET', 'detail', url, headers=headers,
+                                                 timeout=bigparallel.GET_TIMEOUT_SECONDS)
+            if response.status_code == 404:
+                return 'not_found', None
+            response.raise_for_status()
+            data = response.json()
+            product = dict(data.get('Product') or {})
+            if not product.get('AdditionalAttributes') and data.get('AdditionalAttributes'):
+                product['AdditionalAttributes'] = data['AdditionalAttributes']
+            if not product.get('Stockcode'):
+                return 'not_found', None
+            return 'ok', bigparallel.build_product_row(product)
+        except requests.exceptions.Timeout:
+            reason = 'timeout'
+        except ValueError as e:  # JSON decode error
+            logging.error(f"Stockcode {stockcode}: bad detail response: {e}")
+            return 'failed', None
+        except requests.exceptions.RequestException as e:
+            reason = e.response.status_code if getattr(e, 'response', None) is not None else 'error'
+        if attempt < MAX_RETRIES:
+            bigparallel.RETRIES.labels(reason).inc()
+            time.sleep(RETRY_DELAY_SECONDS * attempt)
+    logging.warning(f"Stockcode {stockcode}: giving up after {MAX_RETRIES} attempts ({reason}).")
+    return 'failed', None
+
+
+def rescrape(stockcodes, results_path, concurrency=CONCURRENCY, batch_size=BATCH_SIZE, today=None):
+    """Fetches stockcodes with up to 2 x concurrency requests queued or in flight, appending each row to
+    results_path as it arrives (fsynced every batch_size results). Returns status counts."""
+    checked = (today or datetime.date.today()).isoformat()
+    counts = {'ok': 0, 'not_found': 0, 'failed': 0}
+    session = make_transport(bigparallel.SESSION_HEADERS, pool_size=concurrency)
+    try:
+        try:
+            session.warm_up(bigparallel.BASE_URL, bigparallel.GET_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.warning(f"Initial GET failed: {e}. Proceeding anyway.")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='Rescrape') as executor, \
+                open(results_path, 'a', encoding='utf-8') as out:
+            pending = iter(stockcodes)
+            window = 2 * concurrency  # Keeps every worker busy without queueing the whole list
+            in_flight = {executor.submit(fetch_product, session, code) for code in itertools.islice(pending, window)}
+            started = time.time()
+            done = 0
+            while in_flight:
+                finished, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    status, row = future.result()
+                    counts[status] += 1
+                    if row is not None:
+                        row[CHECKED_FIELD] = checked
+                        out.write(json.dumps(row, ensure_ascii=False) + '\n')
+                        bigparallel.PRODUCTS.inc()
+                    done += 1
+                    if done % batch_size == 0 or done == len(stockcodes):
+                        out.flush(); os.fsync(out.fileno())
+                        logging.info(f"Re-scraped {done}/{len(stockcodes)} stockcodes ({done / max(time.time() - started, 1e-9):.1f}/s): {counts}")
+                in_flight |= {executor.submit(fetch_product, session, code) for code in itertools.islice(pending, len(finished))}
+            out.flush(); os.fsync(out.fileno())
+    finally:
+        session.close()
+    return counts
+
+
+# --- Merge ---
+def merge_results(results_path, products_path, record_history=RECORD_HISTORY, today=None):
+    """Merges re-scraped rows into products_path in place (atomic replace). Returns rows updated."""
+    if not os.path.exists(results_path):
+        logging.warning(f"No results file {results_path}; nothing to merge.")
+        return 0
+    fresh = {}
+    for row in read_products(results_path):
+        fresh[str(row['Stockcode'])] = row  # Later lines (e.g. from --resume runs) win
+    if not fresh:
+        logging.info("No re-scraped products to merge.")
+        return 0
+
+    updated = 0
+    temp_path = f"{products_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as out:
+        for product in read_products(products_path):
+            row = fresh.get(str(product.get('Stockcode')))
+            if row is not None:
+                # Keep category fields and anything the detail response didn't have
+                product.update({k: v for k, v in row.items() if v is not None and not k.startswith('ScrapedCategory')})
+                updated += 1
+            out.write(json.dumps(product, ensure_ascii=False) + '\n')
+        out.flush(); os.fsync(out.fileno())
+    os.replace(temp_path, products_path)
+    logging.info(f"Merged {updated} re-scraped products into {products_path} ({len(fresh) - updated} not in the file).")
+
+    if record_history:
+        try:
+            ingest_snapshot(fresh.values(), today or datetime.date.today(), mark_missing=False)
+        except Exception as e:
+            logging.error(f"Failed to record history for re-scraped products: {e}", exc_info=True)
+    return updated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-scrape selected products and merge them into the unique products file.")
+    parser.add_argument('--stockcodes', help="Comma-separated stockcodes (default: every stockcode in --stockcodes-csv).")
+    parser.add_argument('--stockcodes-csv', default=UNIQUE_STOCKCODES_CSV)
+    parser.add_argument('--products', default=UNIQUE_PRODUCTS_JSONL, help="Unique products JSONL to select from and merge into.")
+    parser.add_argument('--results', default=RESULTS_JSONL)
+    parser.add_argument('--missing-nutrition', action='store_true', help="Select products with no Nutr_* values.")
+    parser.add_argument('--stale-days', type=int, help="Select products whose price was last checked at least this many days ago.")
+    parser.add_argument('--limit', type=int, help="Re-scrape at most this many stockcodes.")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--resume', action='store_true', help="Keep --results and skip stockcodes already in it.")
+    parser.add_argument('--merge-only', action='store_true', help="Skip fetching; merge the existing --results file.")
+    parser.add_argument('--no-merge', action='store_true', help="Fetch only; leave --products untouched.")
+    args = parser.parse_args()
+
+    if not args.merge_only:
+        candidates = [c.strip() for c in args.stockcodes.split(',') if c.strip()] if args.stockcodes else read_stockcodes(args.stockcodes_csv)
+        stockcodes = select_stockcodes(candidates, args.products, args.missing_nutrition, args.stale_days)
+        if args.resume and os.path.exists(args.results):
+            done = {str(row['Stockcode']) for row in read_products(args.results)}
+            stockcodes = [code for code in stockcodes if code not in done]
+        elif os.path.exists(args.results):
+            os.remove(args.results)
+        if args.limit is not None:
+            stockcodes = stockcodes[:args.limit]
+        logging.info(f"Re-scraping {len(stockcodes)} of {len(candidates)} candidate stockcodes.")
+        counts = rescrape(stockcodes, args.results, args.concurrency, args.batch_size)
+        logging.info(f"Re-scrape finished: {counts}")
+        bigparallel.METRICS.log_summary()
+    if not args.no_merge:
+        merge_results(args.results, args.products)
+
+# --- END OF FILE rescrape.py ---
@@ -6,6 +6,9 @@ import pandas as pd
 import os
 import argparse # Import argparse for command-line arguments
 
+from product_sink import ProductSink
+from transport import make_transport
+
 # --- Basic Logging Setup ---
 # (Keep the existing logging setup)
 logging.basicConfig(
@@ -19,8 +22,10 @@ logging.basicConfig(
 
 # --- Constants ---
 # (Keep existing constants: CATEGORY_API_URL, PRODUCT_API_URL, HEADERS_GET, HEADERS_POST, PAGE_SIZE, REQUEST_DELAY_SECONDS)
-CATEGORY_API_URL = "https://www.woolworths.com.au/apis/ui/PiesCategoriesWithSpecials"
-PRODUCT_API_URL = "https://www.woolworths.com.au/apis/ui/browse/category"
+# WOOLIES_BASE_URL points the scraper at another host, e.g. the offline mock in bench/
+BASE_URL = os.environ.get('WOOLIES_BASE_URL', "https://www.woolworths.com.au").rstrip('/')
+CATEGORY_API_URL = f"{BASE_URL}/apis/ui/PiesCategoriesWithSpecials"
+PRODUCT_API_URL = f"{BASE_URL}/apis/ui/browse/category"
 HEADERS_GET = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36',
     'Accept': 'application/json, text/plain, */*'
@@ -32,9 +37,13 @@ HEADERS_POST = {
     'Origin': 'https://www.woolworths.com.au',
 }
 PAGE_SIZE = 36
-REQUEST_DELAY_SECONDS = 3
+REQUEST_DELAY_SECONDS = float(os.environ.get('WOOLIES_REQUEST_DELAY', 3))
 DISCOVERED_CATEGORIES_CSV = 'output/discovered_categories.csv' # Filename for category list
 FINAL_OUTPUT_CSV = 'output/woolworths_products_nutrition.csv' # Filename for final product data
+FINAL_OUTPUT_JSONL = 'output/woolworths_products_nutrition.jsonl'
+
+# Keep-alive connection pool for every request (headers are passed per request, as before)
+transport = make_transport(pool_size=1)
 
 # --- Category Discovery Functions (extract_recursive, get_categories) ---
 # (Keep the existing functions exactly as they were)
@@ -66,7 +75,7 @@ def get_categories():
     all_categories = []
     logging.info(f"Attempting to fetch category structure from {CATEGORY_API_URL}...")
     try:
-        response = requests.get(CATEGORY_API_URL, headers=HEADERS_GET, timeout=30)
+        response = transport.get(CATEGORY_API_URL, headers=HEADERS_GET, timeout=30)
         response.raise_for_status()
         logging.info(f"Successfully received category data (Status: {response.status_code}).")
         data = response.json()
@@ -172,7 +181,7 @@ def scrape_products_for_category(category_info):
             }
 
             try:
-                response = requests.post(PRODUCT_API_URL, headers=HEADERS_POST, json=payload, timeout=45)
+                response = transport.post(PRODUCT_API_URL, headers=HEADERS_POST, json=payload, timeout=45)
 
                 if response.status_code in [500, 502, 503, 504]:
                     logging.warning(f"Server error ({response.status_code}) on page {page_number} for category {category_id}. Retrying ({retry_count+1}/{max_retries})...")
@@ -315,54 +324,39 @@ if __name__ == "__main__":
             logging.critical(f"Failed to load or parse categories from {DISCOVERED_CATEGORIES_CSV}: {e}")
             exit()
 
+        # --- Warm up the session (cookies from the home page are reused for every request) ---
+        try:
+            transport.warm_up(BASE_URL, timeout=30)
+            logging.info("Initial GET OK. Session active.")
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Initial GET failed: {e}. Proceeding anyway.")
+
         # --- Proceed with Product Scraping ---
-        all_scraped_products = []
+        # Each category's rows are streamed to disk (product_sink.py), so memory stays flat and
+        # a crash keeps everything scraped up to the last flush
+        total_scraped = 0
         total_categories = len(category_list)
         logging.info(f"Beginning product scraping for {total_categories} categories...")
 
-        for i, category in enumerate(category_list):
-            logging.info(f"--- Progress: Processing Category {i+1} / {total_categories} ---")
-            # Ensure category dictionary has 'id' key
-            if 'id' not in category:
-                 logging.warning(f"Skipping category at index {i} due to missing 'id' key in loaded data: {category}")
-                 continue
-            products_from_cat = scrape_products_for_category(category) # Pass the dict directly
-            if products_from_cat:
-                all_scraped_products.extend(products_from_cat)
-                logging.info(f"Finished category '{category.get('name', category['id'])}'. Found {len(products_from_cat)} products. Total products so far: {len(all_scraped_products)}")
-            else:
-                logging.info(f"Finished category '{category.get('name', category['id'])}'. No products found or errors occurred.")
-            # Consider adding incremental saving here if desired
+        with ProductSink(FINAL_OUTPUT_CSV, FINAL_OUTPUT_JSONL) as sink:
+            for i, category in enumerate(category_list):
+                logging.info(f"--- Progress: Processing Category {i+1} / {total_categories} ---")
+                # Ensure category dictionary has 'id' key
+                if 'id' not in category:
+                     logging.warning(f"Skipping category at index {i} due to missing 'id' key in loaded data: {category}")
+                     continue
+                products_from_cat = scrape_products_for_category(category) # Pass the dict directly
+                if products_from_cat:
+                    sink.write_rows(products_from_cat)
+                    total_scraped += len(products_from_cat)
+                    logging.info(f"Finished category '{category.get('name', category['id'])}'. Found {len(products_from_cat)} products. Total products so far: {total_scraped}")
+                else:
+                    logging.info(f"Finished category '{category.get('name', category['id'])}'. No products found or errors occurred.")
 
         logging.info("========== Product Scraping Completed ==========")
-        logging.info(f"Total products scraped across all categories: {len(all_scraped_products)}")
-
-        # --- Phase 5: Data Storage ---
-        if all_scraped_products:
-            logging.info("Preparing data for saving...")
-            try:
-                df = pd.DataFrame(all_scraped_products)
-                desired_columns = [
-                    'Stockcode', 'ProductName', 'Brand', 'Price', 'CupString', 'PackageSize', 'ProductURL',
-                    'ScrapedCategoryID', 'ScrapedCategoryName', 'ScrapedCategoryParentID', 'ScrapedCategoryLevel',
-                    'Nutr_ServingSize', 'Nutr_ServingsPerPack', 'Nutr_Energy_kJ_per_100g', 'Nutr_Energy_kJ_per_Serve',
-                    'Nutr_Protein_g_per_100g', 'Nutr_Protein_g_per_Serve', 'Nutr_Fat_Total_g_per_100g', 'Nutr_Fat_Total_g_per_Serve',
-                    'Nutr_Fat_Saturated_g_per_100g', 'Nutr_Fat_Saturated_g_per_Serve', 'Nutr_Carbohydrate_g_per_100g',
-                    'Nutr_Carbohydrate_g_per_Serve', 'Nutr_Sugars_g_per_100g', 'Nutr_Sugars_g_per_Serve',
-                    'Nutr_Sodium_mg_per_100g', 'Nutr_Sodium_mg_per_Serve', 'Nutr_Calcium_mg_per_100g', 'Nutr_Calcium_mg_per_Serve',
-                    'Nutr_Dietary_Fibre_g_per_100g', 'Nutr_Dietary_Fibre_g_per_Serve' # Add other common ones if expected
-                ]
-                all_found_columns = df.columns.tolist()
-                final_column_order = desired_columns + [col for col in all_found_columns if col not in desired_columns]
-                df = df.reindex(columns=final_column_order)
-
-                df.to_csv(FINAL_OUTPUT_CSV, index=False, encoding='utf-8')
-                logging.info(f"Successfully saved all data to {FINAL_OUTPUT_CSV}")
-
-            except Exception as e:
-                logging.error(f"Failed to process DataFrame or save to CSV: {e}")
-        else:
-            logging.warning("No products were scraped. CSV file not created.")
+        logging.info(f"Total products scraped across all categories: {total_scraped}")
+        if not total_scraped:
+            logging.warning("No products were scraped.")
 
         logging.info("========== Scrape From File Mode Finished ==========")
 
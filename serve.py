@@ -0,0 +1,242 @@
+# --- serve.py ---
+# Production serving for app.py: several worker processes sharing one loaded dataset.
+#
+#   python serve.py --workers 4 --bind 0.0.0.0:5001
+#   gunicorn serve:application --preload -w 4 -k gthread --threads 8   # same, configured by hand
+#   gunicorn serve:asgi_app --preload -w 4 -k uvicorn.workers.UvicornWorker   # ASGI (needs asgiref)
+#
+#   - The dataset is loaded once, when this module imports app.py, in the parent process. gc.freeze()
+#     then moves every object into the permanent generation, so the cyclic GC in the workers never
+#     writes to (and so copies) their pages, and the workers are forked: the product table, column
+#     store and indexes are shared copy-on-write rather than loaded N times. The TextStore reads
+#     with pread, so its inherited file descriptor is safe to share.
+#   - gunicorn (pip install gunicorn) with preload_app and gthread workers when installed; otherwise
+#     a built-in pre-fork server: the parent binds the socket and forks workers that each run
+#     werkzeug's threaded server on it, restarting any that die.
+#   - Threads in each worker let I/O-bound routes (bundles, product details, streamed responses)
+#     overlap with CPU-bound ones; numpy releases the GIL for much of the rest.
+#   - ConcurrencyLimiter caps the /api/ requests each worker handles at once (WOOLIES_MAX_CONCURRENT);
+#     the rest queue for up to WOOLIES_QUEUE_TIMEOUT seconds, then get 503 + Retry-After. Queue depth,
+#     wait time, in-flight and rejected requests are exported at /metrics (per worker process).
+#   - asgi_app wraps the app for ASGI servers when asgiref is installed; Flask itself stays WSGI, so
+#     handlers run in the server's thread pool.
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from flask import Response
+from werkzeug.serving import make_server
+
+import app as webapp  # Loads the dataset
+from tracing import METRICS
+
+try:
+    from gunicorn.app.base import BaseApplication  # Optional: pip install gunicorn
+except ImportError:
+    BaseApplication = None
+
+try:
+    from asgiref.wsgi import WsgiToAsgi  # Optional: pip install asgiref
+except ImportError:
+    WsgiToAsgi = None
+
+DEFAULT_BIND = os.environ.get('WOOLIES_BIND', '127.0.0.1:5001')
+DEFAULT_WORKERS = int(os.environ.get('WOOLIES_WORKERS', os.cpu_count() or 1))
+DEFAULT_THREADS = int(os.environ.get('WOOLIES_THREADS', 8))
+MAX_CONCURRENT = int(os.environ.get('WOOLIES_MAX_CONCURRENT', 4))  # /api/ requests handled at once, per worker
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('WOOLIES_QUEUE_TIMEOUT', 5.0))
+LIMITED_PREFIXES = ('/api/',)  # Bundles and static files are cheap and never queue
+RETRY_AFTER_SECONDS = 1
+WORKER_TIMEOUT_SECONDS = 60
+RESTART_DELAY_SECONDS = 1.0
+
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+IN_FLIGHT = METRICS.gauge('app_inflight_requests', 'Requests being handled (concurrency-limited routes).')
+QUEUED = METRICS.gauge('app_queued_requests', 'Requests waiting for a concurrency slot.')
+QUEUE_WAIT = METRICS.histogram('app_queue_wait_seconds', 'Time requests waited for a concurrency slot.',
+                               buckets=QUEUE_BUCKETS)
+REJECTED = METRICS.counter('app_rejected_requests_total', 'Requests turned away after waiting QUEUE_TIMEOUT_SECONDS.')
+
+
+# --- Concurrency Limit ---
+class ConcurrencyLimiter:
+    """WSGI middleware letting at most `limit` requests under `prefixes` run at once; the rest wait
+    up to queue_timeout seconds for a slot, then get a 503. A slot is held until the response body
+    has been sent, so streamed responses count until they finish."""
+    def __init__(self, wsgi_app, limit=MAX_CONCURRENT, queue_timeout=QUEUE_TIMEOUT_SECONDS, prefixes=LIMITED_PREFIXES):
+        self.wsgi_app = wsgi_app
+        self.prefixes = prefixes
+        self.configure(limit, queue_timeout)
+
+    def configure(self, limit, queue_timeout):
+        self.limit = max(1, limit)
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(self.limit)
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.prefixes):
+            return self.wsgi_app(environ, start_response)
+        slots = self.slots
+        started = time.perf_counter()
+        with QUEUED.track():
+            acquired = slots.acquire(timeout=self.queue_timeout)
+        QUEUE_WAIT.observe(time.perf_counter() - started)
+        if not acquired:
+            REJECTED.inc()
+            start_response('503 Service Unavailable', [('Content-Type', 'application/json'),
+                                                       ('Retry-After', str(RETRY_AFTER_SECONDS))])
+            return [b'{"error": "Server busy, retry shortly."}']
+        IN_FLIGHT.inc()
+        release = _Release(slots)
+        try:
+            return _ReleasingBody(self.wsgi_app(environ, start_response), release)
+        except BaseException:
+            release()
+            raise
+
+
+class _Release:
+    def __init__(self, slots):
+        self.slots = slots
+        self.done = False
+
+    def __call__(self):
+        if not self.done:
+            self.done = True
+            IN_FLIGHT.dec()
+            self.slots.release()
+
+
+class _ReleasingBody:
+    """Response body that frees its slot when the server closes it (WSGI servers always call close())."""
+    def __init__(self, body, release):
+        self.body = body
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.release()
+
+
+LIMITER = ConcurrencyLimiter(webapp.app.wsgi_app)
+webapp.app.wsgi_app = LIMITER
+if 'metrics' not in webapp.app.view_functions:  # tracing.init_app adds it when tracing is on
+    webapp.app.add_url_rule('/metrics', 'metrics', lambda: Response(METRICS.render(), mimetype='text/plain; version=0.0.4'))
+
+application = webapp.app
+asgi_app = WsgiToAsgi(application) if WsgiToAsgi is not None else None
+
+# Everything loaded so far is shared with the workers; keep the GC from touching it after the fork
+gc.collect()
+gc.freeze()
+
+
+# --- Servers ---
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn with the already-loaded app (preload_app: workers are forked after the load)."""
+        def __init__(self, wsgi_app, options):
+            self.wsgi_app = wsgi_app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.wsgi_app
+
+
+def serve_gunicorn(bind, workers, threads):
+    GunicornServer(application, {'bind': bind, 'workers': workers, 'threads': threads, 'worker_class': 'gthread',
+                                 'preload_app': True, 'timeout': WORKER_TIMEOUT_SECONDS}).run()
+
+
+def run_worker(listener, host, port):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = make_server(host, port, application, threaded=True, fd=listener.fileno())
+    logging.info(f"Worker {os.getpid()} serving.")
+    server.serve_forever()
+
+
+def serve_prefork(bind, workers):
+    """Minimal pre-fork server: bind once, fork `workers` children sharing the socket, restart any that exit."""
+    host, port = parse_bind(bind)
+    listener = socket.create_server((host, port), backlog=2048)
+    listener.set_inheritable(True)
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(listener, host, port)
+            finally:
+                os._exit(1)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logging.info(f"Serving on http://{host}:{port} with {workers} workers (pre-fork; install gunicorn for a managed server).")
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logging.warning(f"Worker {pid} exited (status {status}); restarting.")
+            time.sleep(RESTART_DELAY_SECONDS)
+            spawn()
+    listener.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve app.py with multiple workers sharing one loaded dataset.")
+    parser.add_argument('--bind', default=DEFAULT_BIND, help="host:port")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="Threads per worker (gunicorn only).")
+    parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT, help="/api/ requests handled at once per worker.")
+    parser.add_argument('--queue-timeout', type=float, default=QUEUE_TIMEOUT_SECONDS, help="Seconds a request may wait for a slot.")
+    parser.add_argument('--builtin', action='store_true', help="Use the built-in pre-fork server even if gunicorn is installed.")
+    args = parser.parse_args()
+
+    LIMITER.configure(args.max_concurrent, args.queue_timeout)
+    workers = max(1, args.workers)
+    if BaseApplication is not None and not args.builtin:
+        serve_gunicorn(args.bind, workers, args.threads)
+    else:
+        serve_prefork(args.bind, workers)
@@ -0,0 +1,83 @@
+# --- similarity.py ---
+# Nearest-neighbour index over products' per-100g macro profiles, for "similar products" queries.
+# Features are standardised (z-scores) so grams and milligrams weigh the same. Uses a scipy cKDTree
+# when scipy is installed, otherwise a vectorised numpy scan (fine for tens of thousands of products).
+
+import logging
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree  # Optional: KD-tree queries instead of a full scan
+except ImportError:
+    cKDTree = None
+
+# Macro profile used for similarity: first column name found for each feature
+SIMILARITY_FEATURES = {
+    'protein': ['Nutr_Protein_per_100g'],
+    'fat': ['Nutr_Fat_Total_per_100g', 'Nutr_Fat_per_100g'],
+    'carbohydrate': ['Nutr_Carbohydrate_per_100g'],
+    'sugars': ['Nutr_Sugars_per_100g'],
+    'sodium': ['Nutr_Sodium_per_100g'],
+    'energy': ['Nutr_Energy_kJ_per_100g', 'Nutr_Energy_per_100g'],
+}
+
+
+class NutritionIndex:
+    """KD-tree (or numpy) index over standardised macro vectors of the products that have them all."""
+    def __init__(self, columns):
+        self.features = {}
+        for feature, candidates in SIMILARITY_FEATURES.items():
+            found = next((name for name in candidates if name in columns), None)
+            if found:
+                self.features[feature] = found
+        n = len(next(iter(columns.values()))) if columns else 0
+        if len(self.features) < 2:
+            logging.warning(f"Similarity index needs at least 2 nutrition columns; found {list(self.features.values())}.")
+            self.features = {}
+        raw = np.column_stack([columns[name] for name in self.features.values()]) if self.features else np.empty((n, 0))
+        complete = ~np.isnan(raw).any(axis=1) if self.features else np.zeros(n, dtype=bool)
+        self.rows = np.flatnonzero(complete)               # index position -> product row
+        self.position = np.full(n, -1, dtype=np.int64)    # product row -> index position
+        self.position[self.rows] = np.arange(len(self.rows))
+        vectors = raw[complete]
+        self.mean = vectors.mean(axis=0) if len(vectors) else np.zeros(raw.shape[1])
+        std = vectors.std(axis=0) if len(vectors) else np.ones(raw.shape[1])
+        self.std = np.where(std > 0, std, 1.0)
+        self.vectors = ((vectors - self.mean) / self.std).astype(np.float32)
+        self.tree = cKDTree(self.vectors) if cKDTree is not None and len(self.vectors) else None
+        logging.info(f"Similarity index built over {len(self.rows)} products with {list(self.features)} "
+                     f"({'KD-tree' if self.tree is not None else 'numpy scan'}).")
+
+    def _nearest(self, vector, count):
+        """(distances, index positions) of the `count` nearest vectors, closest first."""
+        count = min(count, len(self.vectors))
+        if self.tree is not None:
+            distances, positions = self.tree.query(vector, k=count)
+            return np.atleast_1d(distances), np.atleast_1d(positions)
+        distances = np.sqrt(((self.vectors - vector) ** 2).sum(axis=1))
+        positions = np.argpartition(distances, count - 1)[:count] if count < len(distances) else np.arange(len(distances))
+        positions = positions[np.lexsort((positions, distances[positions]))]
+        return distances[positions], positions
+
+    def similar(self, row, k, allowed=None):
+        """Up to k (row, distance) pairs most similar to product `row`, excluding itself.
+
+        `allowed` is an optional boolean mask over product rows (category, price or protein filters).
+        Returns None if the product has no complete macro profile.
+        """
+        position = self.position[row] if 0 <= row < len(self.position) else -1
+        if position < 0:
+            return None
+        vector = self.vectors[position]
+        count = k + 1
+        while True:
+            # Ask for more neighbours until k pass the filter or the index is exhausted
+            distances, positions = self._nearest(vector, count)
+            rows = self.rows[positions]
+            keep = rows != row
+            if allowed is not None:
+                keep &= allowed[rows]
+            if keep.sum() >= k or count >= len(self.vectors):
+                return [(int(r), float(d)) for r, d in zip(rows[keep][:k], distances[keep][:k])]
+            count *= 4
@@ -0,0 +1,52 @@
+# top_k against a brute-force sort by (value, row): ties at the cutoff must resolve the same way
+# however deep the ranking, so a leaderboard slice matches a fresh top_k over the same rows.
+# TextStore: a store is only reused for the products and columns it was built from.
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from column_store import TextStore, source_digest, top_k
+
+
+def brute_force(values, rows, k, descending):
+    rows = [int(r) for r in rows if not np.isnan(values[r])]
+    rows.sort(key=lambda r: (-values[r] if descending else values[r], r))
+    return rows[:k]
+
+
+def test_top_k_breaks_ties_at_the_cutoff_by_row():
+    rng = np.random.default_rng(0)
+    # Few distinct values (like Protein = 0 ascending), some NaNs, rows in shuffled order
+    values = rng.integers(0, 4, 500).astype(np.float32)
+    values[rng.choice(500, 40, replace=False)] = np.nan
+    rows = rng.permutation(500)
+    for descending in (True, False):
+        for k in (1, 5, 37, 100, 250, 460, 600):
+            assert top_k(values, rows, k, descending).tolist() == brute_force(values, rows, k, descending)
+
+
+def test_top_k_slice_matches_deeper_ranking():
+    values = np.zeros(1000, dtype=np.float32)
+    values[::7] = 1.0
+    rows = np.arange(1000)[::-1].copy()
+    deep = top_k(values, rows, 300, descending=False)
+    assert top_k(values, rows, 50, descending=False).tolist() == deep[:50].tolist()
+
+
+def test_text_store_is_keyed_on_its_source(tmp_path):
+    records = [{'Ingredients': 'Oats', 'Brand': 'A'}, {'Ingredients': None, 'Brand': 'B'}, {'Ingredients': 'Milk'}]
+    source = source_digest(b'[products v1]')
+    path = str(tmp_path / 'products.text.jsonl')
+    TextStore.build(records, ['Ingredients'], path, source).close()
+
+    store = TextStore.open(path, len(records), source, ['Ingredients'])
+    assert [store.get(row) for row in range(len(records))] == [{'Ingredients': 'Oats'}, {}, {'Ingredients': 'Milk'}]
+    store.close()
+    # Same row count, different products or columns: rebuilt rather than served stale
+    assert TextStore.open(path, len(records), source_digest(b'[products v2]'), ['Ingredients']) is None
+    assert TextStore.open(path, len(records), source, ['Ingredients', 'Brand']) is None
+    assert TextStore.open(path, len(records) + 1, source, ['Ingredients']) is None
@@ -0,0 +1,58 @@
+# Sharded crawl against the offline mock (bench/mock_woolworths.py): a category whose pages keep
+# failing must be released back to the queue and re-leased, never recorded as done with a partial list.
+
+import argparse
+import importlib
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench'))
+
+from mock_woolworths import MockConfig, start_server
+
+
+def test_failed_category_is_released_and_re_leased(tmp_path, monkeypatch):
+    server, state, base_url = start_server(MockConfig(latency_ms=0, jitter_ms=0, rate_5xx=1.0, duplicate_page_rate=0,
+                                                      level1_count=1, level2_per_level1=1))
+    # bigparallel reads these at import (and logs to scraper.log in the working directory)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('WOOLIES_BASE_URL', base_url)
+    monkeypatch.setenv('WOOLIES_REQUEST_DELAY', '0')
+    for name in ('bigparallel', 'crawl_coordinator'):
+        sys.modules.pop(name, None)
+    coordinator = importlib.import_module('crawl_coordinator')
+    bigparallel = coordinator.bigparallel
+
+    leaf = state.leaves[0]
+    category = {'id': leaf['NodeId'], 'name': leaf['Description'], 'parent_id': leaf['ParentNodeId'],
+                'level': leaf['NodeLevel'], 'url_friendly_name': leaf['UrlFriendlyName']}
+    args = argparse.Namespace(db=str(tmp_path / 'queue.sqlite'), parts_dir=str(tmp_path), max_attempts=3)
+    queue = coordinator.WorkQueue(args.db)
+    queue.add_items([(category['id'], category)])
+    keeper = coordinator.LeaseKeeper(args.db, 'test-worker', 60)
+    session = coordinator.make_transport(bigparallel.SESSION_HEADERS, pool_size=1)
+    try:
+        # Every browse request gets a 5xx: the item goes back to pending, with no part recorded
+        row = queue.claim('test-worker', 60, args.max_attempts)
+        coordinator.process_item(args, queue, 'test-worker', session, keeper, row)
+        item = queue.rows()[0]
+        assert item['state'] == 'pending'
+        assert item['attempts'] == 1
+        assert 'Max retries' in item['error']
+        assert item['result_path'] is None
+
+        # Once the server recovers, the item is leased again and completes in full
+        state.config.rate_5xx = 0.0
+        row = queue.claim('test-worker', 60, args.max_attempts)
+        assert row['id'] == category['id']
+        coordinator.process_item(args, queue, 'test-worker', session, keeper, row)
+        item = queue.rows()[0]
+        assert item['state'] == 'done'
+        assert item['attempts'] == 2
+        assert item['product_count'] == len(state.products[leaf['NodeId']])
+    finally:
+        session.close()
+        queue.close()
+        server.shutdown()
@@ -0,0 +1,131 @@
+# --- tracing.py ---
+# Opt-in request tracing for the Flask app (WOOLIES_TRACE=1). When enabled:
+#   - every request's latency is recorded in a per-route histogram (metrics.py), served at /metrics
+#   - handlers can time named phases (index lookup, filter, projection, serialization) with phase();
+#     these go to a per-route/per-phase histogram and the response's Server-Timing header
+#   - a sample of requests (WOOLIES_TRACE_PROFILE_RATE) runs under cProfile, and the profile is
+#     dumped to WOOLIES_TRACE_PROFILE_DIR when the request is slower than WOOLIES_TRACE_SLOW_MS
+# When disabled, phase() returns a shared no-op context manager and nothing is hooked into Flask.
+#
+# log_event() is the structured (logfmt-style) logger for hot paths: it checks the level first,
+# so disabled debug events cost one method call.
+
+import contextlib
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+
+from flask import Response, g, request
+
+from metrics import Registry
+
+TRACE_ENABLED = os.environ.get('WOOLIES_TRACE', '').lower() in ('1', 'true', 'yes', 'on')
+SLOW_REQUEST_MS = float(os.environ.get('WOOLIES_TRACE_SLOW_MS', 250))
+PROFILE_SAMPLE_RATE = float(os.environ.get('WOOLIES_TRACE_PROFILE_RATE', 0.1))
+PROFILE_DIR = os.environ.get('WOOLIES_TRACE_PROFILE_DIR', 'output/profiles')
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRICS = Registry()
+REQUEST_LATENCY = METRICS.histogram('app_request_latency_seconds', 'Request latency by route and method.',
+                                    ['route', 'method'], buckets=REQUEST_BUCKETS)
+RESPONSES = METRICS.counter('app_responses_total', 'Responses by route and status.', ['route', 'status'])
+PHASE_LATENCY = METRICS.histogram('app_request_phase_seconds', 'Time spent in named phases of a request.',
+                                  ['route', 'phase'], buckets=REQUEST_BUCKETS)
+SLOW_PROFILES = METRICS.counter('app_slow_profiles_total', 'Slow sampled requests whose profile was written.', ['route'])
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+def log_event(level, event, **fields):
+    """Logs `event key=value ...` at `level`, doing no formatting unless the level is enabled."""
+    if logging.root.isEnabledFor(level):
+        logging.log(level, event + ''.join(f" {k}={v!r}" if isinstance(v, str) else f" {k}={v}" for k, v in fields.items()))
+
+
+def phase(name):
+    """Times a block as phase `name` of the current request (no-op unless tracing is enabled)."""
+    if not TRACE_ENABLED:
+        return _NULL_PHASE
+    return _Phase(name)
+
+
+class _Phase:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        phases = g.get('trace_phases')
+        if phases is not None:
+            phases.append((self.name, time.perf_counter() - self.started))
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.trace_started = time.perf_counter()
+    g.trace_phases = []
+    g.trace_profiler = None
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g.trace_profiler = profiler
+        except ValueError:
+            pass  # Python 3.12+ allows one active profiler at a time; another request already holds it
+
+
+def _after_request(response):
+    started = g.get('trace_started')
+    if started is None:
+        return response
+    profiler = g.pop('trace_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+    route = _route()
+    REQUEST_LATENCY.labels(route, request.method).observe(elapsed)
+    RESPONSES.labels(route, response.status_code).inc()
+
+    timings = []
+    for name, seconds in g.get('trace_phases', ()):
+        PHASE_LATENCY.labels(route, name).observe(seconds)
+        timings.append(f"{name};dur={seconds * 1000.0:.2f}")
+    timings.append(f"total;dur={elapsed * 1000.0:.2f}")
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    if profiler is not None and elapsed * 1000.0 >= SLOW_REQUEST_MS:
+        _dump_profile(profiler, route, elapsed)
+    log_event(logging.DEBUG, 'request', method=request.method, path=request.path, status=response.status_code,
+              ms=round(elapsed * 1000.0, 2))
+    return response
+
+
+def _dump_profile(profiler, route, elapsed):
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}_{elapsed * 1000.0:.0f}ms.prof")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(path)
+        SLOW_PROFILES.labels(route).inc()
+        logging.warning(f"Slow request {request.method} {request.full_path.rstrip('?')} took {elapsed * 1000.0:.0f}ms; profile saved to {path}")
+    except OSError as e:
+        logging.error(f"Failed to write request profile {path}: {e}")
+
+
+def init_app(app):
+    """Hooks tracing into `app` and serves /metrics, if WOOLIES_TRACE is set."""
+    if not TRACE_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(METRICS.render(), mimetype='text/plain; version=0.0.4'))
+    logging.info(f"Request tracing enabled (slow threshold {SLOW_REQUEST_MS:.0f}ms, profile sample rate {PROFILE_SAMPLE_RATE}, profiles in {PROFILE_DIR}).")
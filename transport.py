@@ -0,0 +1,176 @@
+# --- transport.py ---
+# HTTP transport shared by the scrapers' worker threads.
+#   - requests backend (default): one HTTPAdapter whose urllib3 pool is sized to the worker count,
+#     mounted on a per-thread Session (Session itself isn't guaranteed thread-safe). All sessions
+#     share the adapter's keep-alive connections and one cookie jar.
+#   - httpx backend (WOOLIES_HTTP2=1, needs `pip install httpx[http2]`): one thread-safe httpx.Client
+#     multiplexing requests over HTTP/2. Its responses and errors are adapted to look like
+#     requests', so the scrapers' retry/except logic is unchanged.
+#   - optional TTL cache around socket.getaddrinfo (WOOLIES_DNS_TTL seconds), so thousands of
+#     requests to one host don't each resolve it.
+# warm_up() performs the initial BASE_URL GET once per transport and keeps its cookies for every worker.
+
+import logging
+import os
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx  # Optional: only needed for HTTP/2
+except ImportError:
+    httpx = None
+
+HTTP2_ENABLED = os.environ.get('WOOLIES_HTTP2', '').lower() in ('1', 'true', 'yes', 'on')
+DNS_CACHE_TTL_SECONDS = float(os.environ.get('WOOLIES_DNS_TTL', 0))  # 0 = no DNS cache
+
+
+# --- DNS cache ---
+_original_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}
+_dns_lock = threading.Lock()
+
+
+def enable_dns_cache(ttl_seconds):
+    """Caches socket.getaddrinfo results for ttl_seconds (process-wide). Failures are not cached."""
+    def cached_getaddrinfo(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with _dns_lock:
+            hit = _dns_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        result = _original_getaddrinfo(*args, **kwargs)
+        with _dns_lock:
+            _dns_cache[key] = (now + ttl_seconds, result)
+        return result
+
+    socket.getaddrinfo = cached_getaddrinfo
+    logging.info(f"DNS cache enabled (TTL {ttl_seconds:g}s).")
+
+
+# --- httpx adapters ---
+class _HTTPXResponse:
+    """Wraps an httpx.Response with the parts of the requests.Response API the scrapers use."""
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def content(self):
+        return self._response.content
+
+    @property
+    def text(self):
+        return self._response.text
+
+    def json(self):
+        return self._response.json()
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def __bool__(self):
+        return self.ok
+
+
+def _translate_httpx_error(e):
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(e))
+    return requests.exceptions.ConnectionError(str(e))
+
+
+# --- Transport ---
+class Transport:
+    """Thread-safe, connection-pooled stand-in for a shared requests.Session.
+
+    Exposes request/get/post with requests' signatures (headers, json, timeout, ...).
+    """
+    def __init__(self, headers=None, pool_size=10, http2=HTTP2_ENABLED):
+        self.headers = dict(headers or {})
+        self.pool_size = max(1, pool_size)
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self._local = threading.local()
+        self._warm_lock = threading.Lock()
+        self._warmed = False
+        self._client = None
+        if http2:
+            self._client = self._make_http2_client()
+        if self._client is None:
+            # pool_block: workers wait for a free connection instead of opening throwaway extras
+            self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.backend = 'httpx/http2' if self._client is not None else 'requests'
+        logging.info(f"HTTP transport: {self.backend}, pool size {self.pool_size}.")
+
+    def _make_http2_client(self):
+        if httpx is None:
+            logging.warning("HTTP/2 requested but httpx is not installed; using requests (HTTP/1.1).")
+            return None
+        try:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            return httpx.Client(http2=True, headers=self.headers, limits=limits, follow_redirects=True)
+        except ImportError as e:  # h2 missing
+            logging.warning(f"HTTP/2 unavailable ({e}); using requests (HTTP/1.1).")
+            return None
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.cookies = self.cookies  # One jar for every worker: cookies from warm_up apply everywhere
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        if self._client is None:
+            return self._session().request(method, url, **kwargs)
+        try:
+            return _HTTPXResponse(self._client.request(method, url, **kwargs))
+        except httpx.HTTPError as e:
+            raise _translate_httpx_error(e) from e
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def warm_up(self, url, timeout=30, request=None):
+        """GETs url once per transport to pick up session cookies. Later calls are no-ops.
+
+        `request` lets callers route the GET through their own wrapper (e.g. for metrics).
+        Raises requests.exceptions.RequestException on failure, leaving the transport un-warmed.
+        """
+        with self._warm_lock:
+            if self._warmed:
+                return None
+            response = (request or self.request)('GET', url, timeout=timeout)
+            response.raise_for_status()
+            self._warmed = True
+            return response
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        else:
+            self._adapter.close()
+
+
+def make_transport(headers=None, pool_size=10, http2=HTTP2_ENABLED, dns_cache_ttl=DNS_CACHE_TTL_SECONDS):
+    """Builds the scrapers' Transport, enabling the DNS cache first if a TTL is set."""
+    if dns_cache_ttl and socket.getaddrinfo is _original_getaddrinfo:
+        enable_dns_cache(dns_cache_ttl)
+    return Transport(headers, pool_size, http2)